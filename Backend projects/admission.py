@@ -0,0 +1,298 @@
+"""
+Admission Control
+=================
+The public proxy routes had no per-client limits: one runaway tab or
+scraper could spend every pooled token and push everyone onto the
+60/hour public fallback. Requests to those routes are now admitted
+before any cache or upstream work:
+
+- Token bucket per client IP (ADMISSION_RATE/s, bursts of ADMISSION_BURST)
+- Token bucket per Origin for origins outside ALLOWED_ORIGINS, so another
+  site embedding the proxy can't spend the quota either
+- Global cap on admitted requests in flight per worker, with a bounded
+  queue: past ADMISSION_MAX_QUEUED waiters, or after ADMISSION_QUEUE_WAIT
+  seconds in the queue, requests are turned away instead of piling up
+- Rejections are immediate 429s with Retry-After
+
+Buckets live in one LRU-ordered dict of [tokens, updated_at] pairs.
+A bucket idle long enough to have refilled is the same as no bucket, so
+those are dropped as requests come in; ADMISSION_MAX_CLIENTS bounds the
+rest. Limits are per worker process.
+
+On gthread workers a request waiting for a slot holds a thread too, so
+the gate only engages if admitted plus queued requests fit in the
+worker's threads. With GUNICORN_THREADS set (the Procfile sets it), the
+defaults are half the threads active and a quarter queued; the last
+quarter is left for /health, admin and event streams
+(EVENTS_MAX_CLIENTS). Without it (async engine, dev server) they are
+64 and 128.
+
+Environment Variables:
+    ADMISSION_RATE=5              # Requests/second per client IP (0 = off)
+    ADMISSION_BURST=60            # Bucket size per client IP
+    ADMISSION_ORIGIN_RATE=20      # Requests/second per foreign Origin (0 = off)
+    ADMISSION_ORIGIN_BURST=200
+    ADMISSION_MAX_ACTIVE=         # Admitted requests in flight per worker (0 = off);
+                                  # GUNICORN_THREADS / 2, else 64
+    ADMISSION_MAX_QUEUED=         # Requests that may wait for a slot; GUNICORN_THREADS / 4, else 128
+    ADMISSION_QUEUE_WAIT=2        # Max seconds waiting for a slot
+    ADMISSION_MAX_CLIENTS=10000   # Buckets kept per worker
+    ADMISSION_PROXY_HOPS=         # Reverse proxies in front (X-Forwarded-For hops to trust);
+                                  # defaults to 1 on Railway and Heroku, 0 elsewhere
+"""
+
+import os
+import math
+import time
+import asyncio
+import threading
+from collections import OrderedDict, deque
+
+# Set by platforms that put every request behind their edge router
+ROUTED_PLATFORM_ENV = ('RAILWAY_ENVIRONMENT', 'DYNO')
+
+# Flask endpoints / aiohttp route names that go through admission
+ADMITTED_ENDPOINTS = frozenset(('proxy_github', 'proxy_github_batch', 'repo_tree', 'raw_file'))
+
+
+class TokenBuckets:
+    """Token bucket per key, idle keys expired in LRU order"""
+
+    def __init__(self, rate, burst, max_keys=10000):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_keys = max_keys
+        self.idle_after = self.burst / rate if rate > 0 else 0   # Full again after this long
+        self._buckets = OrderedDict()    # key -> [tokens, updated_at], oldest access first
+        self._lock = threading.Lock()
+        self.expired = 0
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def take(self, key, cost=1, now=None):
+        """Spend `cost` tokens; returns 0 when admitted, else seconds until it would be"""
+        if not self.enabled:
+            return 0
+        now = time.monotonic() if now is None else now
+        cost = min(cost, self.burst)  # Never ask for more than a full bucket
+        with self._lock:
+            self._expire(now)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(self.burst), now]
+            else:
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+                self._buckets.move_to_end(key)
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return 0
+            return (cost - bucket[0]) / self.rate
+
+    def _expire(self, now):
+        buckets = self._buckets
+        while buckets:
+            key, (_, updated_at) = next(iter(buckets.items()))
+            if now - updated_at < self.idle_after and len(buckets) < self.max_keys:
+                break
+            del buckets[key]
+            self.expired += 1
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class ConcurrencyGate:
+    """At most `max_active` holders; up to `max_queued` more wait `wait` seconds"""
+
+    def __init__(self, max_active=64, max_queued=128, wait=2.0):
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.wait = wait
+        self.active = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+        self.counters = {'admitted': 0, 'queued': 0, 'rejected_full': 0, 'rejected_timeout': 0}
+
+    @property
+    def enabled(self):
+        return self.max_active > 0
+
+    def acquire(self):
+        """True once a slot is held (release() it); False when turned away"""
+        with self._cond:
+            if self.active < self.max_active:
+                self.active += 1
+                self.counters['admitted'] += 1
+                return True
+            if self.waiting >= self.max_queued:
+                self.counters['rejected_full'] += 1
+                return False
+            self.waiting += 1
+            self.counters['queued'] += 1
+            deadline = time.monotonic() + self.wait
+            try:
+                while self.active >= self.max_active:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.counters['rejected_timeout'] += 1
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+            self.counters['admitted'] += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return dict(self.counters, active=self.active, waiting=self.waiting,
+                        max_active=self.max_active, max_queued=self.max_queued)
+
+
+class AsyncConcurrencyGate:
+    """ConcurrencyGate for coroutines on one event loop (async engine)"""
+
+    def __init__(self, max_active=64, max_queued=128, wait=2.0):
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.wait = wait
+        self.active = 0
+        self._waiters = deque()
+        self.counters = {'admitted': 0, 'queued': 0, 'rejected_full': 0, 'rejected_timeout': 0}
+
+    @property
+    def enabled(self):
+        return self.max_active > 0
+
+    async def acquire(self):
+        if self.active < self.max_active and not self._waiters:
+            self.active += 1
+            self.counters['admitted'] += 1
+            return True
+        if len(self._waiters) >= self.max_queued:
+            self.counters['rejected_full'] += 1
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.counters['queued'] += 1
+        try:
+            await asyncio.wait_for(waiter, self.wait)  # release() hands its slot over
+        except asyncio.TimeoutError:
+            self.counters['rejected_timeout'] += 1
+            return False
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        self.counters['admitted'] += 1
+        return True
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.active -= 1
+
+    def stats(self):
+        return dict(self.counters, active=self.active, waiting=len(self._waiters),
+                    max_active=self.max_active, max_queued=self.max_queued)
+
+
+def retry_after(seconds):
+    """Retry-After header value (whole seconds, at least 1)"""
+    return str(max(1, math.ceil(seconds)))
+
+
+class AdmissionControl:
+    """Per-client buckets plus the worker's concurrency gate"""
+
+    def __init__(self, ip_buckets, origin_buckets, gate, proxy_hops=0, allowed_origins=()):
+        self.ip_buckets = ip_buckets
+        self.origin_buckets = origin_buckets
+        self.gate = gate
+        self.async_gate = None        # Set by the async engine for its native routes
+        self.proxy_hops = proxy_hops
+        self.allowed_origins = set(allowed_origins)
+        self._lock = threading.Lock()
+        self.counters = {'checked': 0, 'limited_ip': 0, 'limited_origin': 0}
+
+    def client_ip(self, remote_addr, forwarded_for):
+        """Client address, taken from X-Forwarded-For only as far as trusted proxies added it"""
+        if self.proxy_hops and forwarded_for:
+            hops = [hop.strip() for hop in forwarded_for.split(',') if hop.strip()]
+            if hops:
+                return hops[-min(self.proxy_hops, len(hops))]
+        return remote_addr or 'unknown'
+
+    def check(self, ip, origin, cost=1):
+        """0 when the client may proceed, else seconds to wait before retrying"""
+        wait = self.ip_buckets.take(f'ip:{ip}', cost)
+        limited = 'limited_ip' if wait else None
+        if not wait and origin and '*' not in self.allowed_origins and origin not in self.allowed_origins:
+            wait = self.origin_buckets.take(f'origin:{origin}', cost)
+            limited = 'limited_origin' if wait else None
+        with self._lock:
+            self.counters['checked'] += 1
+            if limited:
+                self.counters[limited] += 1
+        return wait
+
+    def rejections(self):
+        """Turned-away requests by reason (both engines' gates)"""
+        gates = [self.gate.stats()] + ([self.async_gate.stats()] if self.async_gate else [])
+        with self._lock:
+            counts = {name: self.counters[name] for name in ('limited_ip', 'limited_origin')}
+        for reason in ('rejected_full', 'rejected_timeout'):
+            counts[reason] = sum(gate[reason] for gate in gates)
+        return counts
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        return dict(counters, proxy_hops=self.proxy_hops,
+                    ip_buckets={'clients': len(self.ip_buckets), 'expired': self.ip_buckets.expired,
+                                'rate': self.ip_buckets.rate, 'burst': self.ip_buckets.burst},
+                    origin_buckets={'clients': len(self.origin_buckets),
+                                    'expired': self.origin_buckets.expired,
+                                    'rate': self.origin_buckets.rate,
+                                    'burst': self.origin_buckets.burst},
+                    concurrency=self.gate.stats(),
+                    async_concurrency=self.async_gate.stats() if self.async_gate else None)
+
+
+def default_proxy_hops():
+    """1 behind a platform's edge router, else 0 (without it every client shares the router's bucket)"""
+    return 1 if any(os.getenv(name) for name in ROUTED_PLATFORM_ENV) else 0
+
+
+def default_gate_size():
+    """(max_active, max_queued) that fit in the worker's threads, when gunicorn's are known"""
+    threads = int(os.getenv('GUNICORN_THREADS') or 0)
+    if threads:
+        return max(threads // 2, 1), max(threads // 4, 1)
+    return 64, 128
+
+
+def admission_from_env(allowed_origins=()):
+    max_clients = int(os.getenv('ADMISSION_MAX_CLIENTS', 10000))
+    max_active, max_queued = default_gate_size()
+    return AdmissionControl(
+        TokenBuckets(float(os.getenv('ADMISSION_RATE', 5)), int(os.getenv('ADMISSION_BURST', 60)),
+                     max_clients),
+        TokenBuckets(float(os.getenv('ADMISSION_ORIGIN_RATE', 20)),
+                     int(os.getenv('ADMISSION_ORIGIN_BURST', 200)), max_clients),
+        ConcurrencyGate(int(os.getenv('ADMISSION_MAX_ACTIVE') or max_active),
+                        int(os.getenv('ADMISSION_MAX_QUEUED') or max_queued),
+                        float(os.getenv('ADMISSION_QUEUE_WAIT', 2))),
+        proxy_hops=int(os.getenv('ADMISSION_PROXY_HOPS') or default_proxy_hops()),
+        allowed_origins=allowed_origins,
+    )
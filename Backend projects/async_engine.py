@@ -0,0 +1,618 @@
+"""
+Async Proxy Engine
+==================
+asyncio serving mode for the secure proxy, so one process can hold
+hundreds of in-flight GitHub calls instead of one per sync worker.
+
+Features:
+- Same URL contract and JSON shape as proxy_github (/api/github/<path>)
+- Non-blocking upstream client (aiohttp) with a keep-alive connector
+- Shares token rotation, stats and response cache with the Flask app
+- Bodies over STREAM_THRESHOLD are relayed chunk by chunk, not buffered
+- Same stale-while-revalidate / stale-if-error policy, refreshing in tasks
+- POST /api/github/batch resolved in tasks and streamed back as NDJSON
+- Same admission control; queued requests wait on the loop, not in threads
+- Same quota planner priorities (background refreshes deferred first)
+- Same ref-to-SHA pinning; ref lookups that miss the cache run in a thread
+- Raw files served straight from the blob cache with sendfile
+  (ETag is the blob SHA, same as the Flask route)
+- Blocking cache, SQLite and bookkeeping calls run in threads with the
+  request's contextvars, so quota charges and trace phases still land
+- /api/events SSE streams held by the event loop, not by threads
+- Native routes report the same /metrics series as the Flask routes
+  and the same Server-Timing traces (X-Trace: 1)
+- Every other route (/health, /admin/*) is served by the Flask app
+  in a thread pool, so nothing is lost in async mode
+
+Usage:
+    PROXY_ENGINE=async python secure-proxy-server.py
+
+    # or under gunicorn
+    gunicorn 'async_engine:create_app()' --bind 0.0.0.0:$PORT \\
+        --worker-class aiohttp.GunicornWebWorker
+
+Environment Variables:
+    ASYNC_UPSTREAM_LIMIT=200     # Max concurrent upstream connections
+    ASYNC_WSGI_THREADS=8         # Threads for Flask-served routes
+"""
+
+import os
+import sys
+import time
+import asyncio
+import importlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web, ClientSession, ClientTimeout, TCPConnector
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Response as WSGIResponse
+
+from single_flight import AsyncSingleFlight
+from admission import ADMITTED_ENDPOINTS, AsyncConcurrencyGate, retry_after
+from quota_planner import BACKGROUND, INTERACTIVE, charged_to
+from ref_pinning import LOOKUP_NEEDED
+from batch import BATCH_CONCURRENCY, NDJSON_TYPE, BatchError, done_line, error_line, parse_batch, result_line
+from proxy_cache import STALE_WARNINGS, UpstreamUnavailable, upstream_failed
+from response_encoding import negotiate_encoding, parse_fields, project_etag
+from metrics import route_label
+from tracing import TRACE_HEADER, span
+from tracing import current as current_trace
+from change_events import (EVENTS_HEARTBEAT, AsyncSubscription, format_sse, parse_last_event_id,
+                           ready_frame)
+from upstream_client import STREAM_CHUNK, STREAM_THRESHOLD, passthrough_headers
+
+ASYNC_UPSTREAM_LIMIT = int(os.getenv('ASYNC_UPSTREAM_LIMIT', 200))
+ASYNC_WSGI_THREADS = int(os.getenv('ASYNC_WSGI_THREADS', 8))
+
+PROXY_KEY = web.AppKey('proxy', object)
+SESSION_KEY = web.AppKey('session', ClientSession)
+FLIGHT_KEY = web.AppKey('flight', AsyncSingleFlight)
+REFRESH_KEY = web.AppKey('refresh', dict)
+
+
+async def in_thread(func, *args):
+    """
+    Run a blocking call (disk cache tier, shared_state SQLite, bookkeeping)
+    in the default executor, inside a copy of this task's contextvars so
+    charged_to() and the request's trace reach the thread
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(None, context.run, func, *args)
+
+
+def cors_headers(proxy, request):
+    """Mirror the Flask-CORS policy for async-served routes"""
+    origin = request.headers.get('Origin')
+    if not origin or ('*' not in proxy.ALLOWED_ORIGINS and origin not in proxy.ALLOWED_ORIGINS):
+        return {}
+    return {
+        'Access-Control-Allow-Origin': origin,
+        'Access-Control-Allow-Credentials': 'true',
+        'Vary': 'Origin',
+    }
+
+
+class AsyncStreamedBody:
+    """Upstream body too large to buffer (async StreamedBody)"""
+
+    def __init__(self, response, head_chunks):
+        self.status = response.status
+        self.headers = passthrough_headers(response.headers)
+        self.response = response
+        self.head = head_chunks
+
+
+async def read_or_stream(response, limit=STREAM_THRESHOLD):
+    """Read the body if it fits in `limit`, else hand back a stream"""
+    length = response.content_length
+    if length and 'Content-Encoding' not in response.headers and length > limit:
+        return AsyncStreamedBody(response, [])
+    chunks = []
+    size = 0
+    async for chunk in response.content.iter_chunked(STREAM_CHUNK):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size > limit:
+            return AsyncStreamedBody(response, chunks)
+    response.release()
+    return b''.join(chunks)
+
+
+async def stream_response(proxy, request, body):
+    """Relay a large upstream body without buffering it"""
+    headers = dict(body.headers)
+    headers.update(cors_headers(proxy, request))
+    headers['X-Cache'] = 'STREAM'
+    resp = web.StreamResponse(status=body.status, headers=headers)
+    try:
+        await resp.prepare(request)
+        for chunk in body.head:
+            await resp.write(chunk)
+        async for chunk in body.response.content.iter_chunked(STREAM_CHUNK):
+            await resp.write(chunk)
+        await resp.write_eof()
+    finally:
+        body.response.release()
+    return resp
+
+
+def entry_response(proxy, request, entry, cache_status, cache_key=None, fields=None, pin=None):
+    """aiohttp equivalent of cached_response()"""
+    fields = fields if entry.status == 200 else None
+    pin = pin if entry.status == 200 else None
+    etag = project_etag(pin.etag if pin else entry.etag, fields)
+    headers = {k: v for k, v in entry.headers.items() if k != 'Content-Type'}
+    if etag:
+        headers['ETag'] = etag
+    if pin:
+        headers.update(pin.headers())
+    headers['X-Cache'] = cache_status
+    headers['Age'] = str(entry.age())
+    if cache_status in STALE_WARNINGS:
+        headers['Warning'] = STALE_WARNINGS[cache_status]
+    headers.update(cors_headers(proxy, request))
+    headers['Vary'] = 'Origin, Accept-Encoding' if 'Vary' in headers else 'Accept-Encoding'
+    if entry.status == 200 and etag and request.headers.get('If-None-Match') == etag:
+        return web.Response(status=304, headers=headers)
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+    with span('encode'):
+        body, applied = proxy.response_cache.variant(cache_key, entry, fields, encoding)
+    if applied:
+        headers['Content-Encoding'] = applied
+    headers['Content-Type'] = entry.headers.get('Content-Type', 'application/json')
+    return web.Response(body=body, status=entry.status, headers=headers)
+
+
+async def proxy_github(request):
+    """
+    Async version of proxy_github
+    Example: /api/github/repos/owner/repo/contents/path
+    """
+    proxy = request.app[PROXY_KEY]
+    github_path = request.match_info['github_path']
+    try:
+        params = dict(request.query)
+        fields = parse_fields(params.pop('fields', None))
+
+        pin = await pin_request(proxy, github_path, params)
+        if pin is not None and request.headers.get('If-None-Match') == project_etag(pin.etag, fields):
+            proxy.ref_pinner.not_modified()
+            headers = pin.headers()
+            headers['ETag'] = project_etag(pin.etag, fields)
+            headers['X-Cache'] = 'HIT'
+            headers.update(cors_headers(proxy, request))
+            return web.Response(status=304, headers=headers)
+        params, cache_key, ttl = proxy.pin_target(github_path, params, pin)
+        cache_status, entry = await resolve_github(request.app, github_path, params, cache_key, ttl)
+        if cache_status == 'STREAM':
+            return await stream_response(proxy, request, entry)
+        return entry_response(proxy, request, entry, cache_status, cache_key, fields, pin)
+
+    except Exception as e:
+        return web.json_response({'error': str(e)}, status=500,
+                                 headers=cors_headers(proxy, request))
+
+
+async def proxy_github_batch(request):
+    """Async version of proxy_github_batch - one task per path"""
+    proxy = request.app[PROXY_KEY]
+    cache = proxy.response_cache
+    headers = cors_headers(proxy, request)
+    try:
+        payload = await request.json()
+    except ValueError:
+        payload = None
+    try:
+        items, fields = parse_batch(payload)
+    except BatchError as e:
+        return web.json_response({'error': str(e)}, status=400, headers=headers)
+    fields = parse_fields(fields)
+    # One token was charged on admission; the rest of the paths cost one each
+    wait = proxy.admission.check(*request['admission_client'], cost=len(items) - 1) if len(items) > 1 else 0
+    if wait:
+        return too_many_requests(proxy, request, wait, f'Rate limit exceeded for a batch of {len(items)} paths')
+    proxy.batch_pool.record(len(items))
+    limit = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def resolve(index, path, github_path, params):
+        try:
+            async with limit:
+                pin = await pin_request(proxy, github_path, params)
+                params, cache_key, ttl = proxy.pin_target(github_path, params, pin)
+                cache_status, entry = await resolve_github(request.app, github_path, params, cache_key, ttl)
+        except Exception as e:
+            return error_line(index, path, 500, str(e))
+        if cache_status == 'STREAM':
+            entry.response.release()  # Too large to inline - fetch it from /api/github directly
+            return error_line(index, path, 413, 'Response too large for a batch; request it directly')
+        body, _ = cache.variant(cache_key, entry, fields if entry.status == 200 else None)
+        return result_line(index, path, cache_status, entry, body)
+
+    started = time.perf_counter()
+    headers.update({'Content-Type': NDJSON_TYPE, 'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'})
+    resp = web.StreamResponse(headers=headers)
+    tasks = [asyncio.ensure_future(resolve(index, *item)) for index, item in enumerate(items)]
+    try:
+        await resp.prepare(request)
+        for line in asyncio.as_completed(tasks):
+            await resp.write(await line)
+        await resp.write(done_line(len(items), time.perf_counter() - started))
+        await resp.write_eof()
+    except ConnectionResetError:
+        pass  # Client went away
+    finally:
+        for task in tasks:
+            task.cancel()
+    return resp
+
+
+async def pin_request(proxy, github_path, params):
+    """proxy.ref_pinner.pin(), with a ref lookup that misses its cache run in a thread"""
+    pin = proxy.ref_pinner.pin(github_path, params, cached_only=True)
+    if pin is LOOKUP_NEEDED:
+        pin = await in_thread(proxy.ref_pinner.pin, github_path, params)
+    return pin
+
+
+async def resolve_github(app, github_path, params, cache_key, ttl):
+    """Async version of resolve_github; returns (cache_status, entry)"""
+    proxy = app[PROXY_KEY]
+    cache = proxy.response_cache
+    with span('cache'):
+        cached = await in_thread(cache.lookup, cache_key) if ttl > 0 else None
+    if cached:
+        return 'HIT', cached
+
+    # Expired but still servable: don't make the visitor wait on GitHub
+    priority = proxy.quota_planner.classify(github_path)
+    stale = await in_thread(cache.stale, cache_key) if ttl > 0 else None
+    if stale:
+        result = await resolve_stale(app, github_path, params, cache_key, ttl, *stale, priority=priority)
+        if result is not None:
+            return result
+
+    # Quota running low: analytics calls get whatever is cached, however old
+    if not proxy.quota_planner.admit(priority):
+        return await in_thread(proxy.quota_deferred, cache_key, priority)
+
+    # Identical concurrent requests share a single upstream call
+    with charged_to(priority):
+        (cache_status, entry), shared = await app[FLIGHT_KEY].do(
+            cache_key, lambda: fetch_upstream(app, github_path, params, cache_key, ttl))
+        if cache_status == 'STREAM' and shared:
+            # A streamed body can only be relayed once - fetch our own copy
+            return await fetch_upstream(app, github_path, params, cache_key, ttl)
+    return ('COALESCED' if shared else cache_status), entry
+
+
+async def refresh_entry(app, github_path, params, cache_key, ttl, priority=BACKGROUND):
+    """Async version of refresh_entry"""
+    with charged_to(priority):
+        (cache_status, entry), shared = await app[FLIGHT_KEY].do(
+            cache_key, lambda: fetch_upstream(app, github_path, params, cache_key, ttl))
+    if cache_status == 'STREAM':
+        if not shared:
+            entry.response.release()
+        return 'STREAM', None
+    if upstream_failed(entry.status, entry.body):
+        raise UpstreamUnavailable(entry.status)
+    return ('COALESCED' if shared else cache_status), entry
+
+
+def start_refresh(app, github_path, params, cache_key, ttl, priority=BACKGROUND):
+    """Refresh task for a key (joins one already running), or None while cooling down"""
+    refresh = app[PROXY_KEY].stale_refresh
+    if refresh.cooling_down(cache_key):
+        return None
+    tasks = app[REFRESH_KEY]
+    task = tasks.get(cache_key)
+    if task is None:
+        task = tasks[cache_key] = asyncio.ensure_future(
+            refresh_entry(app, github_path, params, cache_key, ttl, priority))
+        refresh.started()
+
+        def done(t):
+            tasks.pop(cache_key, None)
+            refresh.finished(cache_key, not t.cancelled() and t.exception() is None)
+        task.add_done_callback(done)
+    return task
+
+
+async def resolve_stale(app, github_path, params, cache_key, ttl, entry, in_background, priority=INTERACTIVE):
+    """Async version of resolve_stale"""
+    proxy = app[PROXY_KEY]
+    priority = BACKGROUND if in_background else priority
+    if not proxy.quota_planner.admit(priority):
+        return proxy.stale_result(entry, on_error=False)  # Keep the quota for higher-priority calls
+    task = start_refresh(app, github_path, params, cache_key, ttl, priority)
+    if task is None:
+        return proxy.stale_result(entry, on_error=True)
+    if in_background:
+        return proxy.stale_result(entry, on_error=False)
+    try:
+        cache_status, fresh = await asyncio.wait_for(asyncio.shield(task),
+                                                     proxy.response_cache.stale_wait)
+    except asyncio.TimeoutError:
+        return proxy.stale_result(entry, on_error=False)
+    except Exception:
+        return proxy.stale_result(entry, on_error=True)
+    if fresh is None:
+        return None
+    return cache_status, fresh
+
+
+async def fetch_upstream(app, github_path, params, cache_key, ttl):
+    """Async version of fetch_upstream; returns (cache_status, entry)"""
+    proxy = app[PROXY_KEY]
+    session = app[SESSION_KEY]
+    cache = proxy.response_cache
+    current_token = None
+    headers = {}
+    response = None
+    try:
+        github_url = f'{proxy.GITHUB_API}/{github_path}'
+
+        headers = proxy.get_headers()
+        current_token = headers.get('X-Current-Token', 'No token')
+
+        stale = await in_thread(cache.get, cache_key) if ttl > 0 else None
+        if stale:
+            headers.update(stale.validators())
+
+        started = time.perf_counter()
+        response = await session.get(github_url, headers=headers, params=params)
+        await in_thread(proxy.record_upstream_response, github_path, headers, response.status,
+                        response.headers, time.perf_counter() - started)
+
+        if response.status == 304 and stale:
+            response.release()
+            entry = await in_thread(cache.revalidated, cache_key, response.headers, ttl)
+            return 'REVALIDATED', entry or stale
+
+        # Auto-fallback if rate limited
+        if response.status == 403:
+            body = await response.read()
+            if b'rate limit' not in body.lower():
+                return 'BYPASS', proxy.CacheEntry(403, body, response.headers, 0)
+            print(f"⚠️  Rate limit hit for {current_token}, trying public access...")
+            headers = proxy.get_headers(use_token=False)
+            started = time.perf_counter()
+            response = await session.get(github_url, headers=headers, params=params)
+            await in_thread(proxy.log_request, github_path, 'Public (no token)', response.status)
+            proxy.observe_upstream(github_path, 'public', response.status, time.perf_counter() - started)
+
+        # Buffer (and cache) small bodies; relay large ones chunk by chunk
+        with span('body'):
+            body = await read_or_stream(response)
+        if isinstance(body, AsyncStreamedBody):
+            return 'STREAM', body
+
+        if response.status == 200:
+            entry = await in_thread(cache.put, cache_key, 200, body, response.headers, ttl)
+            if entry:
+                return 'MISS', entry
+
+        return 'BYPASS', proxy.CacheEntry(response.status, body, response.headers, 0)
+
+    except Exception:
+        await in_thread(proxy.log_request, github_path, current_token, 500)
+        raise
+    finally:
+        if response is None:
+            proxy.release_token(headers)  # Timeout / connection error / cancelled: nothing observed
+
+
+async def raw_file(request):
+    """
+    Async version of raw_file - the download (if any) runs in a thread,
+    the file itself goes out through BlobFileResponse (sendfile + Range)
+    """
+    proxy = request.app[PROXY_KEY]
+    m = request.match_info
+    headers = cors_headers(proxy, request)
+    try:
+        local_path, blob_sha, pinned = await in_thread(
+            proxy.fetch_raw_blob, m['owner'], m['repo'], m['ref'], m['file_path'])
+    except proxy.TreeLookupError as e:
+        return web.json_response({'error': str(e)}, status=e.status, headers=headers)
+    except proxy.BlobIntegrityError as e:
+        return web.json_response({'error': str(e)}, status=502, headers=headers)
+    except Exception as e:
+        return web.json_response({'error': str(e)}, status=500, headers=headers)
+
+    headers['X-Blob-SHA'] = blob_sha
+    headers['Cache-Control'] = 'public, max-age=31536000, immutable' if pinned else 'public, max-age=60'
+    if request.headers.get('If-None-Match') == f'"{blob_sha}"':
+        headers['ETag'] = f'"{blob_sha}"'
+        return web.Response(status=304, headers=headers)
+    headers['Content-Type'] = proxy.guess_mimetype(m['file_path'])
+    return BlobFileResponse(local_path, blob_sha, headers=headers)
+
+
+class BlobFileResponse(web.FileResponse):
+    """
+    FileResponse tagged with the blob SHA, like the Flask route - aiohttp
+    would otherwise send an ETag made of the cache file's mtime and size,
+    which differs per worker and per engine
+    """
+
+    def __init__(self, path, blob_sha, **kwargs):
+        super().__init__(path, **kwargs)
+        self.blob_sha = blob_sha
+
+
+async def tag_blob_response(request, response):
+    """on_response_prepare: replace FileResponse's own ETag just before the headers go out"""
+    if isinstance(response, BlobFileResponse) and response.status in (200, 206, 304):
+        response.etag = response.blob_sha
+
+
+async def change_events(request):
+    """Async version of change_events - one coroutine per SSE client"""
+    proxy = request.app[PROXY_KEY]
+    broker = proxy.event_broker
+    headers = cors_headers(proxy, request)
+    sse_headers = {**headers, 'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache',
+                   'X-Accel-Buffering': 'no'}
+    if not proxy.GITHUB_WEBHOOK_SECRET:
+        # Nothing will be pushed - tell the client to poll
+        return web.Response(text=ready_frame(False), headers=sse_headers)
+    events = asyncio.Queue(maxsize=100)
+    sub = AsyncSubscription(asyncio.get_running_loop(), events)
+    last_id = parse_last_event_id(request.headers.get('Last-Event-ID') or request.query.get('lastEventId'))
+    if not broker.subscribe(sub, last_id):
+        headers['Retry-After'] = '30'
+        return web.json_response({'error': 'Too many event listeners'}, status=503, headers=headers)
+    await in_thread(proxy.shared_state.start)
+
+    resp = web.StreamResponse(headers=sse_headers)
+    try:
+        await resp.prepare(request)
+        await resp.write(ready_frame(True).encode())
+        while True:
+            try:
+                event = await asyncio.wait_for(events.get(), EVENTS_HEARTBEAT)
+                await resp.write(format_sse(event).encode())
+            except asyncio.TimeoutError:
+                await resp.write(b': keepalive\n\n')
+    except ConnectionResetError:
+        pass  # Client went away
+    finally:
+        broker.unsubscribe(sub)
+    return resp
+
+
+@web.middleware
+async def metrics_middleware(request, handler):
+    """Per-route metrics and traces for native routes (Flask-served ones record their own)"""
+    route = request.match_info.route
+    if route.name == 'flask':
+        return await handler(request)
+    proxy = request.app[PROXY_KEY]
+    label = route_label(route.resource.canonical)
+    proxy.http_in_flight.inc((label,))
+    started = time.perf_counter()
+    status = 500
+    trace_handle = proxy.tracer.start(request.headers.get(TRACE_HEADER) == '1')
+    try:
+        response = await handler(request)
+        status = response.status
+        if trace_handle is not None and not response.prepared:
+            response.headers['Server-Timing'] = current_trace().server_timing()
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        proxy.http_in_flight.dec((label,))
+        proxy.http_latency.observe(time.perf_counter() - started, (label,))
+        proxy.http_requests.inc((label, str(status)))
+        if trace_handle is not None:
+            proxy.observe_trace(proxy.tracer.finish(trace_handle))
+
+
+def too_many_requests(proxy, request, wait, message):
+    headers = cors_headers(proxy, request)
+    headers['Retry-After'] = retry_after(wait)
+    return web.json_response({'error': message, 'retry_after': round(wait, 1)}, status=429, headers=headers)
+
+
+@web.middleware
+async def admission_middleware(request, handler):
+    """Admission control for native routes (Flask-served ones are admitted by the Flask app)"""
+    if request.match_info.route.name not in ADMITTED_ENDPOINTS or request.method == 'OPTIONS':
+        return await handler(request)
+    proxy = request.app[PROXY_KEY]
+    admission = proxy.admission
+    request['admission_client'] = (admission.client_ip(request.remote, request.headers.get('X-Forwarded-For')),
+                                   request.headers.get('Origin'))
+    wait = admission.check(*request['admission_client'])
+    if wait:
+        return too_many_requests(proxy, request, wait, 'Rate limit exceeded for this client')
+    gate = admission.async_gate
+    if not gate.enabled:
+        return await handler(request)
+    if not await gate.acquire():
+        return too_many_requests(proxy, request, 1, 'Proxy is busy, try again shortly')
+    try:
+        return await handler(request)  # Streamed responses are written before this returns
+    finally:
+        gate.release()
+
+
+def make_wsgi_handler(flask_app):
+    """Serve any other route through the Flask app in a thread pool"""
+    executor = ThreadPoolExecutor(max_workers=ASYNC_WSGI_THREADS,
+                                  thread_name_prefix='wsgi')
+
+    def call_flask(method, path, query, headers, body, remote):
+        builder = EnvironBuilder(path=path, method=method, query_string=query,
+                                 headers=headers, data=body,
+                                 environ_base={'REMOTE_ADDR': remote or ''})
+        try:
+            # buffered: the app iterator is closed, so call_on_close() callbacks run
+            response = WSGIResponse.from_app(flask_app, builder.get_environ(), buffered=True)
+        finally:
+            builder.close()
+        return response.status_code, list(response.headers.items()), response.get_data()
+
+    async def handler(request):
+        body = await request.read()
+        loop = asyncio.get_running_loop()
+        status, headers, data = await loop.run_in_executor(
+            executor, call_flask, request.method, request.path,
+            request.query_string, list(request.headers.items()), body, request.remote)
+        headers = [(k, v) for k, v in headers if k.lower() != 'content-length']
+        return web.Response(body=data, status=status, headers=headers)
+
+    return handler
+
+
+async def open_session(app):
+    proxy = app[PROXY_KEY]
+    connect_timeout, read_timeout = proxy.upstream.timeout
+    app[SESSION_KEY] = ClientSession(
+        connector=TCPConnector(limit=ASYNC_UPSTREAM_LIMIT, keepalive_timeout=30),
+        timeout=ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout),
+    )
+
+
+async def close_session(app):
+    await app[SESSION_KEY].close()
+
+
+async def start_prefetcher(app):
+    app[PROXY_KEY].prefetcher.start()  # Runs in the worker, after any fork
+
+
+def build_app(proxy):
+    """Build the aiohttp application around an already-loaded proxy module"""
+    app = web.Application(middlewares=[metrics_middleware, admission_middleware])
+    app[PROXY_KEY] = proxy
+    gate = proxy.admission.gate
+    proxy.admission.async_gate = AsyncConcurrencyGate(gate.max_active, gate.max_queued, gate.wait)
+    app[FLIGHT_KEY] = AsyncSingleFlight()
+    app[REFRESH_KEY] = {}
+    app.router.add_post('/api/github/batch', proxy_github_batch, name='proxy_github_batch')
+    app.router.add_get('/api/github/{github_path:.+}', proxy_github, name='proxy_github')
+    app.router.add_get('/api/raw/{owner}/{repo}/{ref}/{file_path:.+}', raw_file, name='raw_file')
+    app.router.add_get('/api/events', change_events)
+    app.router.add_route('*', '/{tail:.*}', make_wsgi_handler(proxy.app), name='flask')
+    app.on_response_prepare.append(tag_blob_response)
+    app.on_startup.append(open_session)
+    app.on_startup.append(start_prefetcher)
+    app.on_cleanup.append(close_session)
+    return app
+
+
+def create_app():
+    """gunicorn entry point: load secure-proxy-server and wrap it"""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    return build_app(importlib.import_module('secure-proxy-server'))
+
+
+def run(proxy, host, port):
+    """Serve the async engine (used by PROXY_ENGINE=async)"""
+    print(f"⚡ Async engine: up to {ASYNC_UPSTREAM_LIMIT} concurrent upstream calls")
+    web.run_app(build_app(proxy), host=host, port=port, print=None)
@@ -0,0 +1,160 @@
+"""
+Batch Proxy Requests
+====================
+The project pages walk folders with long chains of
+`/api/github/repos/.../contents/<folder>/<day>` calls, each paying a
+full browser <-> proxy round-trip. POST /api/github/batch takes the
+whole list, resolves the paths concurrently on the server (same cache,
+stale policy, coalescing and token scheduling as /api/github/<path>)
+and streams one NDJSON line back per path as soon as it is ready, so
+the page waits for the slowest item instead of the sum of them.
+
+Request:
+    POST /api/github/batch
+    {"paths": ["repos/o/r/contents/HW/Day 01", "repos/o/r/contents/HW/Day 02?ref=main"],
+     "fields": "name,path,type,download_url"}       # optional, as ?fields=
+
+Response (application/x-ndjson), in completion order:
+    {"index":1,"path":"repos/o/r/contents/HW/Day 02?ref=main","status":200,"cache":"HIT","etag":"...","body":[...]}
+    {"index":0,"path":"repos/o/r/contents/HW/Day 01","status":404,"cache":"BYPASS","body":{"message":"Not Found"}}
+    {"done":true,"count":2,"seconds":0.213}
+
+Environment Variables:
+    BATCH_MAX_PATHS=50       # Paths accepted per batch
+    BATCH_CONCURRENCY=8      # Paths resolved at once per batch
+    BATCH_WORKERS=16         # Threads per worker shared by all batches (sync engine)
+"""
+
+import os
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import parse_qsl
+
+from proxy_cache import STALE_WARNINGS
+
+BATCH_MAX_PATHS = int(os.getenv('BATCH_MAX_PATHS', 50))
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', 8))
+
+NDJSON_TYPE = 'application/x-ndjson'
+
+
+class BatchError(ValueError):
+    """The batch request itself is malformed (answered 400)"""
+
+
+def parse_batch(payload, max_paths=BATCH_MAX_PATHS):
+    """
+    Request JSON -> (items, fields) where items are (path, github_path, params)
+    Accepts {"paths": [...]} or a bare list; '/api/github/' prefixes are dropped
+    """
+    if isinstance(payload, list):
+        payload = {'paths': payload}
+    if not isinstance(payload, dict) or not isinstance(payload.get('paths'), list):
+        raise BatchError('Expected {"paths": ["repos/<owner>/<repo>/contents/<path>", ...]}')
+    paths = payload['paths']
+    if not paths:
+        raise BatchError('No paths given')
+    if len(paths) > max_paths:
+        raise BatchError(f'At most {max_paths} paths per batch')
+    items = []
+    for path in paths:
+        if not isinstance(path, str) or not path.strip('/'):
+            raise BatchError(f'Invalid path: {path!r}')
+        github_path, _, query = path.strip().lstrip('/').partition('?')
+        if github_path.startswith('api/github/'):
+            github_path = github_path[len('api/github/'):]
+        if '://' in github_path or '..' in github_path.split('/'):
+            raise BatchError(f'Invalid path: {path!r}')
+        params = dict(parse_qsl(query))
+        params.pop('fields', None)
+        items.append((path, github_path, params))
+    fields = payload.get('fields')
+    if fields is not None and not isinstance(fields, str):
+        raise BatchError('fields must be a comma-separated string')
+    return items, fields
+
+
+def result_line(index, path, cache_status, entry, body):
+    """One NDJSON line for a resolved path (body: the possibly projected bytes)"""
+    head = {'index': index, 'path': path, 'status': entry.status, 'cache': cache_status}
+    if entry.etag:
+        head['etag'] = entry.etag
+    if cache_status in STALE_WARNINGS:
+        head['warning'] = STALE_WARNINGS[cache_status]
+    if body and 'json' in entry.headers.get('Content-Type', 'application/json'):
+        # Raw newlines in valid JSON are only ever whitespace (inside strings
+        # they must be escaped), so dropping them makes the body one line
+        # without a parse / re-serialize round-trip
+        body = body.replace(b'\r', b'').replace(b'\n', b'')
+        return json.dumps(head, separators=(',', ':'))[:-1].encode() + b',"body":' + body + b'}\n'
+    head['body'] = body.decode('utf-8', 'replace') if body else None
+    return json.dumps(head, separators=(',', ':')).encode() + b'\n'
+
+
+def error_line(index, path, status, message):
+    return json.dumps({'index': index, 'path': path, 'status': status, 'error': message},
+                      separators=(',', ':')).encode() + b'\n'
+
+
+def done_line(count, seconds):
+    return json.dumps({'done': True, 'count': count, 'seconds': round(seconds, 3)},
+                      separators=(',', ':')).encode() + b'\n'
+
+
+class BatchPool:
+    """Threads shared by every batch in this process (sync engine)"""
+
+    def __init__(self, workers=16):
+        self.workers = workers
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.counters = {'batches': 0, 'items': 0}
+
+    def _executor(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Executor threads don't survive gunicorn's fork
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='batch')
+                self._pid = os.getpid()
+            return self._pool
+
+    def run(self, items, resolve, concurrency=BATCH_CONCURRENCY):
+        """
+        Yield (index, result, error) as each resolve(*item) finishes,
+        with at most `concurrency` of this batch's items in flight
+        """
+        executor = self._executor()
+        self.record(len(items))
+        pending = {}
+        queued = iter(enumerate(items))
+
+        def submit_next():
+            for index, item in queued:
+                pending[executor.submit(resolve, *item)] = index
+                return
+
+        for _ in range(max(concurrency, 1)):
+            submit_next()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                error = future.exception()
+                yield index, (None if error else future.result()), error
+                submit_next()
+
+    def record(self, items):
+        """Count one batch of `items` paths (the async engine resolves its own)"""
+        with self._lock:
+            self.counters['batches'] += 1
+            self.counters['items'] += items
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+def batch_pool_from_env():
+    return BatchPool(workers=int(os.getenv('BATCH_WORKERS', 16)))
@@ -0,0 +1,115 @@
+"""
+Async Engine Load Test
+======================
+Shows how concurrency scales for the sync (the Procfile's gunicorn
+command line, gthread workers) and async (PROXY_ENGINE=async) engines against the local GitHub stub.
+
+Every request uses a unique path and the response cache is disabled,
+so each client request costs exactly one upstream call. Admission
+control is off (one client IP sends everything); any non-200 response
+fails the run, so rejections can't pass for throughput.
+
+Usage:
+    python benchmarks/async-load-test.py --latency 0.2 --levels 1,8,32,128
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import subprocess
+
+import aiohttp
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from github_stub import free_port, procfile_command, spawn, wait_for  # noqa: E402
+
+
+def start_proxy(engine, stub_url):
+    """Start secure-proxy-server.py with the given engine"""
+    port = free_port()
+    env = dict(os.environ, GITHUB_API_URL=stub_url, PORT=str(port), HOST='127.0.0.1',
+               CACHE_TTL_RULES='.=0', PROXY_ENGINE=engine, ADMISSION_RATE='0', ADMISSION_MAX_ACTIVE='0')
+    if engine == 'sync':
+        cmd, env = procfile_command(env)
+    else:
+        cmd = [sys.executable, 'secure-proxy-server.py']
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for(f'http://127.0.0.1:{port}/health')
+    return proc, f'http://127.0.0.1:{port}'
+
+
+async def run_level(base_url, concurrency, requests_per_level):
+    """Fire requests with a fixed number in flight; return stats"""
+    latencies = []
+    errors = 0
+    counter = iter(range(requests_per_level))
+
+    async def worker(session):
+        nonlocal errors
+        for i in counter:
+            url = f'{base_url}/api/github/repos/owner/repo/contents/c{concurrency}/r{i}'
+            started = time.perf_counter()
+            try:
+                async with session.get(url) as resp:
+                    await resp.read()
+                    if resp.status != 200:
+                        errors += 1
+            except aiohttp.ClientError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'rps': len(latencies) / elapsed,
+        'p50': latencies[len(latencies) // 2] * 1000,
+        'p95': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        'errors': errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sync vs async engine load test')
+    parser.add_argument('--latency', type=float, default=0.2, help='stub latency (seconds)')
+    parser.add_argument('--levels', default='1,8,32,128', help='concurrency levels')
+    parser.add_argument('--requests', type=int, default=256, help='requests per level')
+    parser.add_argument('--engines', default='sync,async')
+    args = parser.parse_args()
+    levels = [int(x) for x in args.levels.split(',')]
+
+    stub, stub_url = spawn(args.latency)
+    errors = 0
+    try:
+        print(f"\n{'engine':<8}{'conc':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+        for engine in args.engines.split(','):
+            proxy, proxy_url = start_proxy(engine, stub_url)
+            try:
+                for level in levels:
+                    r = asyncio.run(run_level(proxy_url, level, max(args.requests, level)))
+                    errors += r['errors']
+                    print(f"{engine:<8}{level:>6}{r['rps']:>10.1f}{r['p50']:>10.1f}"
+                          f"{r['p95']:>10.1f}{r['errors']:>8}")
+            finally:
+                proxy.terminate()
+                proxy.wait()
+    finally:
+        stub.terminate()
+        stub.wait()
+    if errors:
+        print(f"\n❌ {errors} requests failed - req/s above includes rejected requests")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Response Compression Benchmark
+==============================
+Before/after byte counts for proxied JSON, using the recorded GitHub
+responses in benchmarks/fixtures/, plus the cost of encoding a variant
+once versus serving it from the response cache.
+
+Usage:
+    python benchmarks/compression-bench.py
+    python benchmarks/compression-bench.py --fields name,path,type,size,download_url
+"""
+
+import os
+import sys
+import glob
+import time
+import argparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from proxy_cache import ResponseCache  # noqa: E402
+from response_encoding import SUPPORTED_ENCODINGS, parse_fields  # noqa: E402
+
+# Keys the frontend reads from contents listings
+FRONTEND_FIELDS = 'name,path,type,size,sha,download_url,html_url,url'
+
+
+def fmt_bytes(n):
+    return f'{n / 1024:.1f} KB' if n >= 1024 else f'{n} B'
+
+
+def time_variant(cache, key, entry, fields, encoding, rounds=200):
+    """Build a variant; returns (body, first build seconds, avg cached serve seconds)"""
+    started = time.perf_counter()
+    body, _ = cache.variant(key, entry, fields, encoding)
+    built = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(rounds):
+        cache.variant(key, entry, fields, encoding)
+    return body, built, (time.perf_counter() - started) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compression / projection byte counts')
+    parser.add_argument('--fields', default=FRONTEND_FIELDS,
+                        help='fields= projection applied to list entries')
+    args = parser.parse_args()
+    fields = parse_fields(args.fields)
+
+    cache = ResponseCache(max_bytes=64 * 1024 * 1024)
+    variants = [(None, None, 'raw')]
+    variants += [(None, enc, enc) for enc in SUPPORTED_ENCODINGS]
+    variants += [(fields, None, 'fields')]
+    variants += [(fields, enc, f'fields+{enc}') for enc in SUPPORTED_ENCODINGS]
+
+    print(f"Encodings: {', '.join(SUPPORTED_ENCODINGS)}"
+          + ('' if 'br' in SUPPORTED_ENCODINGS else '  (pip install brotli for br)'))
+    print(f"Projection: fields={','.join(fields)}\n")
+    header = f"{'fixture':<26}" + ''.join(f'{label:>14}' for _, _, label in variants)
+    print(header)
+    print('-' * len(header))
+
+    totals = [0] * len(variants)
+    timings = []
+    for path in sorted(glob.glob(os.path.join(BENCH_DIR, 'fixtures', '*.json'))):
+        name = os.path.basename(path)
+        with open(path, 'rb') as f:
+            body = f.read()
+        entry = cache.put(name, 200, body, {'Content-Type': 'application/json; charset=utf-8'}, 3600)
+        row = f'{name:<26}'
+        for i, (v_fields, encoding, label) in enumerate(variants):
+            encoded, built, served = time_variant(cache, name, entry, v_fields, encoding)
+            totals[i] += len(encoded)
+            row += f'{fmt_bytes(len(encoded)):>14}'
+            if encoding:
+                timings.append((name, label, built, served))
+        print(row)
+
+    print('-' * len(header))
+    print(f"{'total':<26}" + ''.join(f'{fmt_bytes(t):>14}' for t in totals))
+    print(f"{'vs raw':<26}" + ''.join(f'{t / totals[0]:>13.0%} ' for t in totals))
+
+    print(f"\n{'fixture':<26}{'variant':>14}{'first build':>14}{'cached serve':>14}")
+    for name, label, built, served in timings:
+        print(f'{name:<26}{label:>14}{built * 1000:>12.2f}ms{served * 1e6:>12.2f}us')
+    print(f"\nCache: {cache.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,335 @@
+"""
+Local GitHub API Stub
+=====================
+Minimal stand-in for api.github.com so the proxies can be load-tested
+offline. Point a proxy at it with GITHUB_API_URL=http://127.0.0.1:<port>.
+
+Serves the recorded responses in benchmarks/fixtures/:
+- /repos/<owner>/<repo>/contents/<path>    recorded listing, else built from
+                                           the recorded git tree, else synthetic
+- /repos/<owner>/<repo>/commits            recorded commit list
+- /repos/<owner>/<repo>/commits/<ref>      head commit (SHA only with
+                                           Accept: application/vnd.github.sha)
+- /repos/<owner>/<repo>/git/trees/<sha>    recorded recursive tree
+- /rate_limit                              rate limit summary
+- /_stub/stats                             calls served (not counted itself)
+
+Every response carries X-RateLimit-* headers and an ETag, and waits
+--latency seconds (+/- --jitter) first to imitate GitHub's server time.
+Each Authorization header (or no header) gets its own --limit calls per
+--window seconds; past that the stub answers 403 "API rate limit
+exceeded" like GitHub. Conditional requests answered 304 are free.
+
+Usage:
+    python benchmarks/github_stub.py --port 8765 --latency 0.2
+    python benchmarks/github_stub.py --latency 0.1 --jitter 0.05 --limit 60
+"""
+
+import os
+import re
+import sys
+import json
+import shlex
+import time
+import random
+import socket
+import hashlib
+import argparse
+import threading
+import subprocess
+import urllib.request
+from collections import Counter
+from urllib.parse import unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Recorded /contents listings by directory path
+CONTENTS_FIXTURES = {
+    '': 'contents-root.json',
+    'HW': 'contents-hw.json',
+    'CW/Day 05': 'contents-cw-day-05.json',
+}
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURE_DIR, name), 'rb') as f:
+        return json.loads(f.read())
+
+
+def contents_listing(owner, repo, path):
+    """Fake /contents listing in GitHub's JSON shape"""
+    entries = []
+    for i in range(8):
+        name = f'Day {i + 1:02d}' if i < 4 else f'part-{i}.SLDPRT'
+        entry_path = f'{path}/{name}'.strip('/')
+        is_dir = i < 4
+        sha = hashlib.sha1(entry_path.encode()).hexdigest()
+        entries.append(contents_entry(owner, repo, entry_path, sha, 0 if is_dir else 1024 * (i + 1),
+                                      'dir' if is_dir else 'file'))
+    return entries
+
+
+def contents_entry(owner, repo, entry_path, sha, size, type_):
+    api_url = f'https://api.github.com/repos/{owner}/{repo}/contents/{entry_path}'
+    kind = 'tree' if type_ == 'dir' else 'blob'
+    html_url = f'https://github.com/{owner}/{repo}/{kind}/main/{entry_path}'
+    git_url = f'https://api.github.com/repos/{owner}/{repo}/git/{kind}s/{sha}'
+    return {
+        'name': entry_path.rsplit('/', 1)[-1],
+        'path': entry_path,
+        'sha': sha,
+        'size': size,
+        'url': f'{api_url}?ref=main',
+        'html_url': html_url,
+        'git_url': git_url,
+        'download_url': None if type_ == 'dir' else f'https://raw.githubusercontent.com/{owner}/{repo}/main/{entry_path}',
+        'type': type_,
+        '_links': {'self': api_url, 'git': git_url, 'html': html_url},
+    }
+
+
+class Fixtures:
+    """Recorded responses, plus /contents listings derived from the git tree"""
+
+    def __init__(self):
+        self.contents = {path: load_fixture(name) for path, name in CONTENTS_FIXTURES.items()}
+        self.commits = load_fixture('commits.json')
+        self.tree = load_fixture('git-tree.json')
+        self.head_sha = self.commits[0]['sha']
+        self.dirs = {}
+        for item in self.tree['tree']:
+            parent, _, _ = item['path'].rpartition('/')
+            self.dirs.setdefault(parent, []).append(item)
+
+    def listing(self, owner, repo, path):
+        if path in self.contents:
+            return self.contents[path]
+        items = self.dirs.get(path)
+        if items is None:
+            return contents_listing(owner, repo, path)
+        return [contents_entry(owner, repo, item['path'], item['sha'], item.get('size', 0),
+                               'dir' if item['type'] == 'tree' else 'file')
+                for item in items]
+
+
+class StubState:
+    """Shared counters and settings for the stub server"""
+
+    def __init__(self, latency=0.0, limit=5000, jitter=0.0, window=3600):
+        self.latency = latency
+        self.jitter = jitter
+        self.limit = limit
+        self.window = window
+        self.fixtures = Fixtures()
+        self.requests = 0
+        self.by_endpoint = Counter()
+        self.by_status = Counter()
+        self._windows = {}       # identity -> [remaining, reset]
+        self.lock = threading.Lock()
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(max(self.latency + random.uniform(-self.jitter, self.jitter), 0))
+
+    def consume(self, identity, endpoint, free=False):
+        """Count one call; returns (remaining, reset, allowed)"""
+        now = time.time()
+        with self.lock:
+            self.requests += 1
+            self.by_endpoint[endpoint] += 1
+            window = self._windows.get(identity)
+            if window is None or now >= window[1]:
+                window = self._windows[identity] = [self.limit, int(now + self.window)]
+            if free:
+                return window[0], window[1], True
+            if window[0] == 0:
+                return 0, window[1], False
+            window[0] -= 1
+            return window[0], window[1], True
+
+    def record_status(self, status):
+        with self.lock:
+            self.by_status[str(status)] += 1
+
+    def stats(self):
+        with self.lock:
+            return {'requests': self.requests, 'by_endpoint': dict(self.by_endpoint),
+                    'by_status': dict(self.by_status)}
+
+
+def endpoint_of(parts):
+    """Low-cardinality name for a stub path"""
+    if parts[0] != 'repos' or len(parts) < 4:
+        return parts[0]
+    if parts[3] == 'git' and len(parts) > 4:
+        return f'git/{parts[4]}'
+    return parts[3]
+
+
+class StubServer(ThreadingHTTPServer):
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    state = None
+
+    def do_GET(self):
+        state = self.state
+        path = unquote(self.path.split('?', 1)[0].strip('/'))
+        if path == '_stub/stats':
+            return self.send_body(200, json.dumps(state.stats()).encode(), None, None, None)
+
+        state.delay()
+        parts = path.split('/')
+        identity = self.headers.get('Authorization', 'anonymous')
+        if parts == ['rate_limit']:
+            # Checking the rate limit doesn't count against it
+            remaining, reset, _ = state.consume(identity, 'rate_limit', free=True)
+            rate = {'limit': state.limit, 'remaining': remaining, 'reset': reset}
+            body = json.dumps({'resources': {'core': rate}, 'rate': rate}).encode()
+            return self.send_body(200, body, None, (remaining, reset), None)
+
+        status, body, content_type = self.route(parts)
+        data = body if isinstance(body, bytes) else json.dumps(body).encode()
+        etag = '"' + hashlib.sha1(data).hexdigest() + '"'
+        not_modified = status == 200 and self.headers.get('If-None-Match') == etag
+
+        remaining, reset, allowed = state.consume(identity, endpoint_of(parts), free=not_modified)
+        if not allowed:
+            status, etag, content_type = 403, None, 'application/json; charset=utf-8'
+            data = json.dumps({'message': 'API rate limit exceeded',
+                               'documentation_url': 'https://docs.github.com/rest/rate-limit'}).encode()
+        elif not_modified:
+            status, data = 304, b''
+        self.send_body(status, data, etag, (remaining, reset), content_type)
+
+    def route(self, parts):
+        """(status, body, content_type) for a GitHub API path"""
+        state = self.state
+        json_type = 'application/json; charset=utf-8'
+        if len(parts) < 4 or parts[0] != 'repos':
+            return 404, {'message': 'Not Found'}, json_type
+
+        owner, repo, kind = parts[1], parts[2], parts[3]
+        fixtures = state.fixtures
+        if kind == 'contents':
+            return 200, fixtures.listing(owner, repo, '/'.join(parts[4:])), json_type
+        if kind == 'commits' and len(parts) == 4:
+            return 200, fixtures.commits, json_type
+        if kind == 'commits':
+            if 'application/vnd.github.sha' in self.headers.get('Accept', ''):
+                return 200, fixtures.head_sha.encode(), 'application/vnd.github.sha; charset=utf-8'
+            return 200, fixtures.commits[0], json_type
+        if kind == 'git' and len(parts) == 6 and parts[4] == 'trees':
+            return 200, dict(fixtures.tree, sha=parts[5]), json_type
+        return 404, {'message': 'Not Found'}, json_type
+
+    def send_body(self, status, data, etag, rate, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type or 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        if etag:
+            self.send_header('ETag', etag)
+        if rate:
+            self.send_header('X-RateLimit-Limit', str(self.state.limit))
+            self.send_header('X-RateLimit-Remaining', str(rate[0]))
+            self.send_header('X-RateLimit-Reset', str(rate[1]))
+            self.state.record_status(status)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(port=0, latency=0.0, limit=5000, jitter=0.0, window=3600):
+    """Create (but don't start) a stub server; port 0 picks a free port"""
+    state = StubState(latency, limit, jitter, window)
+    handler = type('BoundStubHandler', (StubHandler,), {'state': state})
+    return StubServer(('127.0.0.1', port), handler)
+
+
+def start_in_thread(port=0, latency=0.0, limit=5000, jitter=0.0, window=3600):
+    """Start a stub server in a daemon thread; returns (server, base_url)"""
+    server = make_server(port, latency, limit, jitter, window)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+# Helpers for benchmark scripts that run the stub and proxies as processes
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, timeout=20):
+    """Poll a URL until it answers or the timeout expires"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1)
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError(f'{url} did not come up')
+
+
+PROCFILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Procfile')
+
+SHELL_VAR_RE = re.compile(r'\$\{(\w+)(?::-([^}]*))?\}|\$(\w+)')
+
+
+def procfile_command(env):
+    """
+    The Procfile's web command as (argv, env): leading VAR=value words move
+    into the environment, and $VAR / ${VAR:-default} are expanded against
+    `env` (which should carry PORT), so no shell sits between us and gunicorn
+    """
+    with open(PROCFILE) as f:
+        line = next(line for line in f if line.startswith('web:'))
+    env = dict(env)
+
+    def expand(word):
+        return SHELL_VAR_RE.sub(lambda m: env.get(m.group(1) or m.group(3)) or m.group(2) or '', word)
+
+    words = shlex.split(line[len('web:'):])
+    while words and re.match(r'^[A-Za-z_]\w*=', words[0]):
+        name, value = words.pop(0).split('=', 1)
+        env[name] = expand(value)
+    return [expand(word) for word in words], env
+
+
+def spawn(latency=0.0, limit=5000, jitter=0.0, window=3600):
+    """Run the stub as a subprocess; returns (process, base_url)"""
+    port = free_port()
+    proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--port', str(port),
+                             '--latency', str(latency), '--jitter', str(jitter),
+                             '--limit', str(limit), '--window', str(window)],
+                            stdout=subprocess.DEVNULL)
+    wait_for(f'http://127.0.0.1:{port}/_stub/stats')
+    return proc, f'http://127.0.0.1:{port}'
+
+
+def stub_stats(base_url):
+    with urllib.request.urlopen(f'{base_url}/_stub/stats', timeout=5) as resp:
+        return json.loads(resp.read())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local GitHub API stub')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='+/- seconds added to latency')
+    parser.add_argument('--limit', type=int, default=5000, help='X-RateLimit-Limit per token')
+    parser.add_argument('--window', type=int, default=3600, help='rate limit window (seconds)')
+    args = parser.parse_args()
+
+    server = make_server(args.port, args.latency, args.limit, args.jitter, args.window)
+    print(f"🧪 GitHub stub on http://127.0.0.1:{args.port} (latency {args.latency}s)")
+    server.serve_forever()
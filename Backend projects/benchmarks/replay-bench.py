@@ -0,0 +1,373 @@
+"""
+Replay Benchmark
+================
+Drives the proxies with realistic traffic against the local GitHub stub
+(recorded fixtures, no network) and reports, per target and traffic mix:
+
+- throughput (client requests/s) and p50/p95/p99 latency
+- upstream calls per client request (counted by the stub)
+- peak RSS of the proxy process tree
+
+Targets:
+    secure        secure-proxy-server.py under the Procfile's gunicorn command
+    secure-async  secure-proxy-server.py with PROXY_ENGINE=async
+    legacy        github-proxy-server.py (only /api/github/... traffic)
+
+Mixes (paths from the recorded SOLIDWORKS-Projects tree, hot folders
+weighted like the portfolio pages request them):
+    browse   folder listings, ?fields= listings, last-commit badges
+    tree     the same folders through /api/tree (secure targets only)
+    cold     a unique path per request - every call goes upstream
+    replay   paths from --replay: a REQUEST_LOG_FILE export (JSON lines
+             with "endpoint") or one client path per line
+
+Usage:
+    python benchmarks/replay-bench.py
+    python benchmarks/replay-bench.py --targets secure --mixes browse --concurrency 32
+    python benchmarks/replay-bench.py --replay /tmp/proxy-requests.1234.jsonl
+    python benchmarks/replay-bench.py --env CACHE_TTL_RULES=.=0 --mixes browse
+    python benchmarks/replay-bench.py --save before.json
+    python benchmarks/replay-bench.py --compare before.json --max-regression 0.10
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+import subprocess
+from urllib.parse import quote
+
+import aiohttp
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import github_stub  # noqa: E402
+
+OWNER, REPO = 'Akhinoor14', 'SOLIDWORKS-Projects'
+FIELDS = 'name,path,type,size,sha,download_url,html_url'
+
+# One client IP drives every request: per-client admission would turn the
+# run into a measurement of fast 429s (--env can still turn it back on)
+BENCH_ENV = {'ADMISSION_RATE': '0', 'ADMISSION_MAX_ACTIVE': '0'}
+
+# Routes each target serves
+TARGET_ROUTES = {
+    'secure': ('/api/github/', '/api/tree/'),
+    'secure-async': ('/api/github/', '/api/tree/'),
+    'legacy': ('/api/github/',),
+}
+
+
+def start_target(name, stub_url, extra_env=None):
+    """Start one proxy against the stub; returns (process, base_url)"""
+    port = github_stub.free_port()
+    env = dict(os.environ, GITHUB_API_URL=stub_url, PORT=str(port), HOST='127.0.0.1',
+               **dict(BENCH_ENV, **(extra_env or {})))
+    if name == 'secure':
+        cmd, env = github_stub.procfile_command(env)
+    elif name == 'secure-async':
+        env['PROXY_ENGINE'] = 'async'
+        cmd = [sys.executable, 'secure-proxy-server.py']
+    else:
+        cmd = [sys.executable, 'github-proxy-server.py']
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    github_stub.wait_for(f'http://127.0.0.1:{port}/health')
+    return proc, f'http://127.0.0.1:{port}'
+
+
+# ---------------------------------------------------------------- traffic
+
+def folders():
+    """Directories of the recorded tree, hottest first (shallow before deep)"""
+    tree = github_stub.load_fixture('git-tree.json')['tree']
+    dirs = sorted((item['path'] for item in tree if item['type'] == 'tree'),
+                  key=lambda p: (p.count('/'), p))
+    return [''] + dirs
+
+
+def zipf_weights(n, s=1.1):
+    return [1 / (rank + 1) ** s for rank in range(n)]
+
+
+def github(path, query=''):
+    return f"/api/github/repos/{OWNER}/{REPO}/{quote(path, safe='/')}" + (f'?{query}' if query else '')
+
+
+def build_mix(name, replay_file=None):
+    """Returns (next_path(rng, i), routes the mix uses)"""
+    dirs = folders()
+    weights = zipf_weights(len(dirs))
+
+    def pick(rng):
+        return rng.choices(dirs, weights)[0]
+
+    if name == 'browse':
+        def next_path(rng, i):
+            roll = rng.random()
+            folder = pick(rng)
+            if roll < 0.55:
+                return github(f'contents/{folder}'.rstrip('/'))
+            if roll < 0.75:
+                return github(f'contents/{folder}'.rstrip('/'), f'fields={FIELDS}')
+            if roll < 0.95:
+                return github('commits', f"path={quote(folder)}&per_page=1")
+            return github('commits/main')
+        return next_path, {'/api/github/'}
+
+    if name == 'tree':
+        def next_path(rng, i):
+            if rng.random() < 0.9:
+                return f"/api/tree/{OWNER}/{REPO}?ref=main&prefix={quote(pick(rng))}"
+            return github('commits', f"path={quote(pick(rng))}&per_page=1")
+        return next_path, {'/api/github/', '/api/tree/'}
+
+    if name == 'cold':
+        return (lambda rng, i: github(f'contents/bench/cold/{i}')), {'/api/github/'}
+
+    if name == 'replay':
+        paths = load_replay(replay_file)
+        routes = {'/' + '/'.join(p.split('/')[1:3]) + '/' for p in paths}
+        return (lambda rng, i: paths[i % len(paths)]), routes
+
+    raise SystemExit(f'Unknown mix: {name}')
+
+
+def load_replay(path):
+    """Client paths from a request log export or a plain path list"""
+    if not path:
+        raise SystemExit('--replay FILE is needed for the replay mix')
+    paths = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('{'):
+                endpoint = json.loads(line).get('endpoint', '')
+                if not endpoint or endpoint.startswith('raw/'):
+                    continue   # Raw downloads don't record their ref
+                line = '/api/github/' + quote(endpoint, safe='/?=&')
+            paths.append(line)
+    if not paths:
+        raise SystemExit(f'No replayable requests in {path}')
+    return paths
+
+
+# -------------------------------------------------------------- measuring
+
+def tree_rss(pid):
+    """Resident memory (bytes) of a process and its descendants (Linux /proc)"""
+    total = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children') as f:
+                    stack.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+class RssSampler:
+    """Peak RSS of a process tree, sampled in a background thread"""
+
+    def __init__(self, pid, interval=0.2):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, tree_rss(self.pid))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, tree_rss(self.pid))
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(p / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+async def drive(base_url, next_path, total, concurrency, seed, offset=0):
+    """Send `total` requests with `concurrency` in flight; returns latencies and statuses"""
+    rng = random.Random(seed)
+    paths = [next_path(rng, offset + i) for i in range(total)]
+    latencies = []
+    statuses = {}
+    queue = iter(paths)
+
+    async def worker(session):
+        for path in queue:
+            started = time.perf_counter()
+            try:
+                async with session.get(base_url + path) as resp:
+                    await resp.read()
+                    status = str(resp.status)
+            except aiohttp.ClientError:
+                status = 'error'
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return sorted(latencies), statuses, elapsed
+
+
+def run_case(target, mix, next_path, stub_url, args):
+    proc, base_url = start_target(target, stub_url, args.env)
+    try:
+        if args.warmup:
+            asyncio.run(drive(base_url, next_path, args.warmup, args.concurrency, args.seed + 1))
+        before = github_stub.stub_stats(stub_url)['requests']
+        with RssSampler(proc.pid) as rss:
+            latencies, statuses, elapsed = asyncio.run(
+                drive(base_url, next_path, args.requests, args.concurrency, args.seed, args.warmup))
+        upstream = github_stub.stub_stats(stub_url)['requests'] - before
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    errors = sum(n for status, n in statuses.items() if status not in ('200', '304'))
+    return {
+        'target': target,
+        'mix': mix,
+        'requests': len(latencies),
+        'concurrency': args.concurrency,
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'upstream_per_request': round(upstream / len(latencies), 3),
+        'rss_mb': round(rss.peak / 1024 / 1024, 1),
+        'errors': errors,
+        'statuses': statuses,
+    }
+
+
+# -------------------------------------------------------------- reporting
+
+HEADER = (f"{'target':<14}{'mix':<8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'up/req':>8}{'RSS MB':>8}{'errors':>8}")
+
+
+def format_row(r):
+    return (f"{r['target']:<14}{r['mix']:<8}{r['rps']:>9.1f}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}"
+            f"{r['p99_ms']:>9.1f}{r['upstream_per_request']:>8.3f}{r['rss_mb']:>8.1f}{r['errors']:>8}")
+
+
+def compare(results, baseline_file, max_regression):
+    """Print changes vs a saved run; returns the regressions found"""
+    with open(baseline_file) as f:
+        baseline = {(r['target'], r['mix']): r for r in json.load(f)}
+    regressions = []
+    print(f"\nvs {baseline_file}:")
+    print(f"{'target':<14}{'mix':<8}{'req/s':>10}{'p95':>10}{'p99':>10}{'up/req':>10}{'RSS':>10}")
+    for r in results:
+        old = baseline.get((r['target'], r['mix']))
+        if not old:
+            continue
+        deltas = {}
+        for key in ('rps', 'p95_ms', 'p99_ms', 'upstream_per_request', 'rss_mb'):
+            deltas[key] = (r[key] - old[key]) / old[key] if old[key] else 0.0
+        print(f"{r['target']:<14}{r['mix']:<8}" + ''.join(f'{d:>+10.1%}' for d in deltas.values()))
+        # Lower is better for everything but throughput
+        worse = {k: d for k, d in deltas.items() if (-d if k == 'rps' else d) > max_regression}
+        if worse:
+            regressions.append((r['target'], r['mix'], worse))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay traffic against the proxies (offline)')
+    parser.add_argument('--targets', default='secure,secure-async,legacy')
+    parser.add_argument('--mixes', default='browse,tree,cold')
+    parser.add_argument('--replay', help='request log export or path list (adds the replay mix)')
+    parser.add_argument('--requests', type=int, default=2000, help='measured requests per case')
+    parser.add_argument('--warmup', type=int, default=200, help='unmeasured requests first')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0.05, help='stub latency (seconds)')
+    parser.add_argument('--jitter', type=float, default=0.02, help='stub latency jitter (seconds)')
+    parser.add_argument('--limit', type=int, default=1000000, help='stub rate limit per token')
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='extra environment for the proxies (repeatable)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save', help='write results as JSON')
+    parser.add_argument('--compare', help='JSON from an earlier --save run')
+    parser.add_argument('--max-regression', type=float, default=0.10,
+                        help='allowed relative slowdown before exiting non-zero')
+    args = parser.parse_args()
+    args.env = dict(item.split('=', 1) for item in args.env)
+
+    mixes = [m for m in args.mixes.split(',') if m]
+    if args.replay and 'replay' not in mixes:
+        mixes.append('replay')
+
+    stub, stub_url = github_stub.spawn(args.latency, args.limit, args.jitter)
+    results = []
+    try:
+        print(f"Stub latency {args.latency}s ±{args.jitter}s, {args.requests} requests "
+              f"(+{args.warmup} warm-up) at concurrency {args.concurrency}\n")
+        print(HEADER)
+        print('-' * len(HEADER))
+        for target in args.targets.split(','):
+            for mix in mixes:
+                next_path, routes = build_mix(mix, args.replay)
+                if not routes.issubset(TARGET_ROUTES[target]):
+                    continue
+                result = run_case(target, mix, next_path, stub_url, args)
+                results.append(result)
+                print(format_row(result))
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved {args.save}")
+    failed = False
+    # Throughput of rejected requests isn't a speedup
+    for r in results:
+        if r['errors']:
+            print(f"❌ {r['target']}/{r['mix']}: {r['errors']} responses other than 200/304")
+            failed = True
+    if args.compare:
+        regressions = compare(results, args.compare, args.max_regression)
+        for target, mix, worse in regressions:
+            print(f"❌ {target}/{mix}: " + ', '.join(f'{k} {d:+.1%}' for k, d in worse.items()))
+        failed = failed or bool(regressions)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
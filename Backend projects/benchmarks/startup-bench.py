@@ -0,0 +1,185 @@
+"""
+Startup Benchmark
+=================
+Cold-start cost of secure-proxy-server.py for each way it is launched:
+
+    main        python main.py (Railway / Docker start command)
+    script      python secure-proxy-server.py (recompiled every start)
+    gunicorn    the Procfile's command (2 gthread workers, --preload)
+    async       PROXY_ENGINE=async python main.py
+
+Reports (median of --runs):
+    import      importing the module in a fresh interpreter
+    healthy     process start -> first 200 from /health
+    first req   first /api/github call (token decryption, upstream connect)
+    warm req    the same call again (response cache hit)
+    restart     gunicorn only: all workers killed -> /health answers again
+
+A throwaway tokens.enc with dummy tokens is used so lazy decryption is
+part of the measurement; upstream calls go to the local GitHub stub.
+Exits non-zero when a median is over budget.
+
+Usage:
+    python benchmarks/startup-bench.py
+    python benchmarks/startup-bench.py --launchers main,gunicorn --runs 10
+    python benchmarks/startup-bench.py --budget-healthy 1.0 --budget-import 0.5
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import tempfile
+import statistics
+import subprocess
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import github_stub  # noqa: E402
+
+PROBE_PATH = '/api/github/repos/Akhinoor14/SOLIDWORKS-Projects/contents/CW'
+
+IMPORT_SNIPPET = (
+    "import time, importlib; t = time.perf_counter(); "
+    "importlib.import_module('secure-proxy-server'); print(time.perf_counter() - t)"
+)
+
+
+def make_tokens_file(directory, count=3):
+    """Encrypted tokens.enc with dummy tokens; returns (path, secret_key)"""
+    from cryptography.fernet import Fernet
+    key = Fernet.generate_key().decode()
+    tokens = [f'ghp_startupbench{i:02d}' + 'x' * 24 for i in range(count)]
+    path = os.path.join(directory, 'tokens.enc')
+    with open(path, 'w') as f:
+        f.write(Fernet(key.encode()).encrypt(json.dumps(tokens).encode()).decode())
+    return path, key
+
+
+def launcher_cmd(name, port):
+    if name == 'gunicorn':
+        cmd, env = github_stub.procfile_command({'PORT': str(port)})
+        return cmd, {k: v for k, v in env.items() if k != 'PORT'}
+    if name == 'script':
+        return [sys.executable, 'secure-proxy-server.py'], {}
+    if name == 'async':
+        return [sys.executable, 'main.py'], {'PROXY_ENGINE': 'async'}
+    return [sys.executable, 'main.py'], {}
+
+
+def poll(url, timeout=30, interval=0.005):
+    """Seconds until `url` answers 200"""
+    started = time.perf_counter()
+    deadline = started + timeout
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as resp:
+                if resp.status == 200:
+                    return time.perf_counter() - started
+        except Exception:
+            pass
+        time.sleep(interval)
+    raise RuntimeError(f'{url} did not answer within {timeout}s')
+
+
+def timed_get(url):
+    started = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=30) as resp:
+        resp.read()
+    return time.perf_counter() - started
+
+
+def worker_pids(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def measure_import(env, runs):
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', IMPORT_SNIPPET], cwd=BACKEND_DIR, env=env,
+                             capture_output=True, text=True, check=True).stdout
+        samples.append(float(out.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+
+def measure_launch(name, env):
+    """One cold start; returns {metric: seconds}"""
+    port = github_stub.free_port()
+    cmd, extra = launcher_cmd(name, port)
+    run_env = dict(env, PORT=str(port), HOST='127.0.0.1', **extra)
+    base = f'http://127.0.0.1:{port}'
+    started = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=run_env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        poll(f'{base}/health', interval=0.002)
+        result = {'healthy': time.perf_counter() - started}
+        result['first req'] = timed_get(base + PROBE_PATH)
+        result['warm req'] = timed_get(base + PROBE_PATH)
+        if name == 'gunicorn':
+            for pid in worker_pids(proc.pid):
+                os.kill(pid, signal.SIGKILL)
+            result['restart'] = poll(f'{base}/health', interval=0.002)
+        return result
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold start / time-to-healthy benchmark')
+    parser.add_argument('--launchers', default='main,script,gunicorn,async')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-healthy', type=float, default=1.0,
+                        help='max median seconds to healthy (any launcher)')
+    parser.add_argument('--budget-import', type=float, default=0.5,
+                        help='max median seconds to import the module')
+    args = parser.parse_args()
+
+    stub, stub_url = github_stub.spawn()
+    tmp = tempfile.TemporaryDirectory(prefix='startup-bench-')
+    tokens_file, secret_key = make_tokens_file(tmp.name)
+    env = dict(os.environ, GITHUB_API_URL=stub_url, TOKENS_FILE=tokens_file, SECRET_KEY=secret_key)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)   # Measure with cached bytecode, as deployed
+    over_budget = []
+    try:
+        subprocess.run([sys.executable, '-c', IMPORT_SNIPPET], cwd=BACKEND_DIR, env=env,
+                       capture_output=True, check=True)    # Warm __pycache__ and the disk cache
+        import_time = measure_import(env, args.runs)
+        print(f"import secure-proxy-server: {import_time * 1000:.0f} ms "
+              f"(budget {args.budget_import * 1000:.0f} ms)\n")
+        if import_time > args.budget_import:
+            over_budget.append(f'import {import_time * 1000:.0f} ms')
+
+        metrics = ('healthy', 'first req', 'warm req', 'restart')
+        print(f"{'launcher':<10}" + ''.join(f'{m:>12}' for m in metrics) + '   (ms, median)')
+        for name in args.launchers.split(','):
+            runs = [measure_launch(name, env) for _ in range(args.runs)]
+            medians = {m: statistics.median(r[m] for r in runs) for m in metrics if m in runs[0]}
+            print(f'{name:<10}' + ''.join(
+                f"{medians[m] * 1000:>12.1f}" if m in medians else f"{'-':>12}" for m in metrics))
+            if medians['healthy'] > args.budget_healthy:
+                over_budget.append(f"{name} healthy {medians['healthy'] * 1000:.0f} ms")
+    finally:
+        stub.terminate()
+        stub.wait()
+        tmp.cleanup()
+
+    print(f"\nBudget: healthy <= {args.budget_healthy * 1000:.0f} ms")
+    if over_budget:
+        print('❌ Over budget: ' + ', '.join(over_budget))
+        sys.exit(1)
+    print('✅ Within budget')
+
+
+if __name__ == '__main__':
+    main()
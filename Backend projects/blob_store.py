@@ -0,0 +1,141 @@
+"""
+Content-Addressed Blob Store
+============================
+On-disk cache for raw repository files (SLDPRT, SLDDRW, GLB, images),
+keyed by git blob SHA. A blob is downloaded once per version and then
+served from disk to every visitor.
+
+Features:
+- Files stored as <root>/<sha[:2]>/<sha[2:]>, shared by all workers
+- Git blob SHA verified while streaming the download to disk
+- Total size bounded; least recently served blobs evicted first
+
+Environment Variables:
+    BLOB_CACHE_DIR=/tmp/proxy-blobs
+    BLOB_CACHE_MAX_BYTES=1073741824
+"""
+
+import os
+import hashlib
+import threading
+
+
+class BlobIntegrityError(Exception):
+    """Downloaded bytes don't hash to the expected git blob SHA"""
+
+
+def git_blob_hasher(size):
+    """sha1 pre-seeded with the git blob header for a file of `size` bytes"""
+    return hashlib.sha1(b'blob %d\0' % size)
+
+
+class BlobStore:
+    """Size-bounded, content-addressed file cache"""
+
+    def __init__(self, root, max_bytes=1024 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._approx_bytes = None
+        self.counters = {'hits': 0, 'downloads': 0, 'download_bytes': 0, 'evictions': 0}
+
+    def path_for(self, sha):
+        return os.path.join(self.root, sha[:2], sha[2:])
+
+    def get(self, sha):
+        """Local path of a cached blob (marked recently used) or None"""
+        path = self.path_for(sha)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self.counters['hits'] += 1
+        return path
+
+    def put_stream(self, sha, size, chunks):
+        """Write chunks to disk, verifying the git blob SHA; returns the path"""
+        path = self.path_for(sha)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        hasher = git_blob_hasher(size)
+        written = 0
+        try:
+            with open(tmp, 'wb') as f:
+                for chunk in chunks:
+                    hasher.update(chunk)
+                    f.write(chunk)
+                    written += len(chunk)
+            if written != size or hasher.hexdigest() != sha:
+                raise BlobIntegrityError(f'Blob {sha} failed verification ({written} bytes)')
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+        with self._lock:
+            self.counters['downloads'] += 1
+            self.counters['download_bytes'] += written
+            if self._approx_bytes is not None:
+                self._approx_bytes += written
+        if self._total_bytes() > self.max_bytes:
+            self.evict()
+        return path
+
+    def _scan(self):
+        """(mtime, size, path) for every stored blob"""
+        files = []
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_mtime, st.st_size, entry.path))
+        return files
+
+    def _total_bytes(self):
+        with self._lock:
+            if self._approx_bytes is not None:
+                return self._approx_bytes
+        total = sum(size for _, size, _ in self._scan())
+        with self._lock:
+            self._approx_bytes = total
+        return total
+
+    def evict(self):
+        """Delete least recently used blobs until under 90% of max_bytes"""
+        files = sorted(self._scan())
+        total = sum(size for _, size, _ in files)
+        target = self.max_bytes * 0.9
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            with self._lock:
+                self.counters['evictions'] += 1
+        with self._lock:
+            # Scan covers blobs written by every worker
+            self._approx_bytes = total
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, root=self.root, max_bytes=self.max_bytes,
+                        approx_bytes=self._approx_bytes)
+
+
+def blob_store_from_env():
+    return BlobStore(
+        os.getenv('BLOB_CACHE_DIR', '/tmp/proxy-blobs'),
+        max_bytes=int(os.getenv('BLOB_CACHE_MAX_BYTES', 1024 * 1024 * 1024)),
+    )
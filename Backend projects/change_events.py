@@ -0,0 +1,200 @@
+"""
+Repository Change Events
+========================
+GitHub push webhooks in, Server-Sent Events out. A push invalidates
+exactly the cached listings it touched and is fanned out to every
+connected browser, so the frontend no longer has to poll for changes.
+
+Features:
+- X-Hub-Signature-256 (HMAC-SHA256) verification of webhook bodies
+- Push payload -> changed files, their parent directories and branch
+- EventBroker: per-process fan-out to thread and asyncio subscribers,
+  with a short history so reconnecting clients can resume (Last-Event-ID)
+
+Environment Variables:
+    GITHUB_WEBHOOK_SECRET=...      # Enables POST /api/webhooks/github
+    EVENTS_HEARTBEAT=15            # Seconds between SSE keep-alive comments
+    EVENTS_MAX_CLIENTS=50          # SSE connections per process
+"""
+
+import os
+import re
+import hmac
+import json
+import time
+import queue
+import hashlib
+import threading
+from collections import deque
+from urllib.parse import parse_qsl
+
+EVENTS_HEARTBEAT = float(os.getenv('EVENTS_HEARTBEAT', 15))
+
+# Cached paths under repos/<owner>/<repo>/ that a push can change.
+# Anything addressed by a commit/tree/blob SHA is immutable.
+MUTABLE_REPO_PATHS = re.compile(
+    r'^(|contents(/.*)?|commits(/(?![0-9a-f]{40}$)[^/]+)?|branches(/.*)?|git/refs(/.*)?|readme|compare/.*)$')
+SHA_RE = re.compile(r'^[0-9a-f]{40}$')
+
+
+def verify_signature(secret, body, signature):
+    """Check a `sha256=<hex>` X-Hub-Signature-256 header against the raw body"""
+    if not secret or not signature or not signature.startswith('sha256='):
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature[len('sha256='):])
+
+
+def parent_dirs(path):
+    """'CW/Day 01/a.SLDPRT' -> ['CW/Day 01', 'CW', '']"""
+    parts = path.split('/')[:-1]
+    return ['/'.join(parts[:i]) for i in range(len(parts), -1, -1)]
+
+
+def push_event(payload):
+    """Summarize a push webhook payload as a change event"""
+    repository = payload.get('repository') or {}
+    ref = payload.get('ref', '')
+    paths = set()
+    for commit in payload.get('commits') or []:
+        for key in ('added', 'modified', 'removed'):
+            paths.update(commit.get(key) or [])
+    dirs = set()
+    for path in paths:
+        dirs.update(parent_dirs(path))
+    # No reliable file list - treat the whole branch as changed
+    full = bool(payload.get('forced') or payload.get('created') or
+                payload.get('deleted') or not paths)
+    return {
+        'type': 'push',
+        'repo': repository.get('full_name', ''),
+        'branch': ref[len('refs/heads/'):] if ref.startswith('refs/heads/') else ref,
+        'default_branch': repository.get('default_branch'),
+        'before': payload.get('before'),
+        'after': payload.get('after'),
+        'paths': sorted(paths),
+        'dirs': sorted(dirs),
+        'full': full,
+        'time': time.time(),
+    }
+
+
+def affects_cache_key(event, key):
+    """Could this push have changed the response cached under `key`?"""
+    path, _, query = key.partition('?')
+    prefix = f"repos/{event['repo']}"
+    if path != prefix and not path.startswith(prefix + '/'):
+        return False
+    params = dict(parse_qsl(query))
+    ref = params.get('ref') or params.get('sha')
+    if ref:
+        if ref != event['branch'] or SHA_RE.match(ref):
+            return False
+    elif event['default_branch'] and event['branch'] != event['default_branch']:
+        return False
+
+    rest = path[len(prefix):].strip('/')
+    if not MUTABLE_REPO_PATHS.match(rest):
+        return False
+    if event['full'] or not rest.startswith('contents'):
+        return True
+    target = rest[len('contents'):].strip('/')
+    return target in event['dirs'] or target in event['paths']
+
+
+def format_sse(event):
+    """One Server-Sent Events frame"""
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+def ready_frame(webhooks_enabled):
+    """First frame of a stream; clients keep polling when webhooks are off"""
+    return f"retry: 5000\nevent: ready\ndata: {json.dumps({'webhooks': webhooks_enabled})}\n\n"
+
+
+class Subscription:
+    """Thread-side subscriber: a queue the SSE generator blocks on"""
+
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=100)
+
+    def deliver(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            pass  # Slow client - it will resync on its next full refresh
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class AsyncSubscription:
+    """Event-loop subscriber; safe to deliver to from any thread"""
+
+    def __init__(self, loop, async_queue):
+        self.loop = loop
+        self.queue = async_queue
+
+    def deliver(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        if not self.queue.full():
+            self.queue.put_nowait(event)
+
+
+class EventBroker:
+    """Fan-out of change events to this process's SSE clients"""
+
+    def __init__(self, history=100, max_clients=50):
+        self.max_clients = max_clients
+        self._history = deque(maxlen=history)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.counters = {'published': 0, 'delivered': 0, 'rejected': 0}
+
+    def publish(self, event):
+        with self._lock:
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+            self.counters['published'] += 1
+            self.counters['delivered'] += len(subscribers)
+        for sub in subscribers:
+            sub.deliver(event)
+
+    def subscribe(self, sub, last_event_id=None):
+        """Register a subscriber; replays missed events after last_event_id"""
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients:
+                self.counters['rejected'] += 1
+                return False
+            self._subscribers.add(sub)
+            missed = [e for e in self._history
+                      if last_event_id is not None and e['id'] > last_event_id]
+        for event in missed:
+            sub.deliver(event)
+        return True
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, clients=len(self._subscribers),
+                        max_clients=self.max_clients,
+                        last_event_id=self._history[-1]['id'] if self._history else None)
+
+
+def parse_last_event_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def broker_from_env():
+    return EventBroker(max_clients=int(os.getenv('EVENTS_MAX_CLIENTS', 50)))
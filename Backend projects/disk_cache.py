@@ -0,0 +1,262 @@
+"""
+Persistent Disk Tier for the Response Cache
+===========================================
+The in-memory response cache dies with every worker restart and
+redeploy, and `--workers 2` keeps two copies of it. This tier sits
+under it in one local SQLite file (WAL mode) that every worker reads
+and writes, so warm entries survive restarts and are fetched from
+GitHub once for all workers.
+
+Features:
+- Compact binary records: fixed struct header + headers + raw body,
+  with a CRC32 over the payload checked on every read
+- Reads through SQLite's memory-mapped I/O (PRAGMA mmap_size), from a
+  small per-process pool of read connections
+- Writes, access-time updates and evictions batched by one background
+  writer thread per worker; the request path never waits on a write
+- Size-bounded: least recently read entries evicted past DISK_CACHE_MAX_BYTES,
+  and entries expired for longer than the stale window are dropped
+
+Environment Variables:
+    DISK_CACHE_PATH=/tmp/proxy-cache.db     # Enables the disk tier
+    DISK_CACHE_MAX_BYTES=268435456          # Total record bytes kept
+    DISK_CACHE_MMAP_BYTES=268435456         # SQLite mmap_size for reads
+"""
+
+import os
+import time
+import queue
+import zlib
+import struct
+import sqlite3
+import threading
+
+# magic, format version, status, stored_at, expires_at, headers length, body length, crc32
+RECORD = struct.Struct('<2sBHddIII')
+MAGIC = b'PX'
+VERSION = 1
+
+# Reads refresh an entry's LRU position at most this often (it costs a write)
+TOUCH_INTERVAL = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at);
+"""
+
+
+class CorruptRecord(ValueError):
+    """Stored bytes don't decode or fail their checksum"""
+
+
+def encode_record(status, body, headers, stored_at, expires_at):
+    """Cached response -> bytes"""
+    header_bytes = '\0'.join(f'{name}\0{value}' for name, value in headers.items()).encode()
+    crc = zlib.crc32(body, zlib.crc32(header_bytes))
+    return b''.join((RECORD.pack(MAGIC, VERSION, status, stored_at, expires_at,
+                                 len(header_bytes), len(body), crc), header_bytes, body))
+
+
+def decode_record(data):
+    """bytes -> (status, body, headers, stored_at, expires_at); raises CorruptRecord"""
+    if len(data) < RECORD.size:
+        raise CorruptRecord('Truncated record')
+    magic, version, status, stored_at, expires_at, headers_len, body_len, crc = \
+        RECORD.unpack_from(data)
+    if magic != MAGIC or version != VERSION or len(data) != RECORD.size + headers_len + body_len:
+        raise CorruptRecord('Bad record header')
+    view = memoryview(data)
+    header_bytes = view[RECORD.size:RECORD.size + headers_len]
+    body = view[RECORD.size + headers_len:]
+    if zlib.crc32(body, zlib.crc32(header_bytes)) != crc:
+        raise CorruptRecord('Checksum mismatch')
+    parts = bytes(header_bytes).decode().split('\0') if headers_len else []
+    return status, bytes(body), dict(zip(parts[::2], parts[1::2])), stored_at, expires_at
+
+
+class DiskCache:
+    """SQLite-backed cache tier shared by every worker on the host"""
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, mmap_bytes=256 * 1024 * 1024,
+                 retain=86400, readers=4):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.mmap_bytes = mmap_bytes
+        self.retain = retain          # Seconds past expiry an entry is still worth keeping
+        self.readers = readers
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._readers = None
+        self._queue = None
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0, 'expired': 0,
+                         'corrupt': 0, 'dropped': 0, 'errors': 0}
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA mmap_size={int(self.mmap_bytes)}')
+        return conn
+
+    def _ensure_started(self):
+        # Connections and the writer thread are per process - gunicorn forks after import
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            writer = self._connect()
+            writer.executescript(SCHEMA)
+            self._readers = queue.LifoQueue()
+            for _ in range(self.readers):
+                self._readers.put(self._connect())
+            self._queue = queue.Queue(maxsize=10000)
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, args=(writer,), name='disk-cache-writer',
+                             daemon=True).start()
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    # ---- reads (request threads) ----
+
+    def get(self, key):
+        """(status, body, headers, stored_at, expires_at) or None"""
+        self._ensure_started()
+        conn = self._readers.get()
+        try:
+            row = conn.execute('SELECT data, accessed_at FROM entries WHERE key = ?', (key,)).fetchone()
+        except sqlite3.Error:
+            self._count('errors')  # Unreadable: answer as a miss, memory tier still works
+            return None
+        finally:
+            self._readers.put(conn)
+        if row is None:
+            self._count('misses')
+            return None
+        try:
+            record = decode_record(row[0])
+        except CorruptRecord:
+            self._count('corrupt')
+            self._enqueue(('delete', key))
+            return None
+        self._count('hits')
+        if time.time() - row[1] > TOUCH_INTERVAL:
+            self._enqueue(('touch', key))
+        return record
+
+    # ---- writes (queued for the writer thread) ----
+
+    def put(self, key, status, body, headers, stored_at, expires_at):
+        self._ensure_started()
+        self._enqueue(('put', key, encode_record(status, body, headers, stored_at, expires_at),
+                       expires_at))
+
+    def invalidate(self, predicate, timeout=5):
+        """Drop matching keys; waits until queued writes before it are applied"""
+        self._ensure_started()
+        done = threading.Event()
+        self._queue.put(('invalidate', predicate, done))
+        done.wait(timeout)
+
+    def clear(self):
+        self.invalidate(lambda key: True)
+
+    def _enqueue(self, op):
+        try:
+            self._queue.put_nowait(op)
+        except queue.Full:
+            self._count('dropped')  # Never block a request on the disk
+
+    def _run(self, conn):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 500:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._apply(conn, batch)
+            except Exception as e:
+                print(f"⚠️  Disk cache write failed: {e}")
+            finally:
+                for op in batch:
+                    if op[0] == 'invalidate':
+                        op[2].set()
+
+    def _apply(self, conn, batch):
+        now = time.time()
+        writes = 0
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for op in batch:
+                kind = op[0]
+                if kind == 'put':
+                    _, key, data, expires_at = op
+                    conn.execute('INSERT OR REPLACE INTO entries (key, data, size, expires_at, accessed_at) '
+                                 'VALUES (?, ?, ?, ?, ?)', (key, data, len(data), expires_at, now))
+                    writes += 1
+                elif kind == 'touch':
+                    conn.execute('UPDATE entries SET accessed_at = ? WHERE key = ?', (now, op[1]))
+                elif kind == 'delete':
+                    conn.execute('DELETE FROM entries WHERE key = ?', (op[1],))
+                elif kind == 'invalidate':
+                    keys = [k for (k,) in conn.execute('SELECT key FROM entries') if op[1](k)]
+                    conn.executemany('DELETE FROM entries WHERE key = ?', [(k,) for k in keys])
+            if writes:
+                self._evict(conn, now)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self._count('writes', writes)
+
+    def _evict(self, conn, now):
+        expired = conn.execute('DELETE FROM entries WHERE expires_at < ?', (now - self.retain,)).rowcount
+        self._count('expired', expired)
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Least recently read first, down to 90% so every write doesn't evict
+        target = total - int(self.max_bytes * 0.9)
+        victims, freed = [], 0
+        for key, size in conn.execute('SELECT key, size FROM entries ORDER BY accessed_at').fetchall():
+            victims.append((key,))
+            freed += size
+            if freed >= target:
+                break
+        conn.executemany('DELETE FROM entries WHERE key = ?', victims)
+        self._count('evictions', len(victims))
+
+    def stats(self):
+        self._ensure_started()
+        conn = self._readers.get()
+        try:
+            entries, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        finally:
+            self._readers.put(conn)
+        with self._lock:
+            counters = dict(self.counters)
+        return dict(counters, path=self.path, entries=entries, bytes=size, max_bytes=self.max_bytes,
+                    queued=self._queue.qsize())
+
+
+def disk_cache_from_env(retain=86400):
+    path = os.getenv('DISK_CACHE_PATH')
+    if not path:
+        return None
+    return DiskCache(
+        path,
+        max_bytes=int(os.getenv('DISK_CACHE_MAX_BYTES', 256 * 1024 * 1024)),
+        mmap_bytes=int(os.getenv('DISK_CACHE_MMAP_BYTES', 256 * 1024 * 1024)),
+        retain=retain,
+    )
@@ -0,0 +1,446 @@
+"""
+Atomic Multi-File Commits
+=========================
+github-uploader.js used to PUT /contents once per file: a GET for the
+existing sha plus a base64 PUT each, one commit per file and another for
+the README, and a half-uploaded project when anything failed midway.
+This builds the whole upload as one commit through the Git Data API:
+
+    GET   git/ref/heads/<branch>        head commit
+    POST  git/blobs          x N        new file contents, in parallel (COMMIT_WORKERS)
+    GET   git/commits/<head>            base tree
+    POST  git/trees                     base tree + new entries
+    POST  git/commits                   one commit, parent = head
+    PATCH git/refs/heads/<branch>       fast-forward only
+
+Nothing is visible until the ref moves, so a failure at any step leaves
+the branch untouched (orphaned blobs/trees are garbage-collected by
+GitHub). If the branch moved meanwhile, tree and commit are rebuilt on
+the new head (blobs are reused), up to COMMIT_RETRIES times.
+
+Re-uploads only push what changed: the git blob SHA of every file is
+computed as it arrives, and files whose blob the repo already has
+(unchanged, or the same bytes at another path) are not uploaded again.
+The repo's path -> blob SHA index is the tree index at the head commit
+(tree_index.py), advanced in place after each commit made here.
+
+Request:
+    POST /api/commit/<owner>/<repo>
+    Authorization: token <user's GitHub token>   # never the proxy's pooled tokens
+    {"branch": "main", "message": "Add CW 01 - Day 06",
+     "files": [{"path": "CW/Day 06/cw 01 day 6/part.SLDPRT", "content": "<base64>"},
+               {"path": "CW/Day 06/cw 01 day 6/README.md", "content": "# ...", "encoding": "utf-8"}]}
+
+    or multipart/form-data, streamed to disk and hashed as it is read:
+        manifest   {"branch", "message", "files": [{"path": ..., "size": ...}]}  (first part)
+        <path>     file contents, one part per manifest entry
+
+Environment Variables:
+    COMMIT_MAX_FILES=100          # Files per commit
+    COMMIT_MAX_BYTES=104857600    # Decoded bytes per commit
+    COMMIT_WORKERS=8              # Blobs uploaded at once
+    COMMIT_RETRIES=3              # Rebuilds when the branch moved underneath
+"""
+
+import os
+import json
+import time
+import base64
+import hashlib
+import binascii
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+from tree_index import GITHUB_WEB
+from upstream_client import GITHUB_RAW
+
+COMMIT_MAX_FILES = int(os.getenv('COMMIT_MAX_FILES', 100))
+COMMIT_MAX_BYTES = int(os.getenv('COMMIT_MAX_BYTES', 100 * 1024 * 1024))
+
+FILE_MODE = '100644'
+
+# Multipart parts are read this much at a time; files spill to disk past SPOOL_BYTES
+READ_CHUNK = 64 * 1024
+SPOOL_BYTES = 1024 * 1024
+MANIFEST_MAX_BYTES = 1024 * 1024
+
+
+class CommitError(Exception):
+    """Upload rejected or failed; `status` is the HTTP status to answer with"""
+
+    def __init__(self, message, status, step=None):
+        super().__init__(message)
+        self.status = status
+        self.step = step
+
+
+class BranchMoved(CommitError):
+    """The ref was updated by someone else between reading and moving it"""
+
+    def __init__(self):
+        super().__init__('Branch moved during the commit', 409, 'ref')
+
+
+def blob_header(size):
+    """What git hashes in front of a blob's bytes"""
+    return b'blob %d\0' % size
+
+
+def blob_sha(data):
+    """Git blob SHA of in-memory bytes (what `git hash-object` prints)"""
+    digest = hashlib.sha1(blob_header(len(data)))
+    digest.update(data)
+    return digest.hexdigest()
+
+
+class UploadFile:
+    """One file of an upload: path, size, git blob SHA, and its bytes in memory or spooled"""
+
+    def __init__(self, path, size, sha, data=None, spool=None):
+        self.path = path
+        self.size = size
+        self.sha = sha
+        self._data = data
+        self._spool = spool
+
+    def read(self):
+        if self._data is not None:
+            return self._data
+        self._spool.seek(0)
+        return self._spool.read()
+
+    def close(self):
+        if self._spool is not None:
+            self._spool.close()
+
+
+class StreamedFile:
+    """Multipart file part being received: hashed and spooled chunk by chunk"""
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self.received = 0
+        self.digest = hashlib.sha1(blob_header(size))  # Size is declared up front in the manifest
+        self.spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+
+    def write(self, chunk):
+        self.received += len(chunk)
+        if self.received > self.size:
+            raise CommitError(f'{self.path} is larger than its declared size', 400)
+        self.digest.update(chunk)
+        self.spool.write(chunk)
+
+    def finish(self):
+        if self.received != self.size:
+            raise CommitError(f'{self.path} is {self.received} bytes, manifest says {self.size}', 400)
+        return UploadFile(self.path, self.size, self.digest.hexdigest(), spool=self.spool)
+
+
+def parse_commit_header(payload, max_files):
+    """Shared checks of a JSON body or multipart manifest -> (branch, message, file items)"""
+    if not isinstance(payload, dict) or not isinstance(payload.get('files'), list):
+        raise CommitError('Expected {"message": ..., "files": [{"path": ..., "content": ...}]}', 400)
+    files = payload['files']
+    if not files:
+        raise CommitError('No files given', 400)
+    if len(files) > max_files:
+        raise CommitError(f'At most {max_files} files per commit', 413)
+    message = payload.get('message')
+    if not isinstance(message, str) or not message.strip():
+        raise CommitError('A commit message is required', 400)
+    branch = payload.get('branch') or 'main'
+    if not isinstance(branch, str) or not valid_path(branch):
+        raise CommitError(f'Invalid branch: {branch!r}', 400)
+    seen = set()
+    for item in files:
+        path = item.get('path') if isinstance(item, dict) else None
+        if not isinstance(path, str) or not valid_path(path):
+            raise CommitError(f'Invalid path: {path!r}', 400)
+        if path in seen:
+            raise CommitError(f'Duplicate path: {path}', 400)
+        seen.add(path)
+    return branch, message, files
+
+
+def parse_commit_request(payload, max_files=COMMIT_MAX_FILES, max_bytes=COMMIT_MAX_BYTES):
+    """Request JSON -> (branch, message, [UploadFile]); raises CommitError (400/413)"""
+    branch, message, files = parse_commit_header(payload, max_files)
+    parsed, total = [], 0
+    for item in files:
+        path = item['path']
+        content = item.get('content')
+        if not isinstance(content, str):
+            raise CommitError(f'Missing content for {path}', 400)
+        if item.get('encoding', 'base64') == 'base64':
+            try:
+                data = base64.b64decode(content, validate=True)
+            except (binascii.Error, ValueError):
+                raise CommitError(f'Invalid base64 content for {path}', 400)
+        else:
+            data = content.encode('utf-8')
+        total += len(data)
+        if total > max_bytes:
+            raise CommitError(f'Upload exceeds {max_bytes} bytes', 413)
+        parsed.append(UploadFile(path, len(data), blob_sha(data), data=data))
+    return branch, message, parsed
+
+
+def parse_multipart_commit(stream, boundary, max_files=COMMIT_MAX_FILES, max_bytes=COMMIT_MAX_BYTES):
+    """
+    multipart/form-data upload -> (branch, message, [UploadFile])
+    Files are never held whole in memory: each part is hashed and spooled
+    as its chunks are read off the request stream
+    """
+    decoder = MultipartDecoder(boundary.encode('latin-1'), max_form_memory_size=MANIFEST_MAX_BYTES)
+    header = None
+    declared = {}
+    received = {}
+    part = None
+    field = None
+    try:
+        while True:
+            chunk = stream.read(READ_CHUNK)
+            decoder.receive_data(chunk or None)
+            event = decoder.next_event()
+            while not isinstance(event, (Epilogue, NeedData)):
+                if isinstance(event, Field):
+                    if event.name != 'manifest':
+                        raise CommitError(f'Unexpected field: {event.name}', 400)
+                    field = []
+                elif isinstance(event, File):
+                    if header is None:
+                        raise CommitError('The manifest must come before the files', 400)
+                    if event.name not in declared or event.name in received:
+                        raise CommitError(f'File not in the manifest (or sent twice): {event.name}', 400)
+                    field = None
+                    part = StreamedFile(event.name, declared[event.name])
+                elif isinstance(event, Data):
+                    if field is not None:
+                        field.append(event.data)
+                        if not event.more_data:
+                            header = parse_manifest(b''.join(field), max_files, max_bytes)
+                            declared = {item['path']: item['size'] for item in header[2]}
+                            field = None
+                    else:
+                        part.write(event.data)
+                        if not event.more_data:
+                            received[part.path] = part.finish()
+                            part = None
+                event = decoder.next_event()
+            if not chunk:
+                break
+    except Exception:
+        if part is not None:
+            part.spool.close()
+        for upload in received.values():
+            upload.close()
+        raise
+    if header is None:
+        raise CommitError('Missing manifest', 400)
+    missing = [path for path in declared if path not in received]
+    if missing:
+        for upload in received.values():
+            upload.close()
+        raise CommitError(f'Missing file parts: {", ".join(missing)}', 400)
+    branch, message, items = header
+    return branch, message, [received[item['path']] for item in items]
+
+
+def parse_manifest(raw, max_files, max_bytes):
+    try:
+        payload = json.loads(raw)
+    except ValueError:
+        raise CommitError('The manifest is not valid JSON', 400)
+    branch, message, items = parse_commit_header(payload, max_files)
+    total = 0
+    for item in items:
+        size = item.get('size')
+        if not isinstance(size, int) or isinstance(size, bool) or size < 0:
+            raise CommitError(f'Missing or invalid size for {item["path"]}', 400)
+        total += size
+    if total > max_bytes:
+        raise CommitError(f'Upload exceeds {max_bytes} bytes', 413)
+    return branch, message, items
+
+
+def valid_path(path):
+    """Relative, no empty / '.' / '..' segments, nothing under .git"""
+    parts = path.split('/')
+    return all(part and part not in ('.', '..') for part in parts) and parts[0] != '.git'
+
+
+class GitCommitter:
+    """
+    Builds one commit from many files.
+
+    `call(method, github_path, token, body=None)` performs one GitHub API
+    call with the user's token and returns (status, json_body).
+    `index(owner, repo, commit_sha)` returns the repo's tree at that commit
+    (anything with blob_at(path) and has_blob(sha)), or None.
+    """
+
+    def __init__(self, call, index=None, workers=8, retries=3):
+        self.call = call
+        self.index = index
+        self.workers = workers
+        self.retries = retries
+        self._lock = threading.Lock()
+        self.counters = {'commits': 0, 'unchanged_uploads': 0, 'files': 0, 'bytes': 0,
+                         'files_skipped': 0, 'bytes_skipped': 0, 'rebuilds': 0, 'index_errors': 0,
+                         'failed': 0}
+
+    def commit(self, owner, repo, branch, message, files, token):
+        """
+        Upload the blobs the repo doesn't have, build tree and commit, then
+        fast-forward the branch; returns a summary (commit None when nothing changed)
+        """
+        started = time.perf_counter()
+        base = f'repos/{owner}/{repo}/git'
+        try:
+            head = self._head(base, branch, token)
+            skipped = self._known(owner, repo, head, files)
+            if len(skipped) == len(files) and all(s['reason'] == 'unchanged' for s in skipped):
+                self._count_upload(files, skipped, committed=False)
+                return self._summary(owner, repo, branch, head, None, None, files, skipped, started)
+            skipped_paths = {s['path'] for s in skipped}
+            upload = [f for f in files if f.path not in skipped_paths]
+            if upload:
+                with ThreadPoolExecutor(min(self.workers, len(upload)),
+                                        thread_name_prefix='commit') as executor:
+                    futures = [executor.submit(self._blob, base, f, token) for f in upload]
+                    try:
+                        for future in futures:
+                            future.result()
+                    except Exception:
+                        for future in futures:
+                            future.cancel()  # Don't upload the rest of a failed commit
+                        raise
+            # Every file goes in the tree, skipped ones included: their blobs exist
+            # in the repo, and a rebuild on a moved head must still apply them
+            entries = [{'path': f.path, 'mode': FILE_MODE, 'type': 'blob', 'sha': f.sha} for f in files]
+            for attempt in range(self.retries + 1):
+                try:
+                    commit_sha, tree_sha = self._commit_on(base, branch, head, message, entries, token)
+                    break
+                except BranchMoved:
+                    if attempt == self.retries:
+                        raise
+                    self._count('rebuilds')
+                    head = self._head(base, branch, token)
+        except Exception:
+            self._count('failed')
+            raise
+
+        self._count_upload(files, skipped, committed=True)
+        return self._summary(owner, repo, branch, head, commit_sha, tree_sha, files, skipped, started)
+
+    def _known(self, owner, repo, head, files):
+        """Files whose blob the repo already has at `head` -> [{path, sha, reason}]"""
+        if self.index is None:
+            return []
+        try:
+            tree = self.index(owner, repo, head)
+        except Exception:
+            self._count('index_errors')  # No index: upload everything
+            return []
+        if tree is None:
+            return []
+        skipped = []
+        for f in files:
+            if tree.blob_at(f.path) == f.sha:
+                skipped.append({'path': f.path, 'sha': f.sha, 'reason': 'unchanged'})
+            elif tree.has_blob(f.sha):
+                skipped.append({'path': f.path, 'sha': f.sha, 'reason': 'duplicate'})
+        return skipped
+
+    def _count_upload(self, files, skipped, committed):
+        skipped_paths = {s['path'] for s in skipped}
+        with self._lock:
+            self.counters['commits' if committed else 'unchanged_uploads'] += 1
+            for f in files:
+                if f.path in skipped_paths:
+                    self.counters['files_skipped'] += 1
+                    self.counters['bytes_skipped'] += f.size
+                else:
+                    self.counters['files'] += 1
+                    self.counters['bytes'] += f.size
+
+    @staticmethod
+    def _summary(owner, repo, branch, head, commit_sha, tree_sha, files, skipped, started):
+        skipped_paths = {s['path'] for s in skipped}
+        return {
+            'commit': commit_sha,
+            'tree': tree_sha,
+            'parent': head,
+            'branch': branch,
+            'html_url': f'{GITHUB_WEB}/{owner}/{repo}/commit/{commit_sha}' if commit_sha else None,
+            'files': [{'path': f.path, 'sha': f.sha, 'size': f.size, 'uploaded': f.path not in skipped_paths,
+                       'download_url': f'{GITHUB_RAW}/{owner}/{repo}/{quote(branch)}/{quote(f.path)}',
+                       'html_url': f'{GITHUB_WEB}/{owner}/{repo}/blob/{quote(branch)}/{quote(f.path)}'}
+                      for f in files],
+            'skipped': skipped,
+            'bytes': sum(f.size for f in files),
+            'bytes_uploaded': sum(f.size for f in files if f.path not in skipped_paths),
+            'seconds': round(time.perf_counter() - started, 3),
+        }
+
+    def _commit_on(self, base, branch, head, message, entries, token):
+        """Tree + commit on top of `head`, then move the ref (raises BranchMoved)"""
+        base_tree = self._expect(200, 'base commit', *self.call('GET', f'{base}/commits/{head}', token))
+        tree = self._expect(201, 'tree', *self.call(
+            'POST', f'{base}/trees', token, {'base_tree': base_tree['tree']['sha'], 'tree': entries}))
+        commit = self._expect(201, 'commit', *self.call(
+            'POST', f'{base}/commits', token,
+            {'message': message, 'tree': tree['sha'], 'parents': [head]}))
+        status, body = self.call('PATCH', f'{base}/refs/heads/{branch}', token,
+                                 {'sha': commit['sha'], 'force': False})
+        if status == 422:
+            raise BranchMoved()  # Not a fast-forward any more
+        self._expect(200, 'ref', status, body)
+        return commit['sha'], tree['sha']
+
+    def _head(self, base, branch, token):
+        ref = self._expect(200, 'branch', *self.call('GET', f'{base}/ref/heads/{branch}', token))
+        return ref['object']['sha']
+
+    def _blob(self, base, upload, token):
+        blob = self._expect(201, 'blob', *self.call(
+            'POST', f'{base}/blobs', token,
+            {'content': base64.b64encode(upload.read()).decode('ascii'), 'encoding': 'base64'}))
+        if blob.get('sha') != upload.sha:
+            # The tree is built from our own hashes - they have to agree with GitHub's
+            raise CommitError(f'GitHub stored {upload.path} as {blob.get("sha")}, expected {upload.sha}',
+                              502, 'blob')
+        return blob['sha']
+
+    @staticmethod
+    def _expect(expected, step, status, body):
+        if status == expected:
+            return body
+        message = body.get('message') if isinstance(body, dict) else None
+        # Client-side problems (bad token, no push access, missing branch) keep
+        # GitHub's status; anything else is the upstream failing
+        relay = status if status in (401, 403, 404, 409, 422) else 502
+        raise CommitError(f'GitHub {step} step failed ({status}): {message or "no details"}', relay, step)
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+def committer_from_env(call, index=None):
+    return GitCommitter(
+        call,
+        index,
+        workers=int(os.getenv('COMMIT_WORKERS', 8)),
+        retries=int(os.getenv('COMMIT_RETRIES', 3)),
+    )
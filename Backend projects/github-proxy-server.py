@@ -9,6 +9,8 @@ Features:
 - CORS enabled for frontend access
 - Rate limit monitoring
 - Caching for better performance
+- Pooled keep-alive upstream connections
+- Responses streamed through as-is (no JSON re-serialization)
 
 Requirements:
     pip install flask flask-cors requests python-dotenv
@@ -23,10 +25,9 @@ Environment Variables (.env file):
 """
 
 import os
-import requests
 import time
 from itertools import cycle
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 from dotenv import load_dotenv
 from functools import lru_cache
@@ -34,6 +35,8 @@ from functools import lru_cache
 # Load environment variables
 load_dotenv()
 
+from upstream_client import GITHUB_API, STREAM_CHUNK, StreamedBody, client_from_env
+
 app = Flask(__name__)
 
 # Configure CORS
@@ -51,6 +54,9 @@ else:
     token_pool = None
     print("⚠️  No tokens configured. Using public API access (limited to 60 req/hour)")
 
+# Pooled keep-alive session for upstream GitHub calls
+upstream = client_from_env()
+
 # Rate limit tracking
 rate_limit_info = {
     'remaining': 60,
@@ -86,14 +92,14 @@ def proxy_github(github_path):
     """
     try:
         # Construct GitHub API URL
-        github_url = f'https://api.github.com/{github_path}'
+        github_url = f'{GITHUB_API}/{github_path}'
         
         # Get query parameters from request
         params = request.args.to_dict()
         
         # Make request to GitHub
         headers = get_headers()
-        response = requests.get(github_url, headers=headers, params=params)
+        response = upstream.get(github_url, headers=headers, params=params, stream=True)
         
         # Update rate limit info
         if 'X-RateLimit-Remaining' in response.headers:
@@ -105,20 +111,30 @@ def proxy_github(github_path):
         if response.status_code == 403 and 'rate limit' in response.text.lower():
             print("⚠️  Rate limit hit, trying public access...")
             headers = get_headers(use_token=False)
-            response = requests.get(github_url, headers=headers, params=params)
+            response = upstream.get(github_url, headers=headers, params=params, stream=True)
         
         # Return response
-        return jsonify(response.json()), response.status_code
+        return relay_response(response)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def relay_response(response):
+    """Stream an upstream response to the client without re-serializing it"""
+    body = StreamedBody(response, [], response.iter_content(STREAM_CHUNK))
+    resp = Response(iter(body), status=body.status,
+                    content_type=body.headers.get('Content-Type', 'application/json'))
+    for name, value in body.headers.items():
+        if name != 'Content-Type':
+            resp.headers[name] = value
+    return resp
+
 @app.route('/api/rate-limit', methods=['GET'])
 def check_rate_limit():
     """Check current rate limit status"""
     try:
         headers = get_headers()
-        response = requests.get('https://api.github.com/rate_limit', headers=headers)
+        response = upstream.get(f'{GITHUB_API}/rate_limit', headers=headers)
         
         if response.status_code == 200:
             data = response.json()
@@ -139,7 +155,8 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'tokens_configured': len(GITHUB_TOKENS),
-        'rate_limit': rate_limit_info
+        'rate_limit': rate_limit_info,
+        'upstream': upstream.stats()
     })
 
 @app.route('/', methods=['GET'])
@@ -2,19 +2,24 @@
 Railway Entry Point
 ===================
 This file ensures Railway can find and start the Flask app.
+
+    python main.py              # Run the server
+    gunicorn main:app           # Or serve the app object
+
+secure-proxy-server.py is imported as a module (its hyphenated name rules
+out a plain import statement), so its bytecode is cached in __pycache__
+instead of being recompiled on every start.
 """
 
 import os
 import sys
-
-# The actual Flask app is defined in secure-proxy-server.py
-# Since Python can't import files with hyphens, we load it directly
+import importlib
 
 # Add current directory to path
-sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-# Load and execute secure-proxy-server.py
-with open('secure-proxy-server.py', 'r', encoding='utf-8') as f:
-    code = f.read()
-    exec(code, {'__name__': '__main__'})
+server = importlib.import_module('secure-proxy-server')
+app = server.app
 
+if __name__ == '__main__':
+    server.main()
@@ -0,0 +1,230 @@
+"""
+Prometheus Metrics
+==================
+In-process metrics rendered in the Prometheus text exposition format
+(version 0.0.4) for GET /metrics. No client library needed.
+
+Counters, gauges and histograms are recorded into per-thread shards, so
+the request path never takes a shared lock; shards are summed at scrape
+time. Shards of finished threads are folded into a retired total.
+
+Values that already live elsewhere (cache counters, token quotas, pool
+stats) are read at scrape time through collector callbacks instead of
+being double-booked.
+
+Each process (gunicorn worker) reports its own values.
+
+Environment Variables:
+    METRICS_TOKEN=...     # Bearer token for /metrics (X-Admin-Password also works)
+"""
+
+import re
+import math
+import threading
+from bisect import bisect_left
+
+# Seconds - covers cache hits (sub-ms) through slow upstream calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+# Fold dead threads' shards once this many are registered
+SHARD_COMPACT_AT = 64
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{escape_label(v)}"' for k, v in pairs) + '}'
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Sharded:
+    """Per-thread value shards; only the owning thread writes a shard"""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []         # (thread, {labels: value})
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, 'values', None)
+        if shard is None:
+            shard = self._local.values = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+                if len(self._shards) >= SHARD_COMPACT_AT:
+                    self._compact_locked()
+        return shard
+
+    def _compact_locked(self):
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                for labels, value in list(shard.items()):
+                    self._retired[labels] = self._merge(self._retired.get(labels), value)
+        self._shards = live
+
+    def collect(self):
+        """{labels: value} summed over every shard"""
+        with self._lock:
+            self._compact_locked()
+            totals = {labels: self._merge(None, value) for labels, value in self._retired.items()}
+            shards = [shard for _, shard in self._shards]
+        for shard in shards:
+            for labels, value in list(shard.items()):
+                totals[labels] = self._merge(totals.get(labels), value)
+        return totals
+
+    @staticmethod
+    def _merge(total, value):
+        return value if total is None else total + value
+
+
+class Counter(_Sharded):
+    type = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in sorted(self.collect().items()):
+            yield self.name, format_labels(self.labelnames, labels), value
+
+
+class Gauge(Counter):
+    """Up/down gauge (e.g. in-flight requests); inc and dec may run on different threads"""
+
+    type = 'gauge'
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+
+class Histogram(_Sharded):
+    type = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, labels=()):
+        shard = self._shard()
+        slots = shard.get(labels)
+        if slots is None:
+            # One count per bucket (+Inf last), then sum and count
+            slots = shard[labels] = [0] * (len(self.buckets) + 3)
+        slots[bisect_left(self.buckets, value)] += 1
+        slots[-2] += value
+        slots[-1] += 1
+
+    @staticmethod
+    def _merge(total, value):
+        if total is None:
+            return list(value)
+        return [a + b for a, b in zip(total, value)]
+
+    def samples(self):
+        bounds = self.buckets + (math.inf,)
+        for labels, slots in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip(bounds, slots):
+                cumulative += count
+                yield (f'{self.name}_bucket',
+                       format_labels(self.labelnames, labels, [('le', format_value(float(bound)))]),
+                       cumulative)
+            yield f'{self.name}_sum', format_labels(self.labelnames, labels), slots[-2]
+            yield f'{self.name}_count', format_labels(self.labelnames, labels), slots[-1]
+
+
+class Collected:
+    """Metric whose samples come from a callback at scrape time"""
+
+    def __init__(self, name, type_, help_text, labelnames, fn):
+        self.name = name
+        self.type = type_
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+
+    def samples(self):
+        for labels, value in self.fn():
+            if value is None:
+                continue
+            yield self.name, format_labels(self.labelnames, labels), value
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def collected(self, name, type_, help_text, labelnames, fn):
+        """fn() -> iterable of (label_values_tuple, value), called per scrape"""
+        return self._register(Collected(name, type_, help_text, labelnames, fn))
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception as e:
+                print(f"⚠️  Metric {metric.name} failed: {e}")
+                continue
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in samples:
+                lines.append(f'{name}{labels} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def route_label(rule):
+    """'/api/github/<path:github_path>' or '/api/github/{github_path}' -> '/api/github/<github_path>'"""
+    rule = re.sub(r'<(?:[^:<>]+:)?([^<>]+)>', r'<\1>', rule)
+    return re.sub(r'\{([^{}:]+)(?::[^{}]*)?\}', r'<\1>', rule)
+
+
+def endpoint_class(github_path):
+    """Low-cardinality label for a GitHub API path"""
+    parts = github_path.strip('/').split('/')
+    if parts[0] != 'repos' or len(parts) < 3:
+        return parts[0] or 'root'
+    if len(parts) == 3:
+        return 'repo'
+    if parts[3] == 'git' and len(parts) > 4:
+        return f'git/{parts[4]}'
+    return parts[3]
@@ -0,0 +1,368 @@
+"""
+Cache Warm-Up and Background Prefetch
+=====================================
+After a deploy or worker restart every cache is empty, and the first
+visitors pay full GitHub latency for each folder the portfolio walks
+(Solo-Projects, HW/Day NN, images/...). The prefetcher warms a
+configured list of repos and path prefixes in a background thread per
+worker, and keeps them warm:
+
+- on start, then every PREFETCH_INTERVAL seconds (missing/expired only)
+- when a repo's head commit changes (checked every PREFETCH_HEAD_CHECK
+  seconds; everything under the prefixes is revalidated)
+- right after a push webhook invalidated part of a repo
+- entries expiring within PREFETCH_REFRESH_AHEAD seconds are revalidated
+  before they expire, so client requests keep hitting a fresh entry
+
+Fetches go through the proxy's own cache and request coalescing, so a
+prefetch and a client request for the same path share one upstream call.
+
+Budget: calls that cost rate limit are capped at PREFETCH_BUDGET per
+rolling hour for the whole server. With SHARED_STATE_PATH the workers
+spend from one budget kept in SQLite; otherwise each worker gets
+PREFETCH_BUDGET / WEB_CONCURRENCY (the Procfile's worker count). 304
+revalidations are free on GitHub and are not charged. Nothing is fetched while the tokens have less than
+PREFETCH_RESERVE requests left, so client traffic always has headroom,
+or while the quota planner is deferring background work.
+
+Environment Variables:
+    PREFETCH_PATHS=owner/repo:Solo-Projects,HW,images/PP.jpg;owner/other
+    PREFETCH_INTERVAL=900          # Seconds between scheduled warm-ups (0 = start only)
+    PREFETCH_HEAD_CHECK=60         # Seconds between head commit checks (0 = off)
+    PREFETCH_REFRESH_AHEAD=10      # Revalidate entries this close to expiry (0 = off)
+    PREFETCH_DEPTH=2               # Directory levels walked below each prefix
+    PREFETCH_BUDGET=300            # Charged upstream calls per hour (all workers)
+    PREFETCH_RESERVE=500           # Pause while token quota left is below this
+"""
+
+import os
+import json
+import time
+import threading
+from collections import deque
+from urllib.parse import parse_qsl
+
+# Outcomes of fetch() that did not spend rate limit
+FREE_STATUSES = ('HIT', 'REVALIDATED', 'COALESCED')
+
+# Stop the current run when GitHub answers with these
+QUOTA_STATUSES = (403, 429)
+
+
+class PrefetchTarget:
+    """One repo and the path prefixes kept warm in it"""
+
+    def __init__(self, owner, repo, prefixes):
+        self.owner = owner
+        self.repo = repo
+        self.prefixes = prefixes or ['']
+        self.base = f'repos/{owner}/{repo}/contents'
+        self.head = None          # Head commit SHA at the last warm-up
+        self.next_warm = 0.0
+        self.next_head_check = 0.0
+        self.last_warm = None
+
+    @property
+    def name(self):
+        return f'{self.owner}/{self.repo}'
+
+    def path_for(self, prefix):
+        return f'{self.base}/{prefix}'.rstrip('/')
+
+    def covers(self, cache_key):
+        """Whether a response cache key lies under one of the prefixes"""
+        path = cache_key.partition('?')[0]
+        for prefix in self.prefixes:
+            root = self.path_for(prefix)
+            if path == root or path.startswith(root + '/'):
+                return True
+        return False
+
+
+def parse_targets(spec):
+    """'owner/repo:prefix,prefix;owner/repo2' -> [PrefetchTarget]"""
+    targets = []
+    for item in (spec or '').split(';'):
+        repo_part, _, prefixes = item.strip().partition(':')
+        owner, _, repo = repo_part.strip().partition('/')
+        if not owner or not repo:
+            if item.strip():
+                print(f"⚠️  Ignoring invalid prefetch target: {item}")
+            continue
+        targets.append(PrefetchTarget(owner, repo, [p.strip().strip('/') for p in prefixes.split(',')
+                                                     if p.strip()]))
+    return targets
+
+
+class CallBudget:
+    """Charged upstream calls allowed per rolling hour"""
+
+    def __init__(self, per_hour):
+        self.per_hour = per_hour
+        self._calls = deque()
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        while self._calls and now - self._calls[0] >= 3600:
+            self._calls.popleft()
+
+    def take(self):
+        """Reserve one call; False when the hour's budget is spent"""
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            if len(self._calls) >= self.per_hour:
+                return False
+            self._calls.append(now)
+            return True
+
+    def refund(self):
+        """The reserved call turned out to be free (304, cache hit, coalesced)"""
+        with self._lock:
+            if self._calls:
+                self._calls.pop()
+
+    def used(self):
+        with self._lock:
+            self._prune(time.time())
+            return len(self._calls)
+
+
+class SharedCallBudget:
+    """CallBudget spent by every worker, kept in a shared_state backend that merges workers"""
+
+    def __init__(self, per_hour, state, name='prefetch'):
+        self.per_hour = per_hour
+        self.state = state
+        self.name = name
+        self._tickets = []
+        self._lock = threading.Lock()
+
+    def take(self):
+        ticket = self.state.take_call(self.name, self.per_hour)
+        if ticket is None:
+            return False
+        with self._lock:
+            self._tickets.append(ticket)
+        return True
+
+    def refund(self):
+        with self._lock:
+            ticket = self._tickets.pop() if self._tickets else None
+        if ticket is not None:
+            self.state.refund_call(ticket)
+
+    def used(self):
+        return self.state.calls_used(self.name)
+
+
+def call_budget(per_hour, shared_state=None, workers=1):
+    """One budget across workers: shared through SQLite when possible, else split evenly"""
+    if shared_state is not None and shared_state.workers_merged:
+        return SharedCallBudget(per_hour, shared_state)
+    return CallBudget(per_hour // max(workers, 1))
+
+
+class Prefetcher:
+    """
+    Background warmer for the response cache.
+
+    `fetch(github_path, params, refresh)` returns (cache_status, entry)
+    the way a client request would be served; refresh=True revalidates a
+    fresh entry instead of returning it. `quota_left()` returns the
+    requests left across usable tokens; `admit()`, when given, says
+    whether background work may spend quota right now.
+    """
+
+    def __init__(self, targets, fetch, cache, quota_left, interval=900, head_check=60,
+                 refresh_ahead=10, depth=2, budget=300, reserve=500, admit=None,
+                 shared_state=None, workers=1):
+        self.targets = targets
+        self.fetch = fetch
+        self.cache = cache
+        self.quota_left = quota_left
+        self.interval = interval
+        self.head_check = head_check
+        self.refresh_ahead = refresh_ahead
+        self.depth = depth
+        self.budget = call_budget(budget, shared_state, workers)
+        self.reserve = reserve
+        self.admit = admit
+        self.tick_seconds = max(min(refresh_ahead / 2 if refresh_ahead else 5, 5), 0.5)
+        self._triggered = set()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+        self.counters = {'runs': 0, 'fetched': 0, 'revalidated': 0, 'hits': 0, 'refreshed': 0,
+                         'head_changes': 0, 'skipped_budget': 0, 'skipped_reserve': 0,
+                         'skipped_quota': 0, 'errors': 0}
+
+    @property
+    def enabled(self):
+        return bool(self.targets)
+
+    def start(self):
+        """Start this process's prefetch thread (no-op if running or disabled)"""
+        # One thread per process - gunicorn forks after import
+        if not self.enabled or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name='prefetch', daemon=True).start()
+
+    def trigger(self, repo_name):
+        """Re-warm a repo soon (after a push invalidated part of it)"""
+        if any(t.name == repo_name for t in self.targets):
+            with self._lock:
+                self._triggered.add(repo_name)
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.tick()
+            except Exception as e:
+                self._count('errors')
+                print(f"⚠️  Prefetch failed: {e}")
+            self._wake.wait(self.tick_seconds)
+            self._wake.clear()
+
+    def tick(self):
+        """Warm whatever is due, then refresh entries about to expire"""
+        now = time.time()
+        with self._lock:
+            triggered, self._triggered = self._triggered, set()
+        for target in self.targets:
+            if target.name in triggered:
+                self.warm(target, 'push')
+            elif now >= target.next_warm:
+                self.warm(target, 'schedule')
+            elif self.head_check and now >= target.next_head_check:
+                target.next_head_check = now + self.head_check
+                head = self._head(target)
+                if head and target.head and head != target.head:
+                    self._count('head_changes')
+                    self.warm(target, 'head', refresh=True)
+        if self.refresh_ahead:
+            self.refresh_expiring()
+
+    def warm(self, target, reason, refresh=False):
+        """Walk the target's prefixes breadth-first, `depth` levels down"""
+        started = time.time()
+        target.next_warm = started + self.interval if self.interval else float('inf')
+        target.next_head_check = started + self.head_check
+        head = self._head(target)
+        queue = deque((target.path_for(prefix), 0) for prefix in target.prefixes)
+        seen = set()
+        paths = 0
+        while queue:
+            path, level = queue.popleft()
+            if path in seen:
+                continue
+            seen.add(path)
+            entry = self._fetch(path, None, refresh)
+            if entry is False:
+                break     # Out of budget - the rest waits for the next run
+            paths += 1
+            if entry is None or level >= self.depth:
+                continue
+            for child in self._child_dirs(entry):
+                queue.append((f"{target.base}/{child}", level + 1))
+        target.head = head or target.head
+        target.last_warm = {'reason': reason, 'at': int(started), 'paths': paths,
+                            'seconds': round(time.time() - started, 3)}
+        self._count('runs')
+
+    def refresh_expiring(self):
+        """Revalidate target entries that expire within refresh_ahead seconds"""
+        keys = self.cache.expiring(self.refresh_ahead,
+                                   lambda key: any(t.covers(key) for t in self.targets))
+        for key in keys:
+            path, _, query = key.partition('?')
+            if self._fetch(path, dict(parse_qsl(query)), True) is False:
+                break
+            self._count('refreshed')
+
+    def _head(self, target):
+        """Head commit SHA (one-item commit list; revalidated, so usually free)"""
+        entry = self._fetch(f'repos/{target.owner}/{target.repo}/commits', {'per_page': '1'}, True)
+        if not entry:
+            return None
+        commits = json.loads(entry.body)
+        return commits[0]['sha'] if isinstance(commits, list) and commits else None
+
+    def _fetch(self, path, params, refresh):
+        """
+        One fetch within budget
+        Returns the entry, None when it failed or wasn't cacheable, or
+        False when the budget or quota reserve stops this run
+        """
+        if self.quota_left() < self.reserve:
+            self._count('skipped_reserve')
+            return False
+        if self.admit is not None and not self.admit():
+            self._count('skipped_quota')
+            return False
+        if not self.budget.take():
+            self._count('skipped_budget')
+            return False
+        try:
+            cache_status, entry = self.fetch(path, params, refresh)
+        except Exception:
+            self._count('errors')
+            return None
+        if cache_status in FREE_STATUSES:
+            self.budget.refund()
+        self._count({'HIT': 'hits', 'REVALIDATED': 'revalidated'}.get(cache_status, 'fetched'))
+        if cache_status == 'STREAM':
+            entry.close()     # Too large to cache; nothing to warm
+            return None
+        if entry is None:
+            return None
+        if entry.status in QUOTA_STATUSES:
+            return False
+        return entry if entry.status == 200 else None
+
+    @staticmethod
+    def _child_dirs(entry):
+        try:
+            listing = json.loads(entry.body)
+        except ValueError:
+            return []
+        if not isinstance(listing, list):
+            return []
+        return [item['path'] for item in listing if item.get('type') == 'dir' and item.get('path')]
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        return dict(counters, enabled=self.enabled, running=self._pid == os.getpid(),
+                    budget={'per_hour': self.budget.per_hour, 'used': self.budget.used(),
+                            'shared': isinstance(self.budget, SharedCallBudget)},
+                    reserve=self.reserve,
+                    targets={t.name: {'prefixes': t.prefixes, 'head': t.head, 'last_warm': t.last_warm}
+                             for t in self.targets})
+
+
+def prefetcher_from_env(fetch, cache, quota_left, admit=None, shared_state=None):
+    return Prefetcher(
+        parse_targets(os.getenv('PREFETCH_PATHS')),
+        fetch,
+        cache,
+        quota_left,
+        interval=float(os.getenv('PREFETCH_INTERVAL', 900)),
+        head_check=float(os.getenv('PREFETCH_HEAD_CHECK', 60)),
+        refresh_ahead=float(os.getenv('PREFETCH_REFRESH_AHEAD', 10)),
+        depth=int(os.getenv('PREFETCH_DEPTH', 2)),
+        budget=int(os.getenv('PREFETCH_BUDGET', 300)),
+        reserve=int(os.getenv('PREFETCH_RESERVE', 500)),
+        admit=admit,
+        shared_state=shared_state,
+        workers=int(os.getenv('WEB_CONCURRENCY', 1)),
+    )
@@ -0,0 +1,411 @@
+"""
+Response Cache for the GitHub API Proxy
+=======================================
+Shared in-memory cache for proxied GitHub responses.
+
+Features:
+- Keyed on GitHub path + normalized query string
+- Per-path-pattern TTLs (contents, commits, trees, ...)
+- LRU eviction bounded by total body size in bytes
+- Conditional revalidation (If-None-Match / If-Modified-Since)
+- Compressed / field-projected variants built once per entry
+- Stale-while-revalidate and stale-if-error (RFC 5861) serving policy
+- Optional disk tier shared by all workers (disk_cache.py, DISK_CACHE_PATH)
+
+GitHub does not count 304 responses against the rate limit, so an
+expired entry is revalidated instead of refetched whenever possible.
+
+Expired entries stay until evicted. For CACHE_STALE_WHILE_REVALIDATE
+seconds past expiry one is served at once while a background refresh
+runs; for CACHE_STALE_IF_ERROR seconds it is served when GitHub is rate
+limited, erroring or slower than CACHE_STALE_WAIT seconds.
+
+Environment Variables:
+    CACHE_TTL=300                 # Default TTL (seconds)
+    CACHE_MAX_BYTES=33554432      # Total body bytes kept in memory
+    CACHE_TTL_RULES=^repos/.+/contents=60;^rate_limit=0
+    CACHE_STALE_WHILE_REVALIDATE=300   # Serve stale + refresh in background
+    CACHE_STALE_IF_ERROR=86400         # Serve stale when upstream fails
+    CACHE_STALE_WAIT=2                 # Max seconds a client waits on a refresh
+"""
+
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from upstream_client import passthrough_headers
+from response_encoding import encode_body
+from disk_cache import disk_cache_from_env
+
+# Encoded variants kept per entry (fields x encoding combinations)
+MAX_VARIANTS = 6
+
+# Warning headers (RFC 7234 5.5) on responses served from stale entries
+WARNING_STALE = '110 - "Response is Stale"'
+WARNING_REVALIDATION_FAILED = '111 - "Revalidation Failed"'
+STALE_WARNINGS = {'STALE': WARNING_STALE, 'STALE-ERROR': WARNING_REVALIDATION_FAILED}
+
+# Seconds before a key whose refresh failed is tried again
+REFRESH_RETRY = 30
+
+# Default TTLs per GitHub path pattern (first match wins)
+DEFAULT_TTL_RULES = [
+    (r'^rate_limit', 0),
+    (r'^repos/[^/]+/[^/]+/git/trees/[0-9a-f]{40}', 86400),
+    (r'^repos/[^/]+/[^/]+/git/blobs/[0-9a-f]{40}', 86400),
+    (r'^repos/[^/]+/[^/]+/commits', 30),
+    (r'^repos/[^/]+/[^/]+/contents', 60),
+]
+
+
+def parse_ttl_rules(spec):
+    """Parse 'regex=seconds;regex=seconds' into a list of rules"""
+    rules = []
+    for item in (spec or '').split(';'):
+        if '=' not in item:
+            continue
+        pattern, _, seconds = item.rpartition('=')
+        try:
+            rules.append((pattern.strip(), int(seconds)))
+        except ValueError:
+            print(f"⚠️  Ignoring invalid cache TTL rule: {item}")
+    return rules
+
+
+class UpstreamUnavailable(Exception):
+    """GitHub answered without a usable response (rate limited or erroring)"""
+
+    def __init__(self, status):
+        super().__init__(f'Upstream unavailable ({status})')
+        self.status = status
+
+
+def upstream_failed(status, body):
+    """Whether an upstream answer should be replaced by a stale entry"""
+    return status >= 500 or status == 429 or (status == 403 and b'rate limit' in body.lower())
+
+
+class CacheEntry:
+    """One cached upstream response"""
+
+    __slots__ = ('status', 'body', 'headers', 'stored_at', 'expires_at', 'variants')
+
+    def __init__(self, status, body, headers, ttl):
+        self.status = status
+        self.body = body
+        self.headers = passthrough_headers(headers)
+        self.stored_at = time.time()
+        self.expires_at = self.stored_at + ttl
+        self.variants = {}   # (fields, encoding) -> (body, applied_encoding)
+
+    @property
+    def size(self):
+        return len(self.body) + sum(len(v[0]) for v in self.variants.values())
+
+    @property
+    def etag(self):
+        return self.headers.get('ETag')
+
+    def is_fresh(self, now=None):
+        return (now or time.time()) < self.expires_at
+
+    def age(self, now=None):
+        return int((now or time.time()) - self.stored_at)
+
+    def stale_for(self, now=None):
+        """Seconds since the entry expired (negative while fresh)"""
+        return (now or time.time()) - self.expires_at
+
+    def validators(self):
+        """Conditional request headers for revalidating this entry"""
+        conditional = {}
+        if 'ETag' in self.headers:
+            conditional['If-None-Match'] = self.headers['ETag']
+        if 'Last-Modified' in self.headers:
+            conditional['If-Modified-Since'] = self.headers['Last-Modified']
+        return conditional
+
+
+class ResponseCache:
+    """Thread-safe, byte-bounded LRU cache of upstream responses"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, default_ttl=300, ttl_rules=None,
+                 stale_while_revalidate=0, stale_if_error=0, stale_wait=2, disk=None):
+        self.max_bytes = max_bytes
+        self.disk = disk             # DiskCache tier under memory (None = memory only)
+        self.default_ttl = default_ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stale_if_error = max(stale_if_error, stale_while_revalidate)
+        self.stale_wait = stale_wait
+        self.ttl_rules = [(re.compile(p), ttl) for p, ttl in (ttl_rules or DEFAULT_TTL_RULES)]
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'revalidated': 0, 'stores': 0, 'evictions': 0,
+                         'variants_built': 0, 'variant_hits': 0, 'invalidated': 0,
+                         'stale_served': 0, 'stale_on_error': 0, 'disk_hits': 0}
+
+    @staticmethod
+    def make_key(path, params=None):
+        """Cache key: normalized path + sorted query string"""
+        path = path.strip('/')
+        if not params:
+            return path
+        return f"{path}?{urlencode(sorted(params.items()))}"
+
+    def ttl_for(self, path):
+        """TTL (seconds) for a GitHub path; 0 means never cache"""
+        path = path.strip('/')
+        for pattern, ttl in self.ttl_rules:
+            if pattern.search(path):
+                return ttl
+        return self.default_ttl
+
+    def get(self, key):
+        """Return entry (fresh or stale) and mark it recently used"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None or not entry.is_fresh():
+            entry = self._from_disk(key, entry) or entry
+        return entry
+
+    def lookup(self, key):
+        """Return a fresh entry or None, recording hit/miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.is_fresh():
+                self._entries.move_to_end(key)
+                self.counters['hits'] += 1
+                return entry
+        # Another worker (or this one before a restart) may have a fresher copy
+        entry = self._from_disk(key, entry)
+        with self._lock:
+            if entry is not None and entry.is_fresh():
+                self.counters['hits'] += 1
+                return entry
+            self.counters['misses'] += 1
+            return None
+
+    def _from_disk(self, key, current):
+        """Disk tier entry newer than `current`, promoted into memory; else None"""
+        if self.disk is None:
+            return None
+        record = self.disk.get(key)
+        if record is None:
+            return None
+        status, body, headers, stored_at, expires_at = record
+        if current is not None and current.expires_at >= expires_at:
+            return None
+        entry = CacheEntry(status, body, headers, 0)
+        entry.stored_at, entry.expires_at = stored_at, expires_at
+        with self._lock:
+            if self._entries.get(key) is current:
+                self._store_locked(key, entry)
+            self.counters['disk_hits'] += 1
+        return entry
+
+    def _store_locked(self, key, entry):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.size
+        self._entries[key] = entry
+        self._bytes += entry.size
+        self._evict_locked()
+
+    def stale(self, key):
+        """
+        Expired 200 entry still allowed to be served, or None.
+        Returns (entry, revalidate_in_background): True within the
+        stale-while-revalidate window, False within stale-if-error only.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            entry = self._from_disk(key, None)
+        if entry is None or entry.status != 200:
+            return None
+        stale_for = entry.stale_for()
+        if 0 <= stale_for < self.stale_while_revalidate:
+            return entry, True
+        if 0 <= stale_for < self.stale_if_error:
+            return entry, False
+        return None
+
+    def served_stale(self, on_error):
+        with self._lock:
+            self.counters['stale_on_error' if on_error else 'stale_served'] += 1
+
+    def put(self, key, status, body, headers, ttl):
+        """Store a response, evicting least recently used entries"""
+        if ttl <= 0 or len(body) > self.max_bytes:
+            return None
+        entry = CacheEntry(status, body, headers, ttl)
+        with self._lock:
+            self._store_locked(key, entry)
+            self.counters['stores'] += 1
+        self._write_through(key, entry)
+        return entry
+
+    def _write_through(self, key, entry):
+        if self.disk is not None:
+            self.disk.put(key, entry.status, entry.body, entry.headers, entry.stored_at, entry.expires_at)
+
+    def _evict_locked(self):
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+            self.counters['evictions'] += 1
+
+    def variant(self, key, entry, fields=None, encoding=None):
+        """
+        Entry body projected to `fields` and compressed with `encoding`.
+        Returns (body, applied_encoding). Built once and kept on the entry
+        while it is cached under `key`; uncached entries are encoded on the fly.
+        """
+        if not fields and not encoding:
+            return entry.body, None
+        variant_key = (fields, encoding)
+        found = entry.variants.get(variant_key)
+        if found is not None:
+            with self._lock:
+                self.counters['variant_hits'] += 1
+            return found
+        found = encode_body(entry.body, entry.headers.get('Content-Type'), fields, encoding)
+        with self._lock:
+            self.counters['variants_built'] += 1
+            if (self._entries.get(key) is entry and variant_key not in entry.variants
+                    and len(entry.variants) < MAX_VARIANTS):
+                entry.variants[variant_key] = found
+                self._bytes += len(found[0])
+                self._evict_locked()
+        return found
+
+    def revalidated(self, key, headers, ttl):
+        """Extend an entry after upstream answered 304 Not Modified"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry.stored_at = time.time()
+            entry.expires_at = entry.stored_at + ttl
+            for name in ('ETag', 'Last-Modified'):
+                if name in headers:
+                    entry.headers[name] = headers[name]
+            self.counters['revalidated'] += 1
+        self._write_through(key, entry)
+        return entry
+
+    def expiring(self, within, predicate):
+        """Keys of fresh 200 entries matching predicate(key) that expire within `within` seconds"""
+        now = time.time()
+        with self._lock:
+            return [key for key, entry in self._entries.items()
+                    if entry.status == 200 and now < entry.expires_at <= now + within and predicate(key)]
+
+    def invalidate(self, predicate):
+        """Drop every entry whose key matches predicate(key); returns the count"""
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                self._bytes -= self._entries.pop(key).size
+            self.counters['invalidated'] += len(keys)
+        if self.disk is not None:
+            self.disk.invalidate(predicate)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        """Snapshot for /admin/stats"""
+        with self._lock:
+            return dict(self.counters, entries=len(self._entries),
+                        bytes=self._bytes, max_bytes=self.max_bytes)
+
+
+class BackgroundRefresh:
+    """
+    Cache refreshes run off the request thread, at most one per key.
+    A key whose refresh failed is left alone for REFRESH_RETRY seconds,
+    so a rate-limited GitHub isn't hit again by every stale response.
+    """
+
+    def __init__(self, workers=4, retry_after=REFRESH_RETRY):
+        self.workers = workers
+        self.retry_after = retry_after
+        self._pool = None
+        self._pid = None
+        self._running = {}      # key -> Future
+        self._failed = {}       # key -> time of the last failure
+        self._lock = threading.Lock()
+        self.counters = {'started': 0, 'failed': 0}
+
+    def cooling_down(self, key):
+        with self._lock:
+            failed_at = self._failed.get(key)
+            if failed_at is None:
+                return False
+            if time.time() - failed_at < self.retry_after:
+                return True
+            del self._failed[key]
+            return False
+
+    def finished(self, key, ok):
+        """Record a refresh outcome (also used by the async engine's tasks)"""
+        with self._lock:
+            self._running.pop(key, None)
+            if ok:
+                self._failed.pop(key, None)
+            else:
+                self._failed[key] = time.time()
+                self.counters['failed'] += 1
+
+    def started(self):
+        with self._lock:
+            self.counters['started'] += 1
+
+    def submit(self, key, fn):
+        """Future for fn() refreshing `key` (joins one already running), or None while cooling down"""
+        if self.cooling_down(key):
+            return None
+        with self._lock:
+            future = self._running.get(key)
+            if future is not None:
+                return future
+            if self._pid != os.getpid():
+                # Executor threads don't survive gunicorn's fork
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='cache-refresh')
+                self._pid = os.getpid()
+            future = self._running[key] = self._pool.submit(fn)
+            self.counters['started'] += 1
+        future.add_done_callback(lambda f: self.finished(key, f.exception() is None))
+        return future
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, running=len(self._running), cooling_down=len(self._failed))
+
+
+def cache_from_env():
+    """Build the cache from environment variables"""
+    rules = parse_ttl_rules(os.getenv('CACHE_TTL_RULES'))
+    stale_if_error = int(os.getenv('CACHE_STALE_IF_ERROR', 86400))
+    return ResponseCache(
+        max_bytes=int(os.getenv('CACHE_MAX_BYTES', 32 * 1024 * 1024)),
+        default_ttl=int(os.getenv('CACHE_TTL', 300)),
+        ttl_rules=rules + DEFAULT_TTL_RULES,
+        stale_while_revalidate=int(os.getenv('CACHE_STALE_WHILE_REVALIDATE', 300)),
+        stale_if_error=stale_if_error,
+        stale_wait=float(os.getenv('CACHE_STALE_WAIT', 2)),
+        disk=disk_cache_from_env(retain=stale_if_error),
+    )
@@ -0,0 +1,229 @@
+"""
+Quota Planner
+=============
+Every upstream call used to draw on the pooled tokens the same way, so
+a background refresh or an analytics call could spend the quota a page
+load needed. The planner forecasts the burn rate against the tokens'
+rate-limit windows and hands out what is left in priority order:
+
+    interactive   client requests (/api/github, /api/tree, /api/raw)
+    admin         analytics paths (QUOTA_ADMIN_PATHS, e.g. rate_limit, repo stats/traffic)
+    background    stale-while-revalidate refreshes and the prefetcher
+
+Forecast: the sustainable rate is sum(remaining / seconds to reset) over
+usable tokens - the pace that spends exactly the quota left by each
+reset. Each class is allotted that rate minus the measured burn of the
+classes above it (times QUOTA_HEADROOM). A class asking while the quota
+left is below its floor (a share of the limit), or burning faster than
+its allotment while the forecast runs out before the reset, is
+deferred: background refreshes keep serving the stale
+entry, the prefetcher skips its run, and admin paths are answered from
+cache or with 429. Interactive calls are never deferred.
+
+Burn is measured per worker over QUOTA_BURN_WINDOW seconds; 304
+revalidations are free on GitHub and are not counted.
+
+Environment Variables:
+    QUOTA_BACKGROUND_FLOOR=0.3     # Background pauses below this share of the limit left
+    QUOTA_ADMIN_FLOOR=0.1          # Admin paths deferred below this share
+    QUOTA_HEADROOM=1.5             # Margin kept over higher classes' measured burn
+    QUOTA_BURN_WINDOW=300          # Seconds of calls the burn rate is measured over
+    QUOTA_ADMIN_PATHS=^rate_limit|^repos/[^/]+/[^/]+/(stats|traffic)/
+"""
+
+import os
+import re
+import time
+import threading
+import contextvars
+from collections import deque
+
+INTERACTIVE = 'interactive'
+ADMIN = 'admin'
+BACKGROUND = 'background'
+PRIORITIES = (INTERACTIVE, ADMIN, BACKGROUND)   # Served first to last
+
+DEFAULT_ADMIN_PATHS = r'^rate_limit|^repos/[^/]+/[^/]+/(stats|traffic)/'
+
+# Fallback window when GitHub hasn't told us a token's reset time yet
+DEFAULT_WINDOW = 3600
+
+# Plans are reused for this long (every upstream call asks)
+PLAN_TTL = 1.0
+
+# Burn is averaged over at least this long, so a startup burst isn't read as the steady rate
+MIN_BURN_SPAN = 60
+
+_current = contextvars.ContextVar('quota_class', default=INTERACTIVE)
+
+
+def current_class():
+    """Priority class upstream calls are charged to in this context"""
+    return _current.get()
+
+
+class charged_to:
+    """`with charged_to(BACKGROUND):` charges upstream calls in the block to that class"""
+
+    __slots__ = ('priority', 'token')
+
+    def __init__(self, priority):
+        self.priority = priority
+
+    def __enter__(self):
+        self.token = _current.set(self.priority)
+        return self
+
+    def __exit__(self, *exc):
+        _current.reset(self.token)
+        return False
+
+
+class BurnMeter:
+    """Calls per second over the last `window` seconds, in one-second buckets"""
+
+    def __init__(self, window=300):
+        self.window = window
+        self.since = time.time()
+        self._buckets = deque()     # [second, calls], oldest first
+        self._total = 0
+
+    def add(self, now, calls=1):
+        second = int(now)
+        if self._buckets and self._buckets[-1][0] == second:
+            self._buckets[-1][1] += calls
+        else:
+            self._buckets.append([second, calls])
+        self._total += calls
+
+    def rate(self, now):
+        while self._buckets and self._buckets[0][0] <= now - self.window:
+            self._total -= self._buckets.popleft()[1]
+        # A worker that just started has seen less than a full window
+        return self._total / min(self.window, max(now - self.since, MIN_BURN_SPAN))
+
+
+class QuotaPlanner:
+    """
+    Burn forecast and per-class allotments over the pooled tokens.
+
+    `windows()` returns (remaining, limit, reset) for every usable token
+    (or the public window when there are none).
+    """
+
+    def __init__(self, windows, floors=None, headroom=1.5, window=300, admin_paths=DEFAULT_ADMIN_PATHS):
+        self.windows = windows
+        self.floors = dict({INTERACTIVE: 0.0, ADMIN: 0.1, BACKGROUND: 0.3}, **(floors or {}))
+        self.headroom = headroom
+        self.admin_paths = re.compile(admin_paths) if admin_paths else None
+        self._meters = {priority: BurnMeter(window) for priority in PRIORITIES}
+        self._plan = None
+        self._planned_at = 0.0
+        self._lock = threading.Lock()
+        self.counters = {priority: {'calls': 0, 'deferred': 0} for priority in PRIORITIES}
+
+    def classify(self, github_path):
+        """Class of a client-requested GitHub path"""
+        if self.admin_paths and self.admin_paths.search(github_path):
+            return ADMIN
+        return INTERACTIVE
+
+    def record(self, priority=None):
+        """One upstream call spent pooled quota (charged to the context's class by default)"""
+        priority = priority or current_class()
+        with self._lock:
+            self._meters[priority].add(time.time())
+            self.counters[priority]['calls'] += 1
+
+    def admit(self, priority):
+        """Whether a `priority` call may spend quota now; counts a deferral if not"""
+        if priority == INTERACTIVE:
+            return True
+        plan = self.plan()
+        if plan['classes'][priority]['open']:
+            return True
+        with self._lock:
+            self.counters[priority]['deferred'] += 1
+        return False
+
+    def retry_after(self, priority):
+        """Seconds until a deferred class is likely to be admitted again"""
+        plan = self.plan()
+        if plan['classes'][priority]['below_floor'] and plan['reset_in'] is not None:
+            return plan['reset_in']
+        return 60   # Burn falls back under the allotment as the window slides
+
+    def plan(self):
+        now = time.time()
+        with self._lock:
+            if self._plan is None or now - self._planned_at >= PLAN_TTL:
+                self._plan = self._build(now)
+                self._planned_at = now
+            return self._plan
+
+    def _build(self, now):
+        remaining = limit = 0
+        sustainable = 0.0
+        first_reset = None
+        for left, window_limit, reset in self.windows():
+            if reset and reset <= now:
+                left = window_limit    # Window rolled over - the token is fresh again
+            seconds = (reset - now) if reset and reset > now else DEFAULT_WINDOW
+            remaining += max(left, 0)
+            limit += window_limit
+            sustainable += max(left, 0) / max(seconds, 1)
+            first_reset = seconds if first_reset is None else min(first_reset, seconds)
+
+        burn = {priority: meter.rate(now) for priority, meter in self._meters.items()}
+        total_burn = sum(burn.values())
+        # Remaining-weighted time until the quota comes back
+        reset_in = remaining / sustainable if sustainable else first_reset
+        exhausts_in = remaining / total_burn if total_burn else None
+        # While the quota lasts until the reset, only the floors hold anyone back
+        short = exhausts_in is not None and reset_in is not None and exhausts_in < reset_in
+
+        classes = {}
+        left_rate = sustainable
+        for priority in PRIORITIES:
+            below_floor = remaining < self.floors[priority] * limit
+            allotted = 0.0 if below_floor else left_rate
+            classes[priority] = {
+                'open': priority == INTERACTIVE or not below_floor and (not short or burn[priority] < allotted),
+                'below_floor': below_floor,
+                'floor': int(self.floors[priority] * limit),
+                'allotted_per_hour': round(allotted * 3600),
+                'burn_per_hour': round(burn[priority] * 3600),
+            }
+            left_rate = max(0.0, left_rate - burn[priority] * self.headroom)
+
+        return {
+            'remaining': remaining,
+            'limit': limit,
+            'sustainable_per_hour': round(sustainable * 3600),
+            'burn_per_hour': round(total_burn * 3600),
+            'reset_in': round(reset_in) if reset_in is not None else None,
+            'exhausts_in': round(exhausts_in) if exhausts_in is not None else None,
+            'exhausts_before_reset': short,
+            'left_at_reset': (max(0, round(remaining - total_burn * reset_in))
+                              if reset_in is not None else remaining),
+            'classes': classes,
+        }
+
+    def stats(self):
+        plan = self.plan()
+        with self._lock:
+            counters = {priority: dict(c) for priority, c in self.counters.items()}
+        classes = {priority: dict(plan['classes'][priority], **counters[priority]) for priority in PRIORITIES}
+        return dict(plan, classes=classes, headroom=self.headroom,
+                    admin_paths=self.admin_paths.pattern if self.admin_paths else None)
+
+
+def planner_from_env(windows):
+    return QuotaPlanner(
+        windows,
+        floors={ADMIN: float(os.getenv('QUOTA_ADMIN_FLOOR', 0.1)),
+                BACKGROUND: float(os.getenv('QUOTA_BACKGROUND_FLOOR', 0.3))},
+        headroom=float(os.getenv('QUOTA_HEADROOM', 1.5)),
+        window=int(os.getenv('QUOTA_BURN_WINDOW', 300)),
+        admin_paths=os.getenv('QUOTA_ADMIN_PATHS', DEFAULT_ADMIN_PATHS),
+    )
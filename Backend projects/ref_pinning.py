@@ -0,0 +1,131 @@
+"""
+Ref-to-SHA Pinning
+==================
+Most page calls ask for `contents` on a branch (`?ref=main` or no ref at
+all), and a branch can move at any time, so those responses could only
+be cached for CACHE_TTL_RULES' minute. The proxy now resolves the branch
+to its commit SHA through the tree index's ref cache (one
+`commits/<ref>` call per TREE_REF_TTL seconds, usually a free 304, and
+dropped by push webhooks) and asks GitHub for `?ref=<sha>` instead.
+
+- The response is cached under the SHA key for PINNED_TTL: content at a
+  commit never changes, so it is never revalidated, and every branch
+  name resolving to that commit shares it
+- A push changes only the ref lookup; the next request pins to the new
+  SHA and old entries age out of the LRU
+- A ref lookup that fails once the SHA is known keeps the last-known
+  SHA, so the entry cached under it is still served (stale) while
+  GitHub is rate-limiting or down
+- URLs that already name a commit SHA are answered with
+  `Cache-Control: immutable` (a year), so browsers and a CDN keep them
+- Branch URLs carry the SHA as their ETag (`X-Commit-SHA` too) and a
+  max-age of TREE_REF_TTL; a revalidation with a matching
+  If-None-Match is answered 304 after the ref lookup alone
+
+Listings fetched at a SHA have `?ref=<sha>` in their `url` fields and
+the SHA in `download_url`, so links followed from them are pinned too.
+
+Environment Variables:
+    REF_PINNING=1            # Pin contents requests to commit SHAs (0 = off)
+    PINNED_TTL=31536000      # Cache TTL for SHA-keyed entries
+"""
+
+import os
+import re
+import threading
+
+import requests
+
+from tree_index import TreeLookupError
+
+CONTENTS_RE = re.compile(r'^repos/([^/]+)/([^/]+)/contents(?:/|$)')
+COMMIT_SHA_RE = re.compile(r'^[0-9a-f]{40}$')
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# pin(cached_only=True) needs a ref lookup that may call GitHub
+LOOKUP_NEEDED = object()
+
+
+class RefPin:
+    """A contents request rewritten to a commit SHA"""
+
+    __slots__ = ('sha', 'params', 'immutable', 'max_age')
+
+    def __init__(self, sha, params, immutable, max_age):
+        self.sha = sha
+        self.params = params          # Upstream query, with ref=<sha>
+        self.immutable = immutable    # The client named the SHA itself
+        self.max_age = max_age
+
+    @property
+    def etag(self):
+        return f'"{self.sha}"'
+
+    def headers(self):
+        """Client response headers besides the ETag (200s and 304s)"""
+        return {
+            'Cache-Control': IMMUTABLE_CACHE_CONTROL if self.immutable else f'public, max-age={self.max_age}',
+            'X-Commit-SHA': self.sha,
+        }
+
+
+class RefPinner:
+    """
+    Pins `repos/<owner>/<repo>/contents/...` requests to commit SHAs.
+
+    `tree_cache` provides resolve_ref() / cached_ref() (tree_index.TreeIndexCache).
+    """
+
+    def __init__(self, tree_cache, enabled=True, ttl=31536000):
+        self.tree_cache = tree_cache
+        self.enabled = enabled
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.counters = {'pinned': 0, 'sha_requests': 0, 'not_modified': 0, 'unresolved': 0}
+
+    def pin(self, github_path, params, cached_only=False):
+        """
+        RefPin for a contents request, or None when it isn't pinned (other
+        paths, pinning off, or the ref can't be resolved - GitHub answers
+        those). With cached_only=True, returns LOOKUP_NEEDED instead of
+        calling GitHub for a ref lookup.
+        """
+        match = CONTENTS_RE.match(github_path.strip('/')) if self.enabled else None
+        if match is None:
+            return None
+        owner, repo = match.groups()
+        ref = params.get('ref') or 'HEAD'
+        if COMMIT_SHA_RE.match(ref):
+            self._count('sha_requests')
+            return RefPin(ref, params, True, self.ttl)
+        sha = self.tree_cache.cached_ref(owner, repo, ref)
+        if sha is None:
+            if cached_only:
+                return LOOKUP_NEEDED
+            try:
+                sha = self.tree_cache.resolve_ref(owner, repo, ref)
+            except (TreeLookupError, requests.RequestException):
+                self._count('unresolved')
+                return None
+        self._count('pinned')
+        return RefPin(sha, dict(params, ref=sha), False, self.tree_cache.ref_ttl)
+
+    def not_modified(self):
+        self._count('not_modified')
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, enabled=self.enabled, ttl=self.ttl)
+
+
+def pinner_from_env(tree_cache):
+    return RefPinner(
+        tree_cache,
+        enabled=os.getenv('REF_PINNING', '1') != '0',
+        ttl=int(os.getenv('PINNED_TTL', 31536000)),
+    )
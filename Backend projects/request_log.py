@@ -0,0 +1,173 @@
+"""
+Request Log
+===========
+Fixed-capacity ring buffer of recent upstream requests, replacing the
+append-and-trim list of dicts.
+
+Features:
+- Compact __slots__ records; timestamps formatted only when read
+- Constant-time, thread-safe append (no list copies or trims)
+- Optional JSON-lines export to a size-rotated local file, written by a
+  background thread so the request path never touches the disk
+
+Environment Variables:
+    REQUEST_LOG_CAPACITY=20000                       # Records kept in memory
+    REQUEST_LOG_FILE=/tmp/proxy-requests.{pid}.jsonl # Enables the JSON-lines sink
+    REQUEST_LOG_FILE_MAX_BYTES=10485760              # Rotate after this size
+    REQUEST_LOG_FILE_BACKUPS=3                       # Rotated files kept
+"""
+
+import os
+import json
+import time
+import queue
+import threading
+
+
+class LogRecord:
+    __slots__ = ('timestamp', 'endpoint', 'token', 'status')
+
+    def __init__(self, timestamp, endpoint, token, status):
+        self.timestamp = timestamp
+        self.endpoint = endpoint
+        self.token = token
+        self.status = status
+
+    def to_dict(self):
+        return {
+            'timestamp': self.timestamp,
+            'endpoint': self.endpoint,
+            'token': self.token,
+            'status': self.status,
+            'time_str': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.timestamp)),
+        }
+
+
+class RequestLog:
+    """Thread-safe ring buffer of LogRecords"""
+
+    def __init__(self, capacity=20000, sink=None):
+        self.capacity = capacity
+        self.sink = sink
+        self._slots = [None] * capacity
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def append(self, endpoint, token, status):
+        record = LogRecord(time.time(), endpoint, token, status)
+        with self._lock:
+            self._slots[self._total % self.capacity] = record
+            self._total += 1
+        if self.sink is not None:
+            self.sink.put(record)
+        return record
+
+    def records(self, n=None):
+        """Most recent n records, oldest first"""
+        with self._lock:
+            size = min(self._total, self.capacity)
+            n = size if n is None else min(n, size)
+            end = self._total
+            return [self._slots[i % self.capacity] for i in range(end - n, end)]
+
+    def recent(self, n):
+        """Most recent n requests as dicts (formatted here, not on append)"""
+        return [record.to_dict() for record in self.records(n)]
+
+    def __len__(self):
+        return min(self._total, self.capacity)
+
+    def stats(self):
+        info = {'capacity': self.capacity, 'size': len(self), 'total': self._total}
+        if self.sink is not None:
+            info['sink'] = self.sink.stats()
+        return info
+
+
+class JsonLinesSink:
+    """Background writer of records to a rotating JSON-lines file"""
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backups=3, queue_size=10000):
+        self.path_template = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self.path = None
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+
+    def put(self, record):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1  # Never block a request on the disk
+
+    def _ensure_started(self):
+        # One writer thread (and file) per process - gunicorn forks after import
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self.path = self.path_template.replace('{pid}', str(os.getpid()))
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name='request-log-sink', daemon=True).start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 1000:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            data = ''.join(json.dumps(r.to_dict(), separators=(',', ':')) + '\n' for r in batch)
+            try:
+                self._write(data.encode())
+                self.written += len(batch)
+            except OSError as e:
+                self.dropped += len(batch)
+                print(f"⚠️  Request log sink write failed: {e}")
+
+    def _write(self, data):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        if size and size + len(data) > self.max_bytes:
+            self._rotate()
+        with open(self.path, 'ab') as f:
+            f.write(data)
+
+    def _rotate(self):
+        """path -> path.1 -> path.2 ... (oldest beyond `backups` removed)"""
+        for i in range(self.backups - 1, 0, -1):
+            src = f'{self.path}.{i}'
+            if os.path.exists(src):
+                os.replace(src, f'{self.path}.{i + 1}')
+        if self.backups > 0:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+        self.rotations += 1
+
+    def stats(self):
+        return {'path': self.path or self.path_template, 'written': self.written,
+                'dropped': self.dropped, 'queued': self._queue.qsize(),
+                'rotations': self.rotations}
+
+
+def request_log_from_env():
+    path = os.getenv('REQUEST_LOG_FILE')
+    sink = None
+    if path:
+        sink = JsonLinesSink(
+            path,
+            max_bytes=int(os.getenv('REQUEST_LOG_FILE_MAX_BYTES', 10 * 1024 * 1024)),
+            backups=int(os.getenv('REQUEST_LOG_FILE_BACKUPS', 3)),
+        )
+    return RequestLog(int(os.getenv('REQUEST_LOG_CAPACITY', 20000)), sink)
@@ -0,0 +1,122 @@
+"""
+Response Encoding for Proxied JSON
+==================================
+Compression and field projection for proxy responses. GitHub contents
+listings repeat `url`, `git_url`, `html_url` and `_links` for every entry,
+so they shrink a lot with either.
+
+Features:
+- gzip and brotli, negotiated from Accept-Encoding (brotli only when the
+  `brotli` package is installed)
+- `?fields=name,path,type` keeps only the listed keys of each entry
+- Variants of cached entries are built once (see ResponseCache.variant)
+
+Environment Variables:
+    COMPRESS_MIN_BYTES=1024       # Smaller bodies are sent as-is
+    COMPRESS_GZIP_LEVEL=6
+    COMPRESS_BROTLI_QUALITY=5
+"""
+
+import os
+import gzip
+import json
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', 1024))
+GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 5))
+
+# Server preference when the client accepts several encodings equally
+SUPPORTED_ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+COMPRESSIBLE_TYPES = ('application/json', 'text/', 'application/javascript')
+
+
+def parse_fields(spec):
+    """'name,path,type' -> ('name', 'path', 'type'); empty/None -> None"""
+    fields = tuple(sorted({f.strip() for f in (spec or '').split(',') if f.strip()}))
+    return fields or None
+
+
+def negotiate_encoding(accept_encoding):
+    """Pick 'br', 'gzip' or None from an Accept-Encoding header"""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for encoding in SUPPORTED_ENCODINGS:
+        q = accepted.get(encoding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def is_compressible(content_type, body):
+    return (len(body) >= COMPRESS_MIN_BYTES and
+            (content_type or '').startswith(COMPRESSIBLE_TYPES))
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return body
+
+
+def _project(items, fields):
+    return [{k: item[k] for k in fields if k in item} if isinstance(item, dict) else item
+            for item in items]
+
+
+def project_fields(body, fields):
+    """
+    Keep only `fields` in each entry: list items (contents listings,
+    commits), `tree` items (git trees) or the object itself (one file)
+    """
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return body
+    if isinstance(data, list):
+        data = _project(data, fields)
+    elif isinstance(data, dict) and isinstance(data.get('tree'), list):
+        data['tree'] = _project(data['tree'], fields)
+    elif isinstance(data, dict):
+        data = {k: data[k] for k in fields if k in data}
+    else:
+        return body
+    return json.dumps(data, separators=(',', ':')).encode()
+
+
+def project_etag(etag, fields):
+    """Projected bodies are a different representation - tag them apart"""
+    if not etag or not fields:
+        return etag
+    weak, _, opaque = etag.rpartition('"')[0].partition('"')
+    return f'{weak}"{opaque};fields={",".join(fields)}"'
+
+
+def encode_body(body, content_type, fields=None, encoding=None):
+    """
+    Apply projection then compression; returns (body, applied_encoding).
+    applied_encoding is None when the body is too small or not text.
+    """
+    if fields and (content_type or '').startswith('application/json'):
+        body = project_fields(body, fields)
+    if encoding and is_compressible(content_type, body):
+        return compress(body, encoding), encoding
+    return body, None
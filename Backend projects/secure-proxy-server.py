@@ -7,76 +7,93 @@ Features:
 - Encrypted token storage (not plain text)
 - Admin portal for token management
 - No tokens exposed to frontend
-- Automatic rotation
+- Automatic rotation (rate-limit-aware token scheduling)
 - CORS protection
 - Rate limit handling
+- Response caching with conditional revalidation
+- Optional SQLite disk cache tier: survives restarts, shared by all workers
+- Stale-while-revalidate; last good response served through rate limits and outages
+- Pooled keep-alive upstream connections
+- Optional asyncio engine (PROXY_ENGINE=async)
+- Request coalescing for identical concurrent calls
+- Stats shared across gunicorn workers (SHARED_STATE_PATH)
+- Recursive tree endpoint (one tree fetch per commit instead of N contents calls)
+- Large upstream bodies streamed through instead of buffered
+- Raw file proxy with content-addressed disk cache (SLDPRT, GLB, images)
+- gzip/brotli responses and ?fields= projection, encoded once per cache entry
+- Push webhooks invalidate touched cache entries; browsers notified over SSE
+- Atomic multi-file uploads: parallel blobs, one tree, one commit (POST /api/commit);
+  files the repo already has (by git blob SHA) are not uploaded again
+- Prometheus /metrics: latency histograms per route and per token
+- Ring-buffer request log with optional JSON-lines file export
+- Per-phase Server-Timing traces (X-Trace: 1) and on-demand /admin/profile
+- Importable app factory; tokens decrypted on first use, not at boot
+- Background warm-up and refresh-ahead of PREFETCH_PATHS within an hourly call budget
+- POST /api/github/batch: many paths resolved concurrently, streamed back as NDJSON
+- Admission control: per-client token buckets and a bounded in-flight queue (429 + Retry-After)
+- Quota planner: burn forecast per token window; interactive > admin > background priority
+- Branch contents requests pinned to commit SHAs: cached by SHA, immutable when the URL names one
 
 Setup:
     pip install -r requirements.txt
     python setup-tokens.py  # One-time setup (admin only)
-    python secure-proxy-server.py
+    python main.py          # or: gunicorn --preload 'secure-proxy-server:app'
 """
 
 import os
+import re
+import sys
 import json
+import mimetypes
 import base64
 import hashlib
-from itertools import cycle
-from cryptography.fernet import Fernet
-from flask import Flask, request, jsonify, abort
+from flask import Flask, request, jsonify, abort, Response, redirect, send_file, g
 from flask_cors import CORS
-import requests
 import time
-from functools import lru_cache
+from concurrent.futures import TimeoutError as FutureTimeout
+from proxy_cache import (STALE_WARNINGS, BackgroundRefresh, CacheEntry, UpstreamUnavailable,
+                         cache_from_env, upstream_failed)
+from response_encoding import negotiate_encoding, parse_fields, project_etag
+from single_flight import SingleFlight, flight_from_env
+from token_scheduler import TokenScheduler
+from quota_planner import BACKGROUND, INTERACTIVE, charged_to, planner_from_env
+from shared_state import state_from_env
+from request_log import request_log_from_env
+from token_store import token_store_from_env
+from prefetch import prefetcher_from_env
+from admission import ADMITTED_ENDPOINTS, admission_from_env, retry_after
+from git_commit import (COMMIT_MAX_BYTES, CommitError, committer_from_env, parse_commit_request,
+                        parse_multipart_commit)
+from batch import (BATCH_MAX_PATHS, NDJSON_TYPE, BatchError, batch_pool_from_env, done_line,
+                   error_line, parse_batch, result_line)
+from tree_index import TreeLookupError, tree_cache_from_env
+from ref_pinning import pinner_from_env
+from upstream_client import GITHUB_API, GITHUB_RAW, STREAM_CHUNK, StreamedBody, client_from_env, read_or_stream
+from blob_store import BlobIntegrityError, blob_store_from_env
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsRegistry, endpoint_class, route_label
+from tracing import (TRACE_HEADER, ProfilerBusy, collapsed, profiler_from_env, span, top_functions,
+                     tracer_from_env)
+from tracing import current as current_trace, record as record_phase
+from change_events import (EVENTS_HEARTBEAT, Subscription, affects_cache_key, broker_from_env,
+                           format_sse, parse_last_event_id, push_event, ready_frame,
+                           verify_signature)
 
 app = Flask(__name__)
 
 # Configuration
-SECRET_KEY = os.getenv('SECRET_KEY', Fernet.generate_key().decode())
 ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD', 'your_secure_admin_password_here')
 ALLOWED_ORIGINS = os.getenv('ALLOWED_ORIGINS', '*').split(',')
 PORT = int(os.getenv('PORT', 5000))
 HOST = os.getenv('HOST', '0.0.0.0')  # Allow external access in production
+PROXY_ENGINE = os.getenv('PROXY_ENGINE', 'sync').lower()  # 'sync' (Flask) or 'async' (aiohttp)
+GITHUB_WEBHOOK_SECRET = os.getenv('GITHUB_WEBHOOK_SECRET', '')  # Enables /api/webhooks/github
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')  # Bearer token for /metrics scrapers
 
 # Enable CORS (Allow all origins for public API, but protect admin routes)
 CORS(app, origins=ALLOWED_ORIGINS, supports_credentials=True)
 
-# Encryption setup
-cipher = Fernet(SECRET_KEY.encode() if isinstance(SECRET_KEY, str) else SECRET_KEY)
-
-# Token storage file (encrypted)
-TOKENS_FILE = 'tokens.enc'
-
-def encrypt_tokens(tokens):
-    """Encrypt list of tokens"""
-    tokens_json = json.dumps(tokens)
-    return cipher.encrypt(tokens_json.encode()).decode()
-
-def decrypt_tokens():
-    """Decrypt and return list of tokens"""
-    try:
-        if not os.path.exists(TOKENS_FILE):
-            print("⚠️  No tokens file found. Run setup-tokens.py first!")
-            return []
-        
-        with open(TOKENS_FILE, 'r') as f:
-            encrypted_data = f.read()
-        
-        decrypted = cipher.decrypt(encrypted_data.encode())
-        tokens = json.loads(decrypted.decode())
-        return tokens
-    except Exception as e:
-        print(f"❌ Error decrypting tokens: {e}")
-        return []
-
-# Load tokens on startup
-GITHUB_TOKENS = decrypt_tokens()
-if GITHUB_TOKENS:
-    token_pool = cycle(GITHUB_TOKENS)
-    print(f"✅ Loaded {len(GITHUB_TOKENS)} encrypted tokens")
-else:
-    token_pool = None
-    print("⚠️  No tokens loaded. Running in public mode only.")
+# Encrypted tokens (tokens.enc), decrypted on first use; stats are set up then
+token_store = token_store_from_env(on_load=lambda tokens: initialize_token_stats(tokens))
 
 # Rate limit tracking
 rate_limit_info = {
@@ -85,14 +102,66 @@ rate_limit_info = {
     'reset': time.time() + 3600
 }
 
+# Shared response cache for proxied GitHub calls
+response_cache = cache_from_env()
+stale_refresh = BackgroundRefresh()  # Refreshes behind stale responses
+batch_pool = batch_pool_from_env()   # Resolves /api/github/batch items
+admission = admission_from_env(ALLOWED_ORIGINS)  # Per-client limits on the public proxy routes
+
+# Pooled keep-alive session for upstream GitHub calls
+upstream = client_from_env()
+
+# Prometheus metrics (GET /metrics); scrape-time collectors are registered below
+metrics = MetricsRegistry()
+http_requests = metrics.counter(
+    'proxy_http_requests_total', 'Client requests by route and status', ('route', 'status'))
+http_latency = metrics.histogram(
+    'proxy_http_request_duration_seconds', 'Client request latency by route', ('route',))
+http_in_flight = metrics.gauge(
+    'proxy_http_requests_in_flight', 'Client requests being served', ('route',))
+upstream_requests = metrics.counter(
+    'proxy_upstream_requests_total', 'GitHub calls by endpoint and status', ('endpoint', 'status'))
+upstream_latency = metrics.histogram(
+    'proxy_upstream_duration_seconds', 'GitHub latency (to response headers) by endpoint and token',
+    ('endpoint', 'token'))
+trace_phase = metrics.histogram(
+    'proxy_trace_phase_seconds', 'Time per phase of traced requests', ('phase',))
+
+# Server-Timing traces (X-Trace: 1 or TRACE_SAMPLE_RATE) and /admin/profile captures
+tracer = tracer_from_env()
+profiler = profiler_from_env()
+
+def encode_flight_result(cache_key, result):
+    """Serialize a fetch_upstream() result for cross-worker coalescing"""
+    cache_status, entry = result
+    if cache_status == 'STREAM':
+        return None
+    meta = {'key': cache_key, 'status': entry.status, 'headers': entry.headers,
+            'expires_at': entry.expires_at}
+    return meta, entry.body
+
+def decode_flight_result(meta, body):
+    """Rebuild a result published by another worker (and cache it here too)"""
+    ttl = int(meta['expires_at'] - time.time())
+    entry = None
+    if meta['status'] == 200 and ttl > 0:
+        entry = response_cache.put(meta['key'], 200, body, meta['headers'], ttl)
+    return 'COALESCED', entry or CacheEntry(meta['status'], body, meta['headers'], 0)
+
+# In-flight deduplication of identical upstream calls
+inflight = flight_from_env(encode_flight_result, decode_flight_result)
+
 # Token usage tracking (detailed analytics)
 token_usage_stats = {}
-request_log = []  # Track recent requests
+request_log = request_log_from_env()  # Ring buffer of recent requests
+
+# Merges stats/rate limits across workers (in-process unless SHARED_STATE_PATH is set)
+shared_state = state_from_env()
+shared_state.attach(token_usage_stats, rate_limit_info, request_log)
 
-def initialize_token_stats():
+def initialize_token_stats(tokens):
     """Initialize statistics for each token"""
-    global token_usage_stats
-    for i, token in enumerate(GITHUB_TOKENS):
+    for i, token in enumerate(tokens):
         token_id = f"{token[:8]}...{token[-4:]}" if len(token) > 12 else f"Token-{i+1}"
         if token_id not in token_usage_stats:
             token_usage_stats[token_id] = {
@@ -107,26 +176,42 @@ def initialize_token_stats():
                 'success_count': 0
             }
 
-# Initialize stats on startup
-initialize_token_stats()
+def token_id_for(token):
+    """Masked token id used as the token_usage_stats key"""
+    return f"{token[:8]}...{token[-4:]}" if len(token) > 12 else "Unknown"
+
+# Picks the token with the most quota left; skips exhausted/invalid ones
+token_scheduler = TokenScheduler(token_usage_stats, token_id_for)
 
 def get_next_token():
-    """Get next token from rotation pool"""
-    if token_pool and GITHUB_TOKENS:
-        return next(token_pool)
+    """Get the best available token (None if all are exhausted)"""
+    tokens = token_store.tokens()
+    if tokens:
+        return token_scheduler.pick(tokens)
     return None
 
+def quota_windows():
+    """(remaining, limit, reset) per usable token, or the public window without tokens"""
+    if not token_store.tokens():
+        return [(rate_limit_info['remaining'], rate_limit_info['limit'], rate_limit_info['reset'])]
+    return [(stats['rate_limit']['remaining'], stats['rate_limit']['limit'], stats['rate_limit']['reset'])
+            for stats in list(token_usage_stats.values()) if stats['status'] != 'invalid']
+
+# Forecasts quota burn and defers admin/background calls before interactive ones
+quota_planner = planner_from_env(quota_windows)
+
 def track_token_usage(token, endpoint, success=True):
     """Track token usage for analytics"""
     if not token:
         return
     
-    token_id = f"{token[:8]}...{token[-4:]}" if len(token) > 12 else "Unknown"
+    token_id = token_id_for(token)
     
     if token_id in token_usage_stats:
+        now = time.time()
         stats = token_usage_stats[token_id]
         stats['usage_count'] += 1
-        stats['last_used'] = time.time()
+        stats['last_used'] = now
         
         # Track endpoints
         if endpoint not in stats['endpoints_used']:
@@ -138,13 +223,16 @@ def track_token_usage(token, endpoint, success=True):
             stats['success_count'] += 1
         else:
             stats['error_count'] += 1
+        
+        shared_state.record_usage(token_id, endpoint, success, now)
 
-def update_token_rate_limit(token, headers):
+def update_token_rate_limit(token, headers, status_code=None):
     """Update rate limit info for specific token"""
     if not token or not headers:
         return
     
-    token_id = f"{token[:8]}...{token[-4:]}" if len(token) > 12 else "Unknown"
+    token_id = token_id_for(token)
+    token_scheduler.observe(token)
     
     if token_id in token_usage_stats:
         if 'X-RateLimit-Remaining' in headers:
@@ -155,27 +243,26 @@ def update_token_rate_limit(token, headers):
             }
         
         # Check if token is expired/invalid
-        if headers.get('status') == '401':
+        if status_code == 401 or headers.get('status') == '401':
             token_usage_stats[token_id]['status'] = 'invalid'
         elif int(headers.get('X-RateLimit-Remaining', 5000)) == 0:
             token_usage_stats[token_id]['status'] = 'rate_limited'
         else:
             token_usage_stats[token_id]['status'] = 'active'
+        
+        shared_state.record_rate_limit(token_id, token_usage_stats[token_id]['rate_limit'],
+                                       token_usage_stats[token_id]['status'])
+
+def release_token(headers):
+    """Give back the scheduler pick behind `headers` when its call got no response"""
+    auth_header = headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        token_scheduler.release(auth_header.replace('Bearer ', ''))
 
 def log_request(endpoint, token_used, status_code):
     """Log recent requests for monitoring"""
-    global request_log
-    request_log.append({
-        'timestamp': time.time(),
-        'endpoint': endpoint,
-        'token': token_used,
-        'status': status_code,
-        'time_str': time.strftime('%Y-%m-%d %H:%M:%S')
-    })
-    
-    # Keep only last 100 requests
-    if len(request_log) > 100:
-        request_log = request_log[-100:]
+    record = request_log.append(endpoint, token_used, status_code)
+    shared_state.record_request(record)
 
 def get_headers(use_token=True):
     """Get headers for GitHub API request"""
@@ -185,13 +272,344 @@ def get_headers(use_token=True):
     }
     
     if use_token:
-        token = get_next_token()
+        with span('token'):
+            token = get_next_token()
         if token:
             headers['Authorization'] = f'Bearer {token}'
             headers['X-Current-Token'] = f"{token[:8]}...{token[-4:]}"  # For tracking
     
     return headers
 
+def observe_upstream(github_path, token_label, status_code, elapsed):
+    """Upstream call counters and latency histogram"""
+    endpoint = endpoint_class(github_path)
+    upstream_requests.inc((endpoint, str(status_code)))
+    if elapsed is not None:
+        upstream_latency.observe(elapsed, (endpoint, token_label))
+        record_phase('upstream', elapsed)
+
+def observe_trace(trace):
+    """Feed a finished trace's phases into the /metrics histogram"""
+    if trace is None:
+        return
+    for phase, seconds in trace.phases.items():
+        trace_phase.observe(seconds, (phase,))
+    trace_phase.observe(trace.total, ('total',))
+
+def record_upstream_response(github_path, headers, status_code, response_headers, elapsed=None):
+    """Token, rate limit, request log and metrics bookkeeping for one upstream call"""
+    observe_upstream(github_path, headers.get('X-Current-Token', 'public'), status_code, elapsed)
+    with span('bookkeeping'):
+        record_upstream_bookkeeping(github_path, headers, status_code, response_headers)
+
+def record_upstream_bookkeeping(github_path, headers, status_code, response_headers):
+    """Token stats, rate limits and request log (timed as the bookkeeping phase)"""
+    # Extract actual token for tracking
+    auth_header = headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        actual_token = auth_header.replace('Bearer ', '')
+        
+        # Track usage
+        track_token_usage(actual_token, github_path, success=(status_code in (200, 304)))
+        if status_code != 304:
+            quota_planner.record()  # 304s don't count against the rate limit
+        
+        # Update rate limit
+        update_token_rate_limit(actual_token, response_headers, status_code)
+    
+    # Log request
+    log_request(github_path, headers.get('X-Current-Token', 'No token'), status_code)
+    
+    # Update global rate limit tracking
+    if 'X-RateLimit-Remaining' in response_headers:
+        rate_limit_info['remaining'] = int(response_headers['X-RateLimit-Remaining'])
+        rate_limit_info['limit'] = int(response_headers['X-RateLimit-Limit'])
+        rate_limit_info['reset'] = int(response_headers['X-RateLimit-Reset'])
+        shared_state.record_global_rate_limit(rate_limit_info)
+
+def github_get(github_path, params=None, extra_headers=None):
+    """Authenticated upstream GET with token rotation and bookkeeping"""
+    headers = get_headers()
+    if extra_headers:
+        headers.update(extra_headers)
+    try:
+        response = upstream.get(f'{GITHUB_API}/{github_path}', headers=headers, params=params)
+    except Exception:
+        release_token(headers)  # Timeout / connection error: no response to observe
+        raise
+    record_upstream_response(github_path, headers, response.status_code, response.headers,
+                             response.elapsed.total_seconds())
+    return response
+
+def github_call(method, github_path, token, body=None):
+    """
+    Upstream call made with a client's own token (uploads)
+    Kept out of token rotation and rate limit tracking; returns (status, json)
+    """
+    headers = get_headers(use_token=False)
+    headers['Authorization'] = f'token {token}'
+    response = upstream.request(method, f'{GITHUB_API}/{github_path}', headers=headers, json=body)
+    observe_upstream(github_path, 'client', response.status_code, response.elapsed.total_seconds())
+    log_request(github_path, 'Client token', response.status_code)
+    try:
+        return response.status_code, response.json()
+    except ValueError:
+        return response.status_code, None
+
+# Whole-repo tree indexes (one git/trees fetch per head commit)
+tree_cache = tree_cache_from_env(github_get, GITHUB_API)
+
+# contents?ref=<branch> -> contents?ref=<sha>, through the tree index's ref cache
+ref_pinner = pinner_from_env(tree_cache)
+
+def pin_target(github_path, params, pin):
+    """(params, cache_key, ttl) for a request - pinned ones are keyed and cached by commit SHA"""
+    if pin is not None:
+        params, ttl = pin.params, ref_pinner.ttl
+    else:
+        ttl = response_cache.ttl_for(github_path)
+    return params, response_cache.make_key(github_path, params), ttl
+
+# Multi-file uploads as one Git Data API commit; blobs already in the
+# head tree (per the tree index) are not uploaded again
+committer = committer_from_env(github_call, index=tree_cache.tree)
+
+# Raw files cached on disk by git blob SHA
+blob_store = blob_store_from_env()
+blob_downloads = SingleFlight()
+
+# CAD / 3D formats mimetypes doesn't know (not add_type()d at import:
+# that loads the system mime tables before the first request needs them)
+EXTRA_MIMETYPES = {'.glb': 'model/gltf-binary', '.gltf': 'model/gltf+json', '.stl': 'model/stl'}
+
+def guess_mimetype(file_path):
+    ext = os.path.splitext(file_path)[1].lower()
+    return EXTRA_MIMETYPES.get(ext) or mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+
+COMMIT_SHA_RE = re.compile(r'^[0-9a-f]{40}$')
+
+def fetch_raw_blob(owner, repo, ref, file_path):
+    """
+    Resolve a repo file to its git blob and make sure it's on disk
+    Returns (local_path, blob_sha, pinned) - pinned when ref is a commit SHA
+    """
+    sha = tree_cache.resolve_ref(owner, repo, ref)
+    node = tree_cache.tree(owner, repo, sha).find(file_path)
+    if node is None or node.type != 'blob':
+        raise TreeLookupError(f'{file_path} is not a file in {owner}/{repo}@{ref}', 404)
+    
+    local_path = blob_store.get(node.sha)
+    if local_path is None:
+        local_path = blob_downloads.do(
+            node.sha, lambda: download_blob(owner, repo, sha, file_path, node))[0]
+    return local_path, node.sha, bool(COMMIT_SHA_RE.match(ref))
+
+def download_blob(owner, repo, commit_sha, file_path, node):
+    """Stream one file from raw.githubusercontent.com into the blob store"""
+    headers = get_headers()
+    token = headers.pop('X-Current-Token', 'No token')
+    headers.pop('Accept', None)
+    try:
+        response = upstream.get(f'{GITHUB_RAW}/{owner}/{repo}/{commit_sha}/{file_path}',
+                                headers=headers, stream=True)
+    finally:
+        release_token(headers)  # raw.githubusercontent.com sends no rate-limit headers to observe
+    log_request(f'raw/{owner}/{repo}/{file_path}', token, response.status_code)
+    observe_upstream('raw', token, response.status_code, response.elapsed.total_seconds())
+    try:
+        if response.status_code != 200:
+            raise TreeLookupError(f'Raw download failed for {file_path}', response.status_code)
+        return blob_store.put_stream(node.sha, node.size, response.iter_content(STREAM_CHUNK))
+    finally:
+        response.close()
+
+def prefetch_github(github_path, params=None, refresh=False):
+    """
+    Serve a proxied path the way /api/github would, for the prefetcher
+    Returns (cache_status, entry); refresh=True revalidates a fresh entry
+    """
+    with charged_to(BACKGROUND):
+        pin = ref_pinner.pin(github_path, params or {})
+        params, cache_key, ttl = pin_target(github_path, params or {}, pin)
+        # Entries pinned to a commit never change - nothing to revalidate
+        cached = response_cache.get(cache_key) if ttl > 0 and not (refresh and pin is None) else None
+        if cached is not None and cached.is_fresh():
+            return 'HIT', cached
+        (cache_status, entry), shared = inflight.do(
+            cache_key, lambda: fetch_upstream(github_path, params, cache_key, ttl))
+    if cache_status == 'STREAM' and shared:
+        return 'COALESCED', None  # The client request relays that body
+    return ('COALESCED' if shared else cache_status), entry
+
+def quota_left():
+    """Requests left on usable tokens (the public limit without tokens)"""
+    if not token_store.tokens():
+        return rate_limit_info['remaining']
+    return sum(stats['rate_limit']['remaining'] for stats in list(token_usage_stats.values())
+               if stats['status'] == 'active')
+
+# Background warm-up of PREFETCH_PATHS, one thread per worker, one hourly budget for all of them
+prefetcher = prefetcher_from_env(prefetch_github, response_cache, quota_left,
+                                 admit=lambda: quota_planner.admit(BACKGROUND), shared_state=shared_state)
+if prefetcher.enabled and hasattr(os, 'register_at_fork'):
+    # gunicorn --preload forks workers after import; start warming in each right away
+    os.register_at_fork(after_in_child=prefetcher.start)
+
+# Push notifications for /api/events subscribers in this process
+event_broker = broker_from_env()
+
+def apply_change_event(event):
+    """Invalidate what a push touched, then notify SSE clients"""
+    owner, _, repo = event['repo'].partition('/')
+    tree_cache.invalidate(owner, repo, keep_sha=event.get('after'))
+    invalidated = response_cache.invalidate(lambda key: affects_cache_key(event, key))
+    prefetcher.trigger(event['repo'])
+    event_broker.publish(event)
+    return invalidated
+
+# Pushes received by other workers arrive through the shared state backend
+shared_state.attach_events(apply_change_event)
+
+def token_gauge(field):
+    """Scrape-time samples of one rate_limit field per token"""
+    return lambda: [((token_id,), stats['rate_limit'].get(field))
+                    for token_id, stats in list(token_usage_stats.items())]
+
+def counter_samples(stats_fn, names):
+    return lambda: [((name,), stats_fn().get(name)) for name in names]
+
+def coalescing_in_flight():
+    stats = inflight.stats()
+    return [((), stats.get('local', stats).get('in_flight'))]
+
+metrics.collected('proxy_token_remaining', 'gauge', 'Requests left in the token\'s rate-limit window',
+                  ('token',), token_gauge('remaining'))
+metrics.collected('proxy_token_limit', 'gauge', 'Token rate limit per window', ('token',), token_gauge('limit'))
+metrics.collected('proxy_token_reset_timestamp_seconds', 'gauge', 'When the token\'s window resets',
+                  ('token',), token_gauge('reset'))
+metrics.collected('proxy_token_status', 'gauge', '1 for the token\'s current status', ('token', 'status'),
+                  lambda: [((token_id, stats['status']), 1) for token_id, stats in list(token_usage_stats.items())])
+metrics.collected('proxy_cache_events_total', 'counter', 'Response cache events', ('event',),
+                  counter_samples(response_cache.stats, ('hits', 'misses', 'revalidated', 'stores', 'evictions',
+                                                         'invalidated', 'variants_built', 'variant_hits',
+                                                         'stale_served', 'stale_on_error', 'disk_hits')))
+metrics.collected('proxy_cache_bytes', 'gauge', 'Bytes held by the response cache', (),
+                  lambda: [((), response_cache.stats()['bytes'])])
+metrics.collected('proxy_upstream_pool_total', 'counter', 'Upstream requests vs new TCP connections', ('kind',),
+                  counter_samples(upstream.stats, ('requests', 'new_connections', 'pool_hits')))
+metrics.collected('proxy_upstream_pool_size', 'gauge', 'Keep-alive connections per upstream host', (),
+                  lambda: [((), upstream.pool_size)])
+metrics.collected('proxy_coalesced_total', 'counter', 'Single-flight outcomes for proxied calls', ('role',),
+                  counter_samples(inflight.stats, ('leaders', 'shared', 'timeouts')))
+metrics.collected('proxy_coalesced_in_flight', 'gauge', 'Distinct upstream calls in flight', (),
+                  coalescing_in_flight)
+metrics.collected('proxy_sse_clients', 'gauge', 'Connected /api/events clients', (),
+                  lambda: [((), event_broker.stats()['clients'])])
+metrics.collected('proxy_prefetch_total', 'counter', 'Background prefetch outcomes', ('event',),
+                  counter_samples(prefetcher.stats, ('fetched', 'revalidated', 'hits', 'refreshed',
+                                                     'skipped_budget', 'skipped_reserve', 'skipped_quota',
+                                                     'errors')))
+metrics.collected('proxy_blob_cache_events_total', 'counter', 'Raw file cache events', ('event',),
+                  counter_samples(blob_store.stats, ('hits', 'downloads', 'evictions')))
+metrics.collected('proxy_admission_rejected_total', 'counter', 'Requests turned away with 429', ('reason',),
+                  counter_samples(admission.rejections, ('limited_ip', 'limited_origin', 'rejected_full',
+                                                         'rejected_timeout')))
+metrics.collected('proxy_quota_deferred_total', 'counter', 'Upstream calls deferred by the quota planner',
+                  ('class',), lambda: [((name,), c['deferred']) for name, c in quota_planner.stats()['classes'].items()])
+metrics.collected('proxy_quota_burn_per_hour', 'gauge', 'Measured pooled-quota burn rate by priority class',
+                  ('class',), lambda: [((name,), c['burn_per_hour'])
+                                       for name, c in quota_planner.stats()['classes'].items()])
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_route = route_label(request.url_rule.rule) if request.url_rule else 'unmatched'
+    g.metrics_started = time.perf_counter()
+    http_in_flight.inc((g.metrics_route,))
+
+def observe_request(route, started, status):
+    http_in_flight.dec((route,))
+    http_latency.observe(time.perf_counter() - started, (route,))
+    http_requests.inc((route, str(status)))
+
+@app.after_request
+def record_request_status(response):
+    route = g.get('metrics_route')
+    if route is not None and response.is_streamed:
+        # Batch NDJSON, SSE and file bodies are sent after teardown - finish once they are
+        started = g.pop('metrics_started')
+        g.pop('metrics_route')
+        response.call_on_close(lambda: observe_request(route, started, response.status_code))
+    else:
+        g.metrics_status = response.status_code
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    route = g.pop('metrics_route', None)
+    if route is None:
+        return
+    observe_request(route, g.pop('metrics_started'), g.pop('metrics_status', 500))
+
+@app.before_request
+def start_prefetcher():
+    prefetcher.start()  # Workers not forked from a preloaded master start on first request
+
+@app.before_request
+def start_trace():
+    g.trace_handle = tracer.start(request.headers.get(TRACE_HEADER) == '1')
+
+@app.after_request
+def add_server_timing(response):
+    trace = current_trace()
+    if trace is not None:
+        response.headers['Server-Timing'] = trace.server_timing(streamed=response.is_streamed)
+        if response.is_streamed:
+            g.trace_streamed = True
+            response.call_on_close(lambda: observe_trace(tracer.complete(trace)))
+    return response
+
+@app.teardown_request
+def finish_trace(exc):
+    handle = g.pop('trace_handle', None)
+    if handle is None:
+        return
+    if g.pop('trace_streamed', False):
+        tracer.detach(handle)  # Completed when the body has been sent
+    else:
+        observe_trace(tracer.finish(handle))
+
+def too_many_requests(wait, message):
+    resp = jsonify({'error': message, 'retry_after': round(wait, 1)})
+    resp.status_code = 429
+    resp.headers['Retry-After'] = retry_after(wait)
+    return resp
+
+@app.before_request
+def admit_request():
+    if request.endpoint not in ADMITTED_ENDPOINTS or request.method == 'OPTIONS':
+        return None  # CORS preflights are free
+    g.admission_client = (admission.client_ip(request.remote_addr, request.headers.get('X-Forwarded-For')),
+                          request.headers.get('Origin'))
+    wait = admission.check(*g.admission_client)
+    if wait:
+        return too_many_requests(wait, 'Rate limit exceeded for this client')
+    if admission.gate.enabled:
+        if not admission.gate.acquire():
+            return too_many_requests(1, 'Proxy is busy, try again shortly')
+        g.admission_slot = True
+
+@app.after_request
+def release_admission_on_close(response):
+    # Streamed bodies (batch, large files) keep their slot until fully sent
+    if g.pop('admission_slot', None):
+        response.call_on_close(admission.gate.release)
+    return response
+
+@app.teardown_request
+def release_admission(exc):
+    if g.pop('admission_slot', None):
+        admission.gate.release()  # No response was made (after_request didn't run)
+
 def verify_admin(password):
     """Verify admin password"""
     return password == ADMIN_PASSWORD
@@ -206,57 +624,450 @@ def proxy_github(github_path):
     Public endpoint - Proxy GitHub API requests
     No authentication required
     """
-    current_token = None
     try:
-        github_url = f'https://api.github.com/{github_path}'
         params = request.args.to_dict()
+        # Projection is applied locally - not part of the upstream request
+        fields = parse_fields(params.pop('fields', None))
+        
+        # Branch requests are served from the entry for the commit the branch points at
+        pin = ref_pinner.pin(github_path, params)
+        if pin is not None and request.headers.get('If-None-Match') == project_etag(pin.etag, fields):
+            return pinned_not_modified(pin, fields)
+        params, cache_key, ttl = pin_target(github_path, params, pin)
+        cache_status, entry = resolve_github(github_path, params, cache_key, ttl)
+        if cache_status == 'STREAM':
+            return streamed_response(entry)
+        return cached_response(entry, cache_status, cache_key, fields, pin)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/github/batch', methods=['POST'])
+def proxy_github_batch():
+    """
+    Public endpoint - resolve many GitHub paths in one request
+    Streams one NDJSON line per path as it completes (see batch.py)
+    """
+    try:
+        items, fields = parse_batch(request.get_json(force=True, silent=True))
+    except BatchError as e:
+        return jsonify({'error': str(e)}), 400
+    fields = parse_fields(fields)
+    # One token was charged on admission; the rest of the paths cost one each
+    wait = admission.check(*g.admission_client, cost=len(items) - 1) if len(items) > 1 else 0
+    if wait:
+        return too_many_requests(wait, f'Rate limit exceeded for a batch of {len(items)} paths')
+
+    def resolve(path, github_path, params):
+        params, cache_key, ttl = pin_target(github_path, params, ref_pinner.pin(github_path, params))
+        return cache_key, resolve_github(github_path, params, cache_key, ttl)
+
+    def stream():
+        started = time.perf_counter()
+        for index, result, error in batch_pool.run(items, resolve):
+            path = items[index][0]
+            if error is not None:
+                yield error_line(index, path, 500, str(error))
+                continue
+            cache_key, (cache_status, entry) = result
+            if cache_status == 'STREAM':
+                entry.close()  # Too large to inline - fetch it from /api/github directly
+                yield error_line(index, path, 413, 'Response too large for a batch; request it directly')
+                continue
+            body, _ = response_cache.variant(cache_key, entry, fields if entry.status == 200 else None)
+            yield result_line(index, path, cache_status, entry, body)
+        yield done_line(len(items), time.perf_counter() - started)
+
+    resp = Response(stream(), mimetype=NDJSON_TYPE)
+    resp.headers['Cache-Control'] = 'no-store'
+    resp.headers['X-Accel-Buffering'] = 'no'  # Let reverse proxies pass lines through as written
+    return resp
+
+def resolve_github(github_path, params, cache_key, ttl):
+    """
+    Resolve a proxied path: fresh cache, stale policy, then one coalesced upstream call
+    Returns (cache_status, entry); ('STREAM', StreamedBody) for bodies too large to cache
+    """
+    # Serve fresh cached responses without touching GitHub
+    with span('cache'):
+        cached = response_cache.lookup(cache_key) if ttl > 0 else None
+    if cached:
+        return 'HIT', cached
+    
+    # Expired but still servable: don't make the visitor wait on GitHub
+    priority = quota_planner.classify(github_path)
+    stale = response_cache.stale(cache_key) if ttl > 0 else None
+    if stale:
+        result = resolve_stale(github_path, params, cache_key, ttl, *stale, priority=priority)
+        if result is not None:
+            return result
+    
+    # Quota running low: analytics calls get whatever is cached, however old
+    if not quota_planner.admit(priority):
+        return quota_deferred(cache_key, priority)
+    
+    # Identical concurrent requests share a single upstream call
+    with charged_to(priority):
+        (cache_status, entry), shared = inflight.do(
+            cache_key, lambda: fetch_upstream(github_path, params, cache_key, ttl))
+        if cache_status == 'STREAM' and shared:
+            # A streamed body can only be relayed once - fetch our own copy
+            return fetch_upstream(github_path, params, cache_key, ttl)
+    return ('COALESCED' if shared else cache_status), entry
+
+def quota_deferred(cache_key, priority):
+    """(cache_status, entry) for a call the quota planner deferred"""
+    old = response_cache.get(cache_key)
+    if old is not None:
+        return stale_result(old, on_error=True)
+    wait = quota_planner.retry_after(priority)
+    entry = CacheEntry(429, json.dumps({'error': f'GitHub quota is reserved for higher-priority '
+                                                 f'requests; {priority} calls are deferred',
+                                        'retry_after': wait}).encode(),
+                       {'Content-Type': 'application/json'}, 0)
+    entry.headers['Retry-After'] = str(wait)
+    return 'DEFERRED', entry
+
+def fetch_upstream(github_path, params, cache_key, ttl):
+    """
+    One upstream round-trip for a cache key
+    Returns (cache_status, entry); shared by coalesced callers
+    Bodies over STREAM_THRESHOLD come back as ('STREAM', StreamedBody)
+    """
+    current_token = None
+    headers = {}
+    response = None
+    try:
+        github_url = f'{GITHUB_API}/{github_path}'
         
         # Use token rotation automatically
         headers = get_headers()
         current_token = headers.get('X-Current-Token', 'No token')
         
-        response = requests.get(github_url, headers=headers, params=params, timeout=10)
+        # Revalidate stale entries (304s don't count against the rate limit)
+        stale = response_cache.get(cache_key) if ttl > 0 else None
+        if stale:
+            headers.update(stale.validators())
         
-        # Extract actual token for tracking
-        auth_header = headers.get('Authorization', '')
-        if auth_header.startswith('Bearer '):
-            actual_token = auth_header.replace('Bearer ', '')
-            
-            # Track usage
-            track_token_usage(actual_token, github_path, success=(response.status_code == 200))
-            
-            # Update rate limit
-            update_token_rate_limit(actual_token, response.headers)
+        response = upstream.get(github_url, headers=headers, params=params, stream=True)
+        record_upstream_response(github_path, headers, response.status_code, response.headers,
+                                 response.elapsed.total_seconds())
         
-        # Log request
-        log_request(github_path, current_token, response.status_code)
-        
-        # Update global rate limit tracking
-        if 'X-RateLimit-Remaining' in response.headers:
-            rate_limit_info['remaining'] = int(response.headers['X-RateLimit-Remaining'])
-            rate_limit_info['limit'] = int(response.headers['X-RateLimit-Limit'])
-            rate_limit_info['reset'] = int(response.headers['X-RateLimit-Reset'])
+        if response.status_code == 304 and stale:
+            response.close()
+            entry = response_cache.revalidated(cache_key, response.headers, ttl)
+            return 'REVALIDATED', entry or stale
         
         # Auto-fallback if rate limited
         if response.status_code == 403 and 'rate limit' in response.text.lower():
             print(f"⚠️  Rate limit hit for {current_token}, trying public access...")
             headers = get_headers(use_token=False)
-            response = requests.get(github_url, headers=headers, params=params, timeout=10)
+            response = upstream.get(github_url, headers=headers, params=params, stream=True)
             log_request(github_path, 'Public (no token)', response.status_code)
+            observe_upstream(github_path, 'public', response.status_code, response.elapsed.total_seconds())
         
-        return jsonify(response.json()), response.status_code
+        # Buffer (and cache) small bodies; relay large ones chunk by chunk
+        with span('body'):
+            body = read_or_stream(response)
+        if isinstance(body, StreamedBody):
+            return 'STREAM', body
         
-    except Exception as e:
+        if response.status_code == 200:
+            entry = response_cache.put(cache_key, 200, body, response.headers, ttl)
+            if entry:
+                return 'MISS', entry
+        
+        return 'BYPASS', CacheEntry(response.status_code, body, response.headers, 0)
+        
+    except Exception:
         log_request(github_path, current_token, 500)
+        raise
+    finally:
+        if response is None:
+            release_token(headers)  # Timeout / connection error: no response to observe
+
+def refresh_entry(github_path, params, cache_key, ttl, priority=BACKGROUND):
+    """
+    Refresh one cache key (run off the request thread)
+    Raises UpstreamUnavailable when GitHub is rate limited or erroring
+    """
+    with charged_to(priority):
+        (cache_status, entry), shared = inflight.do(
+            cache_key, lambda: fetch_upstream(github_path, params, cache_key, ttl))
+    if cache_status == 'STREAM':
+        if not shared:
+            entry.close()  # Grew too large to cache - clients fetch it directly
+        return 'STREAM', None
+    if upstream_failed(entry.status, entry.body):
+        raise UpstreamUnavailable(entry.status)
+    return ('COALESCED' if shared else cache_status), entry
+
+def resolve_stale(github_path, params, cache_key, ttl, entry, in_background, priority=INTERACTIVE):
+    """
+    Answer from an expired entry unless a refresh brings a usable response
+    within CACHE_STALE_WAIT (stale-while-revalidate entries don't wait)
+    Returns (cache_status, entry), or None when the caller should fetch normally
+    """
+    # Refreshes nobody waits for are background work
+    priority = BACKGROUND if in_background else priority
+    if not quota_planner.admit(priority):
+        return stale_result(entry, on_error=False)  # Keep the quota for higher-priority calls
+    future = stale_refresh.submit(cache_key, lambda: refresh_entry(github_path, params, cache_key, ttl,
+                                                                   priority))
+    if future is None:
+        return stale_result(entry, on_error=True)  # Recent refresh failed
+    if in_background:
+        return stale_result(entry, on_error=False)
+    try:
+        cache_status, fresh = future.result(response_cache.stale_wait)
+    except FutureTimeout:
+        return stale_result(entry, on_error=False)  # Refresh keeps going
+    except Exception:
+        return stale_result(entry, on_error=True)
+    if fresh is None:
+        return None
+    return cache_status, fresh
+
+def stale_result(entry, on_error):
+    response_cache.served_stale(on_error)
+    return ('STALE-ERROR' if on_error else 'STALE'), entry
+
+def cached_response(entry, cache_status, cache_key=None, fields=None, pin=None):
+    """Build a client response from a cache entry (compressed/projected variant)"""
+    fields = fields if entry.status == 200 else None
+    pin = pin if entry.status == 200 else None
+    etag = project_etag(pin.etag if pin else entry.etag, fields)
+    if entry.status == 200 and etag and request.headers.get('If-None-Match') == etag:
+        resp = Response(status=304)
+    else:
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+        with span('encode'):
+            body, applied = response_cache.variant(cache_key, entry, fields, encoding)
+        resp = Response(body, status=entry.status,
+                        content_type=entry.headers.get('Content-Type', 'application/json'))
+        if applied:
+            resp.headers['Content-Encoding'] = applied
+    for name, value in entry.headers.items():
+        if name != 'Content-Type':
+            resp.headers[name] = value
+    if etag:
+        resp.headers['ETag'] = etag
+    if pin:
+        resp.headers.update(pin.headers())
+    resp.vary.add('Accept-Encoding')
+    resp.headers['X-Cache'] = cache_status
+    resp.headers['Age'] = str(entry.age())
+    if cache_status in STALE_WARNINGS:
+        # Expired entry (Age is already past its TTL)
+        resp.headers['Warning'] = STALE_WARNINGS[cache_status]
+    return resp
+
+def pinned_not_modified(pin, fields):
+    """304 for a revalidation that matches the commit its branch still points at"""
+    ref_pinner.not_modified()
+    resp = Response(status=304)
+    resp.headers['ETag'] = project_etag(pin.etag, fields)
+    resp.headers.update(pin.headers())
+    resp.headers['X-Cache'] = 'HIT'
+    return resp
+
+def streamed_response(body):
+    """Relay a large upstream body without buffering it"""
+    resp = Response(iter(body), status=body.status,
+                    content_type=body.headers.get('Content-Type', 'application/octet-stream'))
+    for name, value in body.headers.items():
+        if name != 'Content-Type':
+            resp.headers[name] = value
+    resp.headers['X-Cache'] = 'STREAM'
+    return resp
+
+@app.route('/api/tree/<owner>/<repo>', methods=['GET'])
+def repo_tree(owner, repo):
+    """
+    Public endpoint - Directory listing from the repository tree index
+    Same JSON shape as /contents, one upstream tree fetch per commit
+    Example: /api/tree/owner/repo?ref=main&prefix=HW/Day 01
+    """
+    ref = request.args.get('ref') or 'HEAD'
+    prefix = request.args.get('prefix', '').strip('/')
+    try:
+        sha, trie, payload = tree_cache.listing(owner, repo, ref, prefix)
+    except TreeLookupError as e:
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    if payload is None:
+        if trie.truncated:
+            # Tree too large for one response - fall back to the contents API
+            return redirect(f'/api/github/repos/{owner}/{repo}/contents/{prefix}?ref={sha}', code=307)
+        return jsonify({'message': 'Not Found'}), 404
+    
+    etag = f'"{sha}:{prefix}"'
+    if request.headers.get('If-None-Match') == etag:
+        resp = Response(status=304)
+    else:
+        resp = jsonify(payload)
+    resp.headers['ETag'] = etag
+    resp.headers['X-Tree-SHA'] = sha
+    return resp
+
+@app.route('/api/raw/<owner>/<repo>/<ref>/<path:file_path>', methods=['GET'])
+def raw_file(owner, repo, ref, file_path):
+    """
+    Public endpoint - Raw repository file served from the blob cache
+    Range requests and strong (blob SHA) ETags supported
+    Example: /api/raw/owner/repo/main/CW/Day 01/part.SLDPRT
+    """
+    try:
+        local_path, blob_sha, pinned = fetch_raw_blob(owner, repo, ref, file_path)
+    except TreeLookupError as e:
+        return jsonify({'error': str(e)}), e.status
+    except BlobIntegrityError as e:
+        return jsonify({'error': str(e)}), 502
+    except Exception as e:
         return jsonify({'error': str(e)}), 500
+    
+    # send_file uses wsgi.file_wrapper (sendfile under gunicorn) and handles Range
+    resp = send_file(local_path, mimetype=guess_mimetype(file_path),
+                     conditional=True, etag=blob_sha, max_age=31536000 if pinned else 60)
+    if pinned:
+        resp.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    resp.headers['X-Blob-SHA'] = blob_sha
+    return resp
+
+@app.route('/api/events', methods=['GET'])
+def change_events():
+    """
+    Public endpoint - Server-Sent Events stream of repository pushes
+    Example: new EventSource(PROXY_URL + '/api/events')
+    """
+    sse_headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    if not GITHUB_WEBHOOK_SECRET:
+        # Nothing will be pushed - tell the client to poll and free the worker
+        return Response(ready_frame(False), mimetype='text/event-stream', headers=sse_headers)
+    sub = Subscription()
+    last_id = parse_last_event_id(request.headers.get('Last-Event-ID') or request.args.get('lastEventId'))
+    if not event_broker.subscribe(sub, last_id):
+        return jsonify({'error': 'Too many event listeners'}), 503, {'Retry-After': '30'}
+    shared_state.start()
+    
+    def stream():
+        try:
+            yield ready_frame(True)
+            while True:
+                event = sub.get(EVENTS_HEARTBEAT)
+                yield format_sse(event) if event else ': keepalive\n\n'
+        finally:
+            event_broker.unsubscribe(sub)
+    
+    return Response(stream(), mimetype='text/event-stream', headers=sse_headers)
+
+@app.route('/api/commit/<owner>/<repo>', methods=['POST'])
+def commit_files(owner, repo):
+    """
+    Public endpoint - commit many files at once with the caller's own token
+    All-or-nothing: the branch only moves after every blob, the tree and
+    the commit exist (see git_commit.py)
+    """
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() not in ('token', 'bearer') or not token.strip():
+        return jsonify({'error': 'Authorization: token <GitHub token with repo scope> required'}), 401
+    # base64 in JSON: about 4/3 of the decoded size
+    if request.content_length and request.content_length > COMMIT_MAX_BYTES * 4 // 3 + 64 * 1024:
+        return jsonify({'error': f'Upload exceeds {COMMIT_MAX_BYTES} bytes'}), 413
+    
+    files = []
+    try:
+        if request.mimetype == 'multipart/form-data':
+            # Hashed and spooled part by part as the body streams in
+            branch, message, files = parse_multipart_commit(
+                request.stream, request.mimetype_params.get('boundary', ''))
+        else:
+            branch, message, files = parse_commit_request(request.get_json(force=True, silent=True))
+        result = committer.commit(owner, repo, branch, message, files, token.strip())
+    except CommitError as e:
+        return jsonify({'error': str(e), 'step': e.step}), e.status
+    except Exception as e:
+        return jsonify({'error': str(e)}), 502
+    finally:
+        for upload in files:
+            upload.close()
+    
+    if result['commit'] is None:
+        return jsonify(result), 200  # Every file already matched the branch head
+    
+    # The blob index follows the commit without refetching the tree
+    tree_cache.advance(owner, repo, branch, result['parent'], result['commit'], result['tree'],
+                       [(f['path'], f['sha'], f['size']) for f in result['files']])
+    # Don't wait for the push webhook: drop the touched listings now
+    event = shared_state.broadcast(push_event({
+        'repository': {'full_name': f'{owner}/{repo}'},
+        'ref': f'refs/heads/{branch}',
+        'before': result['parent'],
+        'after': result['commit'],
+        'commits': [{'added': [f['path'] for f in result['files']]}],
+    }))
+    apply_change_event(event)
+    return jsonify(result), 201
+
+@app.route('/api/webhooks/github', methods=['POST'])
+def github_webhook():
+    """
+    GitHub webhook receiver (push events)
+    Verified with X-Hub-Signature-256 against GITHUB_WEBHOOK_SECRET
+    """
+    if not GITHUB_WEBHOOK_SECRET:
+        return jsonify({'error': 'Webhooks not configured'}), 503
+    body = request.get_data()
+    if not verify_signature(GITHUB_WEBHOOK_SECRET, body, request.headers.get('X-Hub-Signature-256')):
+        return jsonify({'error': 'Invalid signature'}), 401
+    
+    kind = request.headers.get('X-GitHub-Event', '')
+    if kind == 'ping':
+        return jsonify({'status': 'pong'})
+    if kind != 'push':
+        return jsonify({'status': 'ignored', 'event': kind}), 202
+    
+    try:
+        if request.mimetype == 'application/x-www-form-urlencoded':
+            payload = json.loads(request.form.get('payload', ''))
+        else:
+            payload = json.loads(body)
+    except ValueError:
+        return jsonify({'error': 'Invalid JSON payload'}), 400
+    
+    event = shared_state.broadcast(push_event(payload))
+    invalidated = apply_change_event(event)
+    return jsonify({
+        'status': 'ok',
+        'event_id': event['id'],
+        'paths': len(event['paths']),
+        'invalidated': invalidated
+    })
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Prometheus scrape endpoint (this process only)
+    Requires Authorization: Bearer <METRICS_TOKEN> or X-Admin-Password
+    """
+    bearer = request.headers.get('Authorization', '')
+    authorized = (METRICS_TOKEN and bearer == f'Bearer {METRICS_TOKEN}') or \
+        verify_admin(request.headers.get('X-Admin-Password'))
+    if not authorized:
+        abort(401, description='Unauthorized')
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Public health check"""
+    tokens = token_store.tokens()
     return jsonify({
         'status': 'healthy',
-        'tokens_active': len(GITHUB_TOKENS) > 0,
-        'effective_limit': len(GITHUB_TOKENS) * 5000 if GITHUB_TOKENS else 60,
+        'tokens_active': len(tokens) > 0,
+        'effective_limit': len(tokens) * 5000 if tokens else 60,
+        'events': bool(GITHUB_WEBHOOK_SECRET),
         'version': '2.0'
     })
 
@@ -270,11 +1081,18 @@ def index():
         'endpoints': {
             'public': {
                 '/api/github/<path>': 'Proxy GitHub API',
+                'POST /api/github/batch': 'Many paths in one request, streamed back as NDJSON',
+                '/api/tree/<owner>/<repo>?ref=&prefix=': 'Directory listing from cached repo tree',
+                '/api/raw/<owner>/<repo>/<ref>/<path>': 'Raw file from blob cache (Range supported)',
+                '/api/events': 'Server-Sent Events: repository pushes',
+                'POST /api/commit/<owner>/<repo>': 'Many files in one atomic commit (your own token)',
                 '/health': 'Health check'
             },
             'admin': {
                 '/admin/tokens': 'Manage tokens (requires auth)',
-                '/admin/stats': 'View statistics (requires auth)'
+                '/admin/stats': 'View statistics (requires auth)',
+                '/admin/profile?seconds=N': 'Sampling profile of this worker (requires auth)',
+                '/metrics': 'Prometheus metrics (requires auth)'
             }
         }
     })
@@ -294,15 +1112,14 @@ def manage_tokens():
     if not auth_header or not verify_admin(auth_header):
         abort(401, description='Unauthorized - Invalid admin password')
     
-    global token_pool, GITHUB_TOKENS
-    
     if request.method == 'GET':
         # Return masked tokens (for security)
-        masked = [f"{t[:8]}...{t[-4:]}" if len(t) > 12 else "***" for t in GITHUB_TOKENS]
+        tokens = token_store.tokens()
+        masked = [f"{t[:8]}...{t[-4:]}" if len(t) > 12 else "***" for t in tokens]
         return jsonify({
-            'count': len(GITHUB_TOKENS),
+            'count': len(tokens),
             'tokens': masked,
-            'effective_limit': len(GITHUB_TOKENS) * 5000
+            'effective_limit': len(tokens) * 5000
         })
     
     elif request.method == 'POST':
@@ -319,30 +1136,19 @@ def manage_tokens():
         if not valid_tokens:
             return jsonify({'error': 'No valid tokens provided'}), 400
         
-        # Merge with existing (avoid duplicates)
-        GITHUB_TOKENS.extend([t for t in valid_tokens if t not in GITHUB_TOKENS])
-        
-        # Save encrypted
-        encrypted_data = encrypt_tokens(GITHUB_TOKENS)
-        with open(TOKENS_FILE, 'w') as f:
-            f.write(encrypted_data)
-        
-        # Reinitialize token pool and stats
-        token_pool = cycle(GITHUB_TOKENS)
-        initialize_token_stats()
+        # Merge with existing (avoid duplicates), save encrypted and
+        # initialize stats for new tokens (the scheduler reads them directly)
+        token_store.add(valid_tokens)
         
         return jsonify({
             'success': True,
-            'total_tokens': len(GITHUB_TOKENS),
+            'total_tokens': len(token_store.tokens()),
             'new_tokens_added': len(valid_tokens)
         })
     
     elif request.method == 'DELETE':
         # Clear all tokens
-        GITHUB_TOKENS.clear()
-        if os.path.exists(TOKENS_FILE):
-            os.remove(TOKENS_FILE)
-        token_pool = None
+        token_store.clear()
         
         return jsonify({'success': True, 'message': 'All tokens cleared'})
 
@@ -356,6 +1162,8 @@ def admin_stats():
     if not auth_header or not verify_admin(auth_header):
         abort(401, description='Unauthorized')
     
+    tokens = token_store.tokens()  # Also sets up token_usage_stats on first use
+    
     # Calculate total requests
     total_requests = sum(stats['usage_count'] for stats in token_usage_stats.values())
     total_success = sum(stats['success_count'] for stats in token_usage_stats.values())
@@ -368,8 +1176,8 @@ def admin_stats():
     
     return jsonify({
         'tokens': {
-            'count': len(GITHUB_TOKENS),
-            'effective_limit': len(GITHUB_TOKENS) * 5000,
+            'count': len(tokens),
+            'effective_limit': len(tokens) * 5000,
             'per_token_limit': 5000,
             'active': len(active_tokens),
             'rate_limited': len(rate_limited_tokens),
@@ -380,7 +1188,26 @@ def admin_stats():
         'total_requests': total_requests,
         'success_count': total_success,
         'error_count': total_errors,
-        'recent_requests': request_log[-20:]  # Last 20 requests
+        'cache': response_cache.stats(),
+        'disk_cache': response_cache.disk.stats() if response_cache.disk else None,
+        'stale_refresh': stale_refresh.stats(),
+        'batch': batch_pool.stats(),
+        'admission': admission.stats(),
+        'quota': quota_planner.stats(),
+        'commits': committer.stats(),
+        'upstream': upstream.stats(),
+        'coalescing': inflight.stats(),
+        'scheduler': token_scheduler.snapshot(),
+        'shared_state': shared_state.info(),
+        'tree_index': tree_cache.stats(),
+        'ref_pinning': ref_pinner.stats(),
+        'blob_cache': blob_store.stats(),
+        'events': event_broker.stats(),
+        'request_log': request_log.stats(),
+        'tracing': tracer.stats(),
+        'token_store': token_store.stats(),
+        'prefetch': prefetcher.stats(),
+        'recent_requests': shared_state.recent_requests(20)  # Last 20 requests
     })
 
 @app.route('/admin/token-details', methods=['GET'])
@@ -393,6 +1220,8 @@ def token_details():
     if not auth_header or not verify_admin(auth_header):
         abort(401, description='Unauthorized')
     
+    token_store.tokens()  # Sets up token_usage_stats on first use
+    
     # Prepare detailed stats (remove full token for security)
     detailed_stats = []
     for token_id, stats in token_usage_stats.items():
@@ -422,6 +1251,41 @@ def token_details():
         'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
     })
 
+@app.route('/admin/profile', methods=['GET'])
+def admin_profile():
+    """
+    Admin endpoint - Sample this worker's threads for ?seconds=N
+    Returns collapsed stacks (flamegraph.pl / speedscope) or ?format=json
+    Example: /admin/profile?seconds=10&interval=0.005&idle=0
+    """
+    auth_header = request.headers.get('X-Admin-Password')
+    if not auth_header or not verify_admin(auth_header):
+        abort(401, description='Unauthorized')
+    
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = min(max(float(request.args.get('interval', 0.005)), 0.001), 1.0)
+    except ValueError:
+        return jsonify({'error': 'seconds and interval must be numbers'}), 400
+    
+    try:
+        profile = profiler.capture(seconds, interval, include_idle=request.args.get('idle') == '1')
+    except ProfilerBusy as e:
+        return jsonify({'error': str(e)}), 409
+    
+    if request.args.get('format') == 'json':
+        summary = {k: v for k, v in profile.items() if k != 'stacks'}
+        summary['pid'] = os.getpid()
+        summary['top'] = top_functions(profile)
+        if not profile['threads']:
+            summary['note'] = 'No other threads in this worker - run with --threads or PROXY_ENGINE=async'
+        return jsonify(summary)
+    
+    resp = Response(collapsed(profile), content_type='text/plain; charset=utf-8')
+    resp.headers['X-Profile-Samples'] = str(profile['samples'])
+    resp.headers['X-Profile-PID'] = str(os.getpid())
+    return resp
+
 @app.route('/admin/test', methods=['GET'])
 def admin_test():
     """Test admin authentication"""
@@ -444,19 +1308,31 @@ def not_found(e):
 def server_error(e):
     return jsonify({'error': 'Server error', 'message': str(e)}), 500
 
-if __name__ == '__main__':
+def main():
+    """Run the server (python main.py / python secure-proxy-server.py)"""
     print("\n" + "="*70)
     print("🔐 SECURE GitHub API Proxy Server")
     print("="*70)
     print(f"📡 Host: {HOST}")
     print(f"📡 Port: {PORT}")
-    print(f"🔑 Tokens Loaded: {len(GITHUB_TOKENS)}")
-    print(f"⚡ Effective Rate Limit: {len(GITHUB_TOKENS) * 5000 if GITHUB_TOKENS else 60} req/hour")
+    print(f"🔑 Tokens: {token_store.path} (decrypted on first use)")
+    print("⚡ Effective Rate Limit: 5000 req/hour per token (60 without)")
     print(f"🌐 CORS Origins: {', '.join(ALLOWED_ORIGINS)}")
     print(f"🔒 Admin Endpoints Protected: YES")
+    print(f"⚙️  Engine: {PROXY_ENGINE}")
+    print(f"🔥 Prefetch: {', '.join(t.name for t in prefetcher.targets) or 'off (set PREFETCH_PATHS)'}")
+    client_limit = (f"{admission.ip_buckets.rate:g} req/s per client" if admission.ip_buckets.enabled
+                    else "no per-client limit")
+    print(f"🚦 Admission: {client_limit}, {admission.gate.max_active or 'unlimited'} in flight per worker")
     print("="*70)
     print("\n📌 Public Endpoints:")
     print("   GET  /api/github/<path>  - Proxy GitHub API")
+    print(f"   POST /api/github/batch   - Up to {BATCH_MAX_PATHS} paths, streamed back as NDJSON")
+    print("   GET  /api/tree/<owner>/<repo>?ref=&prefix= - Listing from cached repo tree")
+    print("   GET  /api/raw/<owner>/<repo>/<ref>/<path> - Raw file from blob cache")
+    print("   GET  /api/events         - Push notifications (Server-Sent Events)")
+    print("   POST /api/commit/<owner>/<repo> - Atomic multi-file upload (caller's token)")
+    print(f"   POST /api/webhooks/github - GitHub push webhook ({'enabled' if GITHUB_WEBHOOK_SECRET else 'disabled: set GITHUB_WEBHOOK_SECRET'})")
     print("   GET  /health             - Health check")
     print("\n🔐 Admin Endpoints (require X-Admin-Password header):")
     print("   GET    /admin/tokens - View tokens")
@@ -464,7 +1340,18 @@ if __name__ == '__main__':
     print("   DELETE /admin/tokens - Clear tokens")
     print("   GET    /admin/stats  - View statistics")
     print("   GET    /admin/token-details - Detailed token analytics")
+    print("   GET    /admin/profile?seconds=N - Sampling profile (collapsed stacks)")
+    print("   GET    /metrics      - Prometheus metrics (or Bearer METRICS_TOKEN)")
     print("="*70 + "\n")
     
+    prefetcher.start()
+    
     # Use HOST from config (0.0.0.0 for production, 127.0.0.1 for local)
-    app.run(host=HOST, port=PORT, debug=False)
+    if PROXY_ENGINE == 'async':
+        import async_engine
+        async_engine.run(sys.modules[__name__], HOST, PORT)
+    else:
+        app.run(host=HOST, port=PORT, debug=False)
+
+if __name__ == '__main__':
+    main()
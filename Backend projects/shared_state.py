@@ -0,0 +1,417 @@
+"""
+Shared State Backends for Token Stats and Rate Limits
+=====================================================
+token_usage_stats, rate_limit_info and request_log live in each worker's
+memory. With `gunicorn --workers 2` every worker only sees its own half
+of the traffic, and the token schedulers can't see each other's
+exhaustion. A state backend merges them. It also carries change events
+(webhook pushes) to every worker, so each one can invalidate its caches
+and notify its own SSE clients, and hourly call budgets (prefetch) that
+every worker spends from.
+
+Backends:
+- InProcessState (default): per-process state, nothing shared
+- SQLiteState: one local SQLite file (WAL mode) shared by all workers
+
+The hot path never touches SQLite: updates are appended to a small
+per-process buffer, and a background thread in each worker flushes the
+buffer with atomic `count = count + ?` upserts, then pulls the merged
+totals back into the local dicts every SHARED_STATE_SYNC seconds.
+Budget calls are the exception: they are written immediately, and only
+background threads make them.
+
+Environment Variables:
+    SHARED_STATE_PATH=/tmp/proxy-state.db   # Enables SQLiteState
+    SHARED_STATE_SYNC=1.0                   # Flush/merge interval (seconds)
+    SHARED_STATE_LOG_ROWS=1000              # Request log rows kept in SQLite
+"""
+
+import os
+import json
+import time
+import itertools
+import sqlite3
+import threading
+from collections import defaultdict
+
+
+class InProcessState:
+    """Default backend - every worker keeps its own state"""
+
+    name = 'in-process'
+    workers_merged = False
+
+    def attach(self, token_usage_stats, rate_limit_info, request_log):
+        self.request_log = request_log
+        self._event_ids = itertools.count(1)
+
+    def attach_events(self, on_event):
+        pass  # No other workers to hear from
+
+    def start(self):
+        pass
+
+    def broadcast(self, event):
+        """Assign an event id; the caller applies the event locally"""
+        event['id'] = next(self._event_ids)
+        return event
+
+    def record_usage(self, token_id, endpoint, success, when):
+        pass
+
+    def record_rate_limit(self, token_id, rate, status):
+        pass
+
+    def record_global_rate_limit(self, rate):
+        pass
+
+    def record_request(self, record):
+        pass
+
+    def recent_requests(self, n):
+        return self.request_log.recent(n)
+
+    def info(self):
+        return {'backend': self.name, 'workers_merged': self.workers_merged}
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS token_stats (
+    token_id TEXT PRIMARY KEY,
+    usage_count INTEGER NOT NULL DEFAULT 0,
+    success_count INTEGER NOT NULL DEFAULT 0,
+    error_count INTEGER NOT NULL DEFAULT 0,
+    last_used REAL,
+    remaining INTEGER,
+    rate_limit INTEGER,
+    reset INTEGER,
+    status TEXT,
+    observed_at REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS token_endpoints (
+    token_id TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (token_id, endpoint)
+);
+CREATE TABLE IF NOT EXISTS global_rate_limit (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    remaining INTEGER,
+    rate_limit INTEGER,
+    reset REAL,
+    observed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    pid INTEGER,
+    body TEXT,
+    created REAL
+);
+CREATE TABLE IF NOT EXISTS budget_calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    budget TEXT NOT NULL,
+    at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS budget_calls_at ON budget_calls (budget, at);
+CREATE TABLE IF NOT EXISTS request_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp REAL,
+    endpoint TEXT,
+    token TEXT,
+    status INTEGER,
+    pid INTEGER
+);
+"""
+
+
+class SQLiteState:
+    """Multi-process backend: buffered local deltas merged through SQLite"""
+
+    name = 'sqlite'
+    workers_merged = True
+
+    def __init__(self, path, sync_interval=1.0, log_rows=1000):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.log_rows = log_rows
+        self._buffer_lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._reset_buffers()
+        self._conn = None
+        self._pid = None
+        self._last_event_id = 0
+        self.on_event = None
+        self.syncs = 0
+        self.last_sync = None
+
+    def _reset_buffers(self):
+        self._usage = defaultdict(lambda: [0, 0, 0, 0.0])  # usage, success, error, last_used
+        self._endpoints = defaultdict(int)
+        self._rates = {}
+        self._global_rate = None
+        self._requests = []
+
+    # ---- hot path: buffer only ----
+
+    def attach(self, token_usage_stats, rate_limit_info, request_log):
+        self.token_usage_stats = token_usage_stats
+        self.rate_limit_info = rate_limit_info
+        self.request_log = request_log
+
+    def attach_events(self, on_event):
+        """on_event(event) runs for events broadcast by other workers"""
+        self.on_event = on_event
+
+    def record_usage(self, token_id, endpoint, success, when):
+        self._ensure_started()
+        with self._buffer_lock:
+            usage = self._usage[token_id]
+            usage[0] += 1
+            usage[1 if success else 2] += 1
+            usage[3] = max(usage[3], when)
+            self._endpoints[(token_id, endpoint)] += 1
+
+    def record_rate_limit(self, token_id, rate, status):
+        self._ensure_started()
+        with self._buffer_lock:
+            self._rates[token_id] = (rate.get('remaining'), rate.get('limit'),
+                                     rate.get('reset'), status, time.time())
+
+    def record_global_rate_limit(self, rate):
+        self._ensure_started()
+        with self._buffer_lock:
+            self._global_rate = (rate['remaining'], rate['limit'], rate['reset'], time.time())
+
+    def record_request(self, record):
+        self._ensure_started()
+        with self._buffer_lock:
+            self._requests.append(record)
+
+    def broadcast(self, event):
+        """Publish an event to the other workers (written immediately)"""
+        self._ensure_started()
+        with self._db_lock:
+            cursor = self._conn.execute('INSERT INTO events (pid, body, created) VALUES (?, ?, ?)',
+                                        (os.getpid(), json.dumps(event), time.time()))
+            event['id'] = cursor.lastrowid
+            self._conn.execute('DELETE FROM events WHERE id <= ?', (event['id'] - 100,))
+        return event
+
+    # ---- call budgets: written immediately ----
+
+    def take_call(self, budget, limit, window=3600):
+        """Reserve one of `limit` calls per rolling `window` seconds across workers; a ticket or None"""
+        self._ensure_started()
+        now = time.time()
+        with self._db_lock:
+            conn = self._conn
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('DELETE FROM budget_calls WHERE budget = ? AND at <= ?', (budget, now - window))
+                used = conn.execute('SELECT COUNT(*) FROM budget_calls WHERE budget = ?',
+                                    (budget,)).fetchone()[0]
+                ticket = None
+                if used < limit:
+                    ticket = conn.execute('INSERT INTO budget_calls (budget, at) VALUES (?, ?)',
+                                          (budget, now)).lastrowid
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return ticket
+
+    def refund_call(self, ticket):
+        """Give back a reserved call that turned out to be free"""
+        self._ensure_started()
+        with self._db_lock:
+            self._conn.execute('DELETE FROM budget_calls WHERE id = ?', (ticket,))
+
+    def calls_used(self, budget, window=3600):
+        self._ensure_started()
+        with self._db_lock:
+            return self._conn.execute('SELECT COUNT(*) FROM budget_calls WHERE budget = ? AND at > ?',
+                                      (budget, time.time() - window)).fetchone()[0]
+
+    # ---- background sync ----
+
+    def start(self):
+        """Start this worker's sync thread even before it has traffic"""
+        self._ensure_started()
+
+    def _ensure_started(self):
+        # Lazily start per process (gunicorn may fork after import)
+        if self._pid == os.getpid():
+            return
+        with self._db_lock:
+            if self._pid == os.getpid():
+                return
+            self._conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False,
+                                         isolation_level=None)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(SCHEMA)
+            # Only events published after this worker started are replayed
+            self._last_event_id = self._conn.execute(
+                'SELECT COALESCE(MAX(id), 0) FROM events').fetchone()[0]
+            self._pid = os.getpid()
+            threading.Thread(target=self._sync_loop, name='shared-state-sync',
+                             daemon=True).start()
+
+    def _sync_loop(self):
+        while True:
+            time.sleep(self.sync_interval)
+            try:
+                self.sync()
+            except sqlite3.Error as e:
+                print(f"⚠️  Shared state sync failed: {e}")
+
+    def sync(self):
+        """Flush this worker's deltas, then merge every worker's totals"""
+        with self._buffer_lock:
+            usage, endpoints = self._usage, self._endpoints
+            rates, global_rate, requests_ = self._rates, self._global_rate, self._requests
+            self._reset_buffers()
+
+        with self._db_lock:
+            conn = self._conn
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._flush(conn, usage, endpoints, rates, global_rate, requests_)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            self._merge(conn)
+            events = self._pull_events(conn)
+        self.syncs += 1
+        self.last_sync = time.time()
+
+        for event in events:
+            try:
+                self.on_event(event)
+            except Exception as e:
+                print(f"⚠️  Shared event {event['id']} failed: {e}")
+
+    def _flush(self, conn, usage, endpoints, rates, global_rate, requests_):
+        conn.executemany("""
+            INSERT INTO token_stats (token_id, usage_count, success_count, error_count, last_used)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(token_id) DO UPDATE SET
+                usage_count = usage_count + excluded.usage_count,
+                success_count = success_count + excluded.success_count,
+                error_count = error_count + excluded.error_count,
+                last_used = MAX(COALESCE(last_used, 0), excluded.last_used)
+        """, [(tid, u[0], u[1], u[2], u[3]) for tid, u in usage.items()])
+        conn.executemany("""
+            INSERT INTO token_endpoints (token_id, endpoint, count) VALUES (?, ?, ?)
+            ON CONFLICT(token_id, endpoint) DO UPDATE SET count = count + excluded.count
+        """, [(tid, ep, n) for (tid, ep), n in endpoints.items()])
+        # Newest observation wins for rate limits
+        conn.executemany("""
+            INSERT INTO token_stats (token_id, remaining, rate_limit, reset, status, observed_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(token_id) DO UPDATE SET
+                remaining = excluded.remaining, rate_limit = excluded.rate_limit,
+                reset = excluded.reset, status = excluded.status,
+                observed_at = excluded.observed_at
+            WHERE excluded.observed_at > token_stats.observed_at
+        """, [(tid,) + r for tid, r in rates.items()])
+        if global_rate:
+            conn.execute("""
+                INSERT INTO global_rate_limit (id, remaining, rate_limit, reset, observed_at)
+                VALUES (1, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    remaining = excluded.remaining, rate_limit = excluded.rate_limit,
+                    reset = excluded.reset, observed_at = excluded.observed_at
+                WHERE excluded.observed_at > global_rate_limit.observed_at
+            """, global_rate)
+        if requests_:
+            pid = os.getpid()
+            conn.executemany(
+                'INSERT INTO request_log (timestamp, endpoint, token, status, pid) VALUES (?, ?, ?, ?, ?)',
+                [(r.timestamp, r.endpoint, r.token, r.status, pid) for r in requests_])
+            conn.execute('DELETE FROM request_log WHERE id <= (SELECT MAX(id) FROM request_log) - ?',
+                         (self.log_rows,))
+
+    def _merge(self, conn):
+        """Overwrite the local views with cluster-wide totals"""
+        with self._buffer_lock:
+            pending = {tid: list(u) for tid, u in self._usage.items()}
+        for row in conn.execute('SELECT token_id, usage_count, success_count, error_count, last_used, '
+                                'remaining, rate_limit, reset, status FROM token_stats'):
+            stats = self.token_usage_stats.get(row[0])
+            if stats is None:
+                continue
+            extra = pending.get(row[0], [0, 0, 0, 0.0])
+            stats['usage_count'] = row[1] + extra[0]
+            stats['success_count'] = row[2] + extra[1]
+            stats['error_count'] = row[3] + extra[2]
+            if row[4]:
+                stats['last_used'] = max(row[4], stats['last_used'] or 0)
+            if row[8] is not None:
+                stats['rate_limit'] = {'remaining': row[5], 'limit': row[6], 'reset': row[7]}
+                stats['status'] = row[8]
+
+        endpoints = defaultdict(dict)
+        for token_id, endpoint, count in conn.execute(
+                'SELECT token_id, endpoint, count FROM token_endpoints'):
+            endpoints[token_id][endpoint] = count
+        for token_id, used in endpoints.items():
+            if token_id in self.token_usage_stats:
+                self.token_usage_stats[token_id]['endpoints_used'] = used
+
+        row = conn.execute('SELECT remaining, rate_limit, reset FROM global_rate_limit WHERE id = 1').fetchone()
+        if row:
+            self.rate_limit_info.update({'remaining': row[0], 'limit': row[1], 'reset': row[2]})
+
+    def _pull_events(self, conn):
+        """Events other workers published since the last sync"""
+        rows = conn.execute('SELECT id, pid, body FROM events WHERE id > ? ORDER BY id',
+                            (self._last_event_id,)).fetchall()
+        if rows:
+            self._last_event_id = rows[-1][0]
+        if self.on_event is None:
+            return []
+        events = []
+        for event_id, pid, body in rows:
+            if pid != os.getpid():
+                event = json.loads(body)
+                event['id'] = event_id
+                events.append(event)
+        return events
+
+    def recent_requests(self, n):
+        self._ensure_started()
+        with self._db_lock:
+            rows = self._conn.execute(
+                'SELECT timestamp, endpoint, token, status, pid FROM request_log '
+                'ORDER BY id DESC LIMIT ?', (n,)).fetchall()
+        return [{
+            'timestamp': ts,
+            'endpoint': endpoint,
+            'token': token,
+            'status': status,
+            'worker': pid,
+            'time_str': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts)),
+        } for ts, endpoint, token, status, pid in reversed(rows)]
+
+    def info(self):
+        return {
+            'backend': self.name,
+            'workers_merged': self.workers_merged,
+            'path': self.path,
+            'syncs': self.syncs,
+            'last_sync_age': round(time.time() - self.last_sync, 2) if self.last_sync else None,
+        }
+
+
+def state_from_env():
+    """InProcessState, or SQLiteState when SHARED_STATE_PATH is set"""
+    path = os.getenv('SHARED_STATE_PATH')
+    if not path:
+        return InProcessState()
+    return SQLiteState(
+        path,
+        sync_interval=float(os.getenv('SHARED_STATE_SYNC', 1.0)),
+        log_rows=int(os.getenv('SHARED_STATE_LOG_ROWS', 1000)),
+    )
@@ -0,0 +1,240 @@
+"""
+Request Coalescing (Single-Flight)
+==================================
+Identical concurrent proxy requests share one upstream call: the first
+caller for a key goes upstream, everyone else arriving while it is in
+flight waits for and shares its result - including its exception.
+
+Features:
+- SingleFlight: threads within one process
+- AsyncSingleFlight: coroutines on one event loop (async engine)
+- FileFlight: optional cross-worker coalescing with flock'ed lock files
+  in a local directory (Linux/macOS), layered on top of SingleFlight
+
+Environment Variables:
+    COALESCE_LOCK_DIR=/tmp/proxy-flight   # Enables cross-worker coalescing
+    COALESCE_WAIT=15                      # Max seconds a follower waits
+"""
+
+import os
+import json
+import time
+import struct
+import asyncio
+import hashlib
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: cross-worker coalescing unavailable
+    fcntl = None
+
+
+class CoalescedError(Exception):
+    """Upstream failure reported by another worker's leader call"""
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error', 'followers')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Deduplicate concurrent calls per key within a process"""
+
+    def __init__(self, wait_timeout=15):
+        self.wait_timeout = wait_timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.counters = {'leaders': 0, 'shared': 0, 'timeouts': 0}
+
+    def do(self, key, fn):
+        """Run fn once per key; returns (result, shared)"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+                self.counters['leaders'] += 1
+            else:
+                call.followers += 1
+                leader = False
+
+        if not leader:
+            if not call.event.wait(self.wait_timeout):
+                # Leader is stuck; don't hold this caller hostage
+                with self._lock:
+                    self.counters['timeouts'] += 1
+                return fn(), False
+            with self._lock:
+                self.counters['shared'] += 1
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, in_flight=len(self._calls))
+
+
+class AsyncSingleFlight:
+    """Deduplicate concurrent coroutine calls per key on one event loop"""
+
+    def __init__(self):
+        self._futures = {}
+        self.counters = {'leaders': 0, 'shared': 0}
+
+    async def do(self, key, coro_fn):
+        """Await coro_fn once per key; returns (result, shared)"""
+        future = self._futures.get(key)
+        if future is not None:
+            self.counters['shared'] += 1
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._futures[key] = future
+        self.counters['leaders'] += 1
+        try:
+            result = await coro_fn()
+            future.set_result(result)
+            return result, False
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unshared failure doesn't log a warning
+            future.exception()
+            raise
+        finally:
+            self._futures.pop(key, None)
+
+    def stats(self):
+        return dict(self.counters, in_flight=len(self._futures))
+
+
+class FileFlight:
+    """
+    Cross-worker single-flight using flock'ed files in a shared directory.
+
+    The leader holds an exclusive lock on <dir>/<hash>.lock while it calls
+    upstream, then publishes the result to <hash>.result. Followers in other
+    workers block on the lock and read the published result when it is
+    newer than the moment they started waiting. Results are serialized with
+    encode(key, result) -> (meta, body) and decode(meta, body) callables
+    supplied by the caller; encode may return None for results that can't
+    be shared (followers then make their own call).
+    """
+
+    def __init__(self, lock_dir, encode, decode, wait_timeout=15):
+        os.makedirs(lock_dir, exist_ok=True)
+        self.lock_dir = lock_dir
+        self.encode = encode
+        self.decode = decode
+        self.wait_timeout = wait_timeout
+        self.local = SingleFlight(wait_timeout)
+        self.counters = {'leaders': 0, 'shared': 0, 'timeouts': 0}
+        self._lock = threading.Lock()
+
+    def _paths(self, key):
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        base = os.path.join(self.lock_dir, digest)
+        return base + '.lock', base + '.result'
+
+    def do(self, key, fn):
+        """Coalesce within this process first, then across workers"""
+        return self.local.do(key, lambda: self._across_workers(key, fn))
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _across_workers(self, key, fn):
+        lock_path, result_path = self._paths(key)
+        started = time.time()
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Another worker is the leader - wait for it to publish
+                if self._wait_for_lock(fd):
+                    published = self._read_result(result_path, started)
+                    if published is not None:
+                        self._count('shared')
+                        return published
+                else:
+                    self._count('timeouts')
+                    return fn()
+
+            self._count('leaders')
+            try:
+                result = fn()
+            except Exception as e:
+                self._write(result_path, {'error': str(e)}, b'')
+                raise
+            encoded = self.encode(key, result)
+            if encoded is not None:
+                self._write(result_path, *encoded)
+            return result
+        finally:
+            os.close(fd)  # releases the flock
+
+    def _wait_for_lock(self, fd):
+        deadline = time.time() + self.wait_timeout
+        while time.time() < deadline:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                time.sleep(0.01)
+        return False
+
+    def _write(self, path, meta, body):
+        meta_bytes = json.dumps(meta).encode()
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(struct.pack('>I', len(meta_bytes)))
+            f.write(meta_bytes)
+            f.write(body)
+        os.replace(tmp, path)
+
+    def _read_result(self, path, since):
+        try:
+            if os.path.getmtime(path) < since:
+                return None
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        (meta_len,) = struct.unpack('>I', data[:4])
+        meta = json.loads(data[4:4 + meta_len])
+        if 'error' in meta:
+            raise CoalescedError(meta['error'])
+        return self.decode(meta, data[4 + meta_len:])
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, local=self.local.stats(), lock_dir=self.lock_dir)
+
+
+def flight_from_env(encode=None, decode=None):
+    """SingleFlight, or FileFlight when COALESCE_LOCK_DIR is set (and supported)"""
+    wait = float(os.getenv('COALESCE_WAIT', 15))
+    lock_dir = os.getenv('COALESCE_LOCK_DIR')
+    if lock_dir and fcntl is not None and encode and decode:
+        return FileFlight(lock_dir, encode, decode, wait)
+    return SingleFlight(wait)
@@ -1,3 +1,3 @@
 #!/bin/bash
 # Railway start script
-python secure-proxy-server.py
+python main.py
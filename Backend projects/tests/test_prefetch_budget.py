@@ -0,0 +1,50 @@
+"""
+PREFETCH_BUDGET is one hourly budget for the whole server, whether the
+workers share it through SQLite or split it between them.
+
+    cd "Backend projects" && python -m pytest tests
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prefetch import CallBudget, SharedCallBudget, call_budget
+from shared_state import InProcessState, SQLiteState
+
+
+class CallBudgetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'state.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_workers_spend_one_shared_budget(self):
+        workers = [call_budget(5, SQLiteState(self.path)) for _ in range(2)]
+        self.assertIsInstance(workers[0], SharedCallBudget)
+        taken = [budget.take() for _ in range(4) for budget in workers]
+        self.assertEqual(taken.count(True), 5)
+        self.assertEqual(workers[1].used(), 5)
+
+    def test_refund_gives_the_call_back(self):
+        first, second = (call_budget(1, SQLiteState(self.path)) for _ in range(2))
+        self.assertTrue(first.take())
+        self.assertFalse(second.take())
+        first.refund()
+        self.assertTrue(second.take())
+
+    def test_split_between_workers_without_shared_state(self):
+        budget = call_budget(300, InProcessState(), workers=2)
+        self.assertIsInstance(budget, CallBudget)
+        self.assertEqual(budget.per_hour, 150)
+
+
+if __name__ == '__main__':
+    unittest.main()
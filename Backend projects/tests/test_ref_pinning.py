@@ -0,0 +1,99 @@
+"""
+Branch contents requests pinned to a commit SHA keep being served from
+the SHA-keyed entry when the ref lookup fails.
+
+    cd "Backend projects" && python -m pytest tests
+"""
+
+import os
+import sys
+import datetime
+import importlib
+import unittest
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+proxy = importlib.import_module('secure-proxy-server')
+
+SHA = 'a' * 40
+RATE_LIMITED = b'{"message":"API rate limit exceeded"}'
+
+
+def fake_response(status, body, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response._content = body
+    response._content_consumed = True
+    response.headers = CaseInsensitiveDict(headers or {})
+    response.elapsed = datetime.timedelta(0)
+    return response
+
+
+class FakeUpstream:
+    """Answers commits/<ref> and contents calls like GitHub, until told to fail"""
+
+    def __init__(self):
+        self.failure = None       # Response to answer with, or exception to raise
+        self.calls = []
+
+    def get(self, url, headers=None, params=None, stream=False):
+        self.calls.append((url, dict(params or {})))
+        if isinstance(self.failure, Exception):
+            raise self.failure
+        if self.failure is not None:
+            return self.failure
+        if '/commits/' in url:
+            return fake_response(200, SHA.encode(), {'ETag': '"ref-etag"'})
+        return fake_response(200, b'[{"name": "README.md"}]', {'Content-Type': 'application/json'})
+
+
+class PinnedStaleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.upstream = FakeUpstream()
+        self.real_upstream, proxy.upstream = proxy.upstream, self.upstream
+        self.client = proxy.app.test_client()
+        self.url = f'/api/github/repos/octo/{self.id().rsplit(".", 1)[-1]}/contents/docs'
+
+    def tearDown(self):
+        proxy.upstream = self.real_upstream
+
+    def expire_refs(self):
+        with proxy.tree_cache._lock:
+            for known in proxy.tree_cache._refs.values():
+                known[2] -= proxy.tree_cache.ref_ttl
+
+    def assert_served_from_sha_entry(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-Cache'], 'HIT')
+        self.assertEqual(response.headers['X-Commit-SHA'], SHA)
+        self.assertEqual(response.get_json(), [{'name': 'README.md'}])
+
+    def test_rate_limited_ref_lookup(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.headers['X-Commit-SHA'], SHA)
+        self.assertEqual(self.upstream.calls[-1][1], {'ref': SHA})
+
+        self.upstream.failure = fake_response(403, RATE_LIMITED, {'Content-Type': 'application/json'})
+        self.expire_refs()
+        self.assert_served_from_sha_entry()
+
+    def test_unreachable_ref_lookup(self):
+        self.client.get(self.url)
+
+        self.upstream.failure = requests.ConnectionError('GitHub unreachable')
+        self.expire_refs()
+        self.assert_served_from_sha_entry()
+
+    def test_unresolvable_ref_is_not_pinned(self):
+        self.upstream.failure = requests.ConnectionError('GitHub unreachable')
+        self.assertIsNone(proxy.ref_pinner.pin('repos/octo/unknown/contents/docs', {}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+"""
+Tree indexes are kept per commit SHA: requests alternating between
+commits don't refetch each other's trees.
+
+    cd "Backend projects" && python -m pytest tests
+"""
+
+import os
+import sys
+import json
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tree_index import TreeIndexCache  # noqa: E402
+
+OLD, NEW = 'a' * 40, 'b' * 40
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.headers = {}
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+def fake_tree(sha, paths):
+    return {'sha': sha, 'truncated': False,
+            'tree': [{'path': path, 'type': 'blob', 'sha': f'{sha[:8]}{i}', 'size': 1}
+                     for i, path in enumerate(paths)]}
+
+
+class TreeIndexCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.trees = {OLD: fake_tree(OLD, ['a.txt', 'b.txt']), NEW: fake_tree(NEW, ['a.txt'])}
+        self.fetched = []
+
+    def github_get(self, path, params, headers):
+        sha = path.rsplit('/', 1)[-1]
+        self.fetched.append(sha)
+        return FakeResponse(200, json.loads(json.dumps(self.trees[sha])))
+
+    def test_alternating_commits_fetch_each_tree_once(self):
+        cache = TreeIndexCache(self.github_get, 'https://api.github.com')
+        for _ in range(3):
+            self.assertIsNotNone(cache.tree('octo', 'repo', OLD).find('b.txt'))
+            self.assertIsNone(cache.tree('octo', 'repo', NEW).find('b.txt'))
+        self.assertEqual(self.fetched, [OLD, NEW])
+        self.assertEqual(cache.counters['tree_hits'], 4)
+
+    def test_lru_bounded_by_total_paths(self):
+        cache = TreeIndexCache(self.github_get, 'https://api.github.com', max_nodes=2)
+        cache.tree('octo', 'repo', OLD)
+        cache.tree('octo', 'repo', NEW)     # 3 paths > 2: OLD is evicted
+        cache.tree('octo', 'repo', NEW)
+        cache.tree('octo', 'repo', OLD)
+        self.assertEqual(self.fetched, [OLD, NEW, OLD])
+        self.assertEqual(cache.counters['evicted'], 2)
+
+    def test_advance_adds_the_child_commit(self):
+        cache = TreeIndexCache(self.github_get, 'https://api.github.com')
+        cache.tree('octo', 'repo', OLD)
+        child = 'c' * 40
+        self.assertTrue(cache.advance('octo', 'repo', 'main', OLD, child, 'd' * 40,
+                                      [('new.txt', 'e' * 40, 3)]))
+        self.assertIsNotNone(cache.tree('octo', 'repo', child).find('new.txt'))
+        self.assertIsNone(cache.tree('octo', 'repo', OLD).find('new.txt'))
+        self.assertEqual(self.fetched, [OLD])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+Rate-Limit-Aware Token Scheduler
+================================
+Replaces round-robin (itertools.cycle) token rotation with a scheduler
+built on token_usage_stats.
+
+Each pick goes to the token with the most remaining quota per second
+left in its rate-limit window, so quota is spent evenly and no token is
+drained early. Tokens marked 'invalid' are never handed out; tokens
+that are 'rate_limited' (or report 0 remaining) are skipped until their
+X-RateLimit-Reset time passes.
+
+Picks that have not been answered yet are counted as pending and taken
+off a token's remaining quota, so concurrent requests spread across
+tokens instead of piling onto the same one. A pick is settled by
+observe() when its response arrives, or release() when the call fails
+or never goes out.
+"""
+
+import time
+import threading
+
+# Fallback window when GitHub hasn't told us a token's reset time yet
+DEFAULT_WINDOW = 3600
+
+
+class TokenScheduler:
+    """Thread-safe token picker over token_usage_stats"""
+
+    def __init__(self, token_usage_stats, token_id_fn):
+        self.stats = token_usage_stats
+        self.token_id_fn = token_id_fn
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.counters = {'picks': 0, 'exhausted': 0}
+
+    def _score(self, stats, token_id, now):
+        """Remaining quota per second until reset, or None if unusable"""
+        if stats['status'] == 'invalid':
+            return None
+
+        rate = stats['rate_limit']
+        reset = rate.get('reset')
+        if reset and reset <= now and (stats['status'] == 'rate_limited' or rate['remaining'] <= 0):
+            # Window rolled over - the token is fresh again
+            rate['remaining'] = rate['limit']
+            stats['status'] = 'active'
+            self._pending[token_id] = 0
+
+        remaining = rate['remaining'] - self._pending.get(token_id, 0)
+        if stats['status'] == 'rate_limited' or remaining <= 0:
+            return None
+
+        window = (reset - now) if reset and reset > now else DEFAULT_WINDOW
+        return remaining / max(window, 1)
+
+    def pick(self, tokens):
+        """Return the best token from `tokens`, or None if all are exhausted"""
+        now = time.time()
+        with self._lock:
+            best, best_score = None, None
+            for token in tokens:
+                token_id = self.token_id_fn(token)
+                stats = self.stats.get(token_id)
+                if stats is None:
+                    continue
+                score = self._score(stats, token_id, now)
+                if score is not None and (best_score is None or score > best_score):
+                    best, best_score = token, score
+
+            if best is None:
+                self.counters['exhausted'] += 1
+                return None
+
+            token_id = self.token_id_fn(best)
+            self._pending[token_id] = self._pending.get(token_id, 0) + 1
+            self.counters['picks'] += 1
+            return best
+
+    def observe(self, token):
+        """A response for `token` arrived; its stats now reflect that call"""
+        self.release(token)
+
+    def release(self, token):
+        """Drop one pending pick of `token` (answered, failed or never sent)"""
+        token_id = self.token_id_fn(token)
+        with self._lock:
+            if self._pending.get(token_id):
+                self._pending[token_id] -= 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counters, pending=sum(self._pending.values()))
@@ -0,0 +1,99 @@
+"""
+Encrypted Token Store
+=====================
+GitHub tokens kept Fernet-encrypted on disk (tokens.enc, written by
+setup-tokens.py). The file is decrypted the first time a token is
+needed instead of at import, so a worker boots and can answer without
+paying for the cryptography import or the decryption; the result is
+cached for the life of the process.
+
+Environment Variables:
+    SECRET_KEY=...            # Fernet key from setup-tokens.py
+    TOKENS_FILE=tokens.enc
+"""
+
+import os
+import json
+import time
+import threading
+
+
+class TokenStore:
+    """Lazily decrypted, cached token list"""
+
+    def __init__(self, path, secret_key, on_load=None):
+        self.path = path
+        self.secret_key = secret_key
+        self.on_load = on_load        # on_load(tokens) before they are handed out
+        self._tokens = None
+        self._cipher = None
+        self._lock = threading.Lock()
+        self.load_seconds = None
+
+    @property
+    def loaded(self):
+        return self._tokens is not None
+
+    def tokens(self):
+        """The token list (decrypted on first call)"""
+        tokens = self._tokens
+        if tokens is None:
+            with self._lock:
+                if self._tokens is None:
+                    started = time.perf_counter()
+                    tokens = self._decrypt()
+                    if self.on_load:
+                        self.on_load(tokens)
+                    self._tokens = tokens
+                    self.load_seconds = time.perf_counter() - started
+                tokens = self._tokens
+        return tokens
+
+    def add(self, new_tokens):
+        """Merge tokens (skipping duplicates) and save; returns how many were new"""
+        with self._lock:
+            tokens = list(self._tokens if self._tokens is not None else self._decrypt())
+            added = [t for t in dict.fromkeys(new_tokens) if t not in tokens]
+            tokens.extend(added)
+            with open(self.path, 'w') as f:
+                f.write(self._get_cipher().encrypt(json.dumps(tokens).encode()).decode())
+            if self.on_load:
+                self.on_load(tokens)
+            self._tokens = tokens
+        return len(added)
+
+    def clear(self):
+        with self._lock:
+            self._tokens = []
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _get_cipher(self):
+        if self._cipher is None:
+            from cryptography.fernet import Fernet  # Deferred: not needed to boot
+            key = self.secret_key or Fernet.generate_key().decode()
+            self._cipher = Fernet(key.encode() if isinstance(key, str) else key)
+        return self._cipher
+
+    def _decrypt(self):
+        try:
+            if not os.path.exists(self.path):
+                print("⚠️  No tokens file found. Run setup-tokens.py first!")
+                print("⚠️  No tokens loaded. Running in public mode only.")
+                return []
+            with open(self.path, 'r') as f:
+                encrypted_data = f.read()
+            tokens = json.loads(self._get_cipher().decrypt(encrypted_data.encode()).decode())
+            print(f"✅ Loaded {len(tokens)} encrypted tokens")
+            return tokens
+        except Exception as e:
+            print(f"❌ Error decrypting tokens: {e}")
+            return []
+
+    def stats(self):
+        return {'loaded': self.loaded, 'count': len(self._tokens) if self.loaded else None,
+                'load_ms': round(self.load_seconds * 1000, 2) if self.load_seconds is not None else None}
+
+
+def token_store_from_env(on_load=None):
+    return TokenStore(os.getenv('TOKENS_FILE', 'tokens.enc'), os.getenv('SECRET_KEY', ''), on_load)
@@ -0,0 +1,260 @@
+"""
+Request Tracing and Sampling Profiler
+=====================================
+Where did the time go in a slow /api/github/... call? Traced requests
+record how long each phase took and return it in a `Server-Timing`
+header (shown per request in the browser devtools Timing tab):
+
+    Server-Timing: cache;dur=0.02, token;dur=0.01, connect;dur=38.1,
+                   tls;dur=61.7, upstream;dur=212.4, body;dur=3.2,
+                   bookkeeping;dur=0.4, encode;dur=1.9, total;dur=219.8
+
+Phases (milliseconds, summed when a phase runs more than once):
+    cache        response cache lookup
+    token        token selection (scheduler)
+    connect      DNS + TCP connect (only when the pool opened a connection)
+    tls          TLS handshake (only with a new connection)
+    upstream     GitHub time to response headers (includes connect + tls)
+    body         reading the upstream body
+    bookkeeping  token stats, rate limits, request log, metrics
+    encode       ?fields= projection + gzip/brotli of the response body
+    total        whole request inside the proxy
+    headers      streamed responses only: time until the headers went out
+                 (the body is still being sent; `total` is recorded in
+                 /admin/stats and /metrics once it has been)
+
+Untraced requests pay one context-variable lookup per phase.
+
+Features:
+- Per-request opt-in with `X-Trace: 1`, or a sampled share of all requests
+- Per-phase totals in /admin/stats and a phase histogram in /metrics
+- SamplingProfiler: on-demand stack sampling of a live worker
+  (GET /admin/profile?seconds=N) in collapsed-stack format for
+  flamegraph.pl / speedscope; nothing to install or restart
+
+Environment Variables:
+    TRACE_SAMPLE_RATE=0        # Share of requests traced without X-Trace (0-1)
+    PROFILE_MAX_SECONDS=60     # Longest /admin/profile capture
+"""
+
+import os
+import sys
+import time
+import random
+import threading
+import contextvars
+from collections import Counter
+
+TRACE_HEADER = 'X-Trace'
+
+_current = contextvars.ContextVar('proxy_trace', default=None)
+
+
+class Trace:
+    """Phase durations of one request, in first-seen order"""
+
+    __slots__ = ('started', 'phases', 'total')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.total = None     # Set by Tracer.finish()
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self, streamed=False):
+        """Server-Timing header value (durations in ms)"""
+        parts = [f'{phase};dur={seconds * 1000:.2f}' for phase, seconds in self.phases.items()]
+        parts.append(f"{'headers' if streamed else 'total'};dur={self.elapsed() * 1000:.2f}")
+        return ', '.join(parts)
+
+
+def current():
+    """The active Trace, or None when this request isn't traced"""
+    return _current.get()
+
+
+def record(phase, seconds):
+    """Add a measured duration to the active trace (no-op when untraced)"""
+    trace = _current.get()
+    if trace is not None:
+        trace.add(phase, seconds)
+
+
+class span:
+    """`with span('token'):` times the block into the active trace"""
+
+    __slots__ = ('phase', 'trace', 'started')
+
+    def __init__(self, phase):
+        self.phase = phase
+
+    def __enter__(self):
+        self.trace = _current.get()
+        if self.trace is not None:
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.trace is not None:
+            self.trace.add(self.phase, time.perf_counter() - self.started)
+        return False
+
+
+class Tracer:
+    """Decides which requests are traced and aggregates their phases"""
+
+    def __init__(self, sample_rate=0.0):
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self._phases = {}     # phase -> [count, total seconds, max seconds]
+        self.traced = 0
+
+    def start(self, requested=False):
+        """Begin tracing this request; returns a handle for finish() or None"""
+        if not requested and (self.sample_rate <= 0 or random.random() >= self.sample_rate):
+            return None
+        return _current.set(Trace())
+
+    def finish(self, handle):
+        """End the trace begun by start(); returns the Trace"""
+        return self.complete(self.detach(handle))
+
+    def detach(self, handle):
+        """
+        Leave the trace begun by start() without ending it (a streamed body is
+        still being sent); returns the Trace for complete()
+        """
+        trace = _current.get()
+        _current.reset(handle)
+        return trace
+
+    def complete(self, trace):
+        """Record a detached trace's total and phases; returns it"""
+        if trace is None:
+            return None
+        trace.total = trace.elapsed()
+        with self._lock:
+            self.traced += 1
+            for phase, seconds in list(trace.phases.items()) + [('total', trace.total)]:
+                agg = self._phases.setdefault(phase, [0, 0.0, 0.0])
+                agg[0] += 1
+                agg[1] += seconds
+                agg[2] = max(agg[2], seconds)
+        return trace
+
+    def stats(self):
+        with self._lock:
+            phases = {phase: {'count': count,
+                              'avg_ms': round(total / count * 1000, 3),
+                              'max_ms': round(peak * 1000, 3)}
+                      for phase, (count, total, peak) in self._phases.items()}
+        return {'sample_rate': self.sample_rate, 'traced': self.traced, 'phases': phases}
+
+
+class ProfilerBusy(Exception):
+    """Another capture is already running in this process"""
+
+
+# Innermost frames of threads parked waiting for work, not doing any
+IDLE_FRAMES = frozenset([
+    ('threading.py', 'wait'), ('threading.py', '_wait_for_tstate_lock'),
+    ('selectors.py', 'select'), ('socketserver.py', 'serve_forever'),
+    ('socket.py', 'accept'), ('queue.py', 'get'), ('base_events.py', '_run_once'),
+])
+
+
+def _frame_label(code):
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of every thread in this process (sys._current_frames)
+    at a fixed interval. Only sees this process - with sync gunicorn
+    workers (one thread each) run with --threads or PROXY_ENGINE=async
+    so there is something to sample besides the capture itself.
+    """
+
+    def __init__(self, max_seconds=60):
+        self.max_seconds = max_seconds
+        self._lock = threading.Lock()
+
+    def capture(self, seconds, interval=0.005, include_idle=False):
+        """Block for `seconds` sampling; returns a profile dict"""
+        seconds = min(max(seconds, 0.1), self.max_seconds)
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy('A profile is already being captured')
+        try:
+            return self._sample(seconds, interval, include_idle)
+        finally:
+            self._lock.release()
+
+    def _sample(self, seconds, interval, include_idle):
+        me = threading.get_ident()
+        stacks = Counter()
+        idle = 0
+        rounds = 0
+        threads_seen = set()
+        started = time.perf_counter()
+        deadline = started + seconds
+        while time.perf_counter() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                threads_seen.add(ident)
+                leaf = frame.f_code
+                if not include_idle and (os.path.basename(leaf.co_filename), leaf.co_name) in IDLE_FRAMES:
+                    idle += 1
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                labels.append(names.get(ident, f'thread-{ident}'))
+                stacks[';'.join(reversed(labels))] += 1
+            rounds += 1
+            time.sleep(interval)
+        return {
+            'duration': round(time.perf_counter() - started, 3),
+            'interval': interval,
+            'rounds': rounds,
+            'samples': sum(stacks.values()),
+            'idle_samples': idle,
+            'threads': len(threads_seen),
+            'stacks': stacks,
+        }
+
+
+def collapsed(profile):
+    """Brendan Gregg's folded format: 'root;...;leaf count' per line"""
+    return ''.join(f'{stack} {count}\n' for stack, count in profile['stacks'].most_common())
+
+
+def top_functions(profile, limit=30):
+    """Functions by self (leaf) samples, with total (anywhere on the stack) samples"""
+    own = Counter()
+    total = Counter()
+    for stack, count in profile['stacks'].items():
+        frames = stack.split(';')[1:]   # Drop the thread name root
+        if not frames:
+            continue
+        own[frames[-1]] += count
+        for label in set(frames):
+            total[label] += count
+    ranked = sorted(total, key=lambda label: (own[label], total[label]), reverse=True)
+    return [{'function': label, 'self': own[label], 'total': total[label]}
+            for label in ranked[:limit]]
+
+
+def tracer_from_env():
+    return Tracer(sample_rate=float(os.getenv('TRACE_SAMPLE_RATE', 0)))
+
+
+def profiler_from_env():
+    return SamplingProfiler(max_seconds=float(os.getenv('PROFILE_MAX_SECONDS', 60)))
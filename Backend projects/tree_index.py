@@ -0,0 +1,337 @@
+"""
+Repository Tree Index
+=====================
+Answers directory listings from one `git/trees/<sha>?recursive=1` fetch
+instead of one `/contents/<path>` call per directory.
+
+Features:
+- Branch/ref -> head commit SHA lookup (cheap, ETag-revalidated, cached briefly;
+  the last-known SHA is kept while GitHub can't be reached or refuses)
+- Whole tree fetched once per commit SHA and indexed as a path trie
+- Listings rendered in the same JSON shape as GitHub's contents API
+- Tries kept per (owner, repo, commit SHA) in one LRU bounded by total
+  path count, so requests alternating between refs (or pinned to an
+  older SHA) don't evict each other
+- Path -> blob SHA lookups for upload dedup; advanced in place (no refetch)
+  after commits made through the proxy
+
+Environment Variables:
+    TREE_REF_TTL=30        # Seconds a ref -> SHA lookup is trusted
+    TREE_MAX_NODES=500000  # Indexed paths kept in memory (all commits)
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import requests
+
+from single_flight import SingleFlight
+from upstream_client import GITHUB_RAW
+
+GITHUB_WEB = 'https://github.com'
+
+
+class TreeLookupError(LookupError):
+    """Upstream refused a ref or tree lookup"""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+class TreeNode:
+    __slots__ = ('name', 'path', 'type', 'sha', 'size', 'children')
+
+    def __init__(self, name, path, type_, sha=None, size=0):
+        self.name = name
+        self.path = path
+        self.type = type_
+        self.sha = sha
+        self.size = size
+        self.children = {} if type_ == 'tree' else None
+
+
+class PathTrie:
+    """Path trie built from a recursive git tree listing"""
+
+    def __init__(self, sha, tree_entries, truncated=False):
+        self.sha = sha
+        self.truncated = truncated
+        self.root = TreeNode('', '', 'tree', sha)
+        self.size = 0
+        self.blobs = set()        # Every blob SHA in the tree
+        for item in tree_entries:
+            self._insert(item)
+
+    def _insert(self, item):
+        parts = item['path'].split('/')
+        node = self.root
+        for i, part in enumerate(parts[:-1]):
+            child = node.children.get(part)
+            if child is None:
+                # Parent missing from a truncated listing - synthesize it
+                child = node.children[part] = TreeNode(part, '/'.join(parts[:i + 1]), 'tree')
+            node = child
+        name = parts[-1]
+        existing = node.children.get(name)
+        if existing is not None and item['type'] == 'tree':
+            existing.sha = item['sha']
+            return
+        node.children[name] = TreeNode(name, item['path'], item['type'],
+                                       item['sha'], item.get('size', 0))
+        self.size += 1
+        if item['type'] == 'blob':
+            self.blobs.add(item['sha'])
+
+    def find(self, path):
+        node = self.root
+        for part in [p for p in path.strip('/').split('/') if p]:
+            if node.children is None:
+                return None
+            node = node.children.get(part)
+            if node is None:
+                return None
+        return node
+
+    def blob_at(self, path):
+        node = self.find(path)
+        return node.sha if node is not None and node.type == 'blob' else None
+
+    def has_blob(self, sha):
+        return sha in self.blobs
+
+    def advanced(self, sha, tree_sha, blobs):
+        """
+        Trie for a child commit that only added/replaced `blobs` [(path, sha, size)].
+        Nodes on the changed paths are copied, everything else is shared, so
+        readers of this trie are never disturbed. Changed directories lose
+        their tree SHA (unknown without a fetch); the root gets `tree_sha`.
+        """
+        trie = PathTrie.__new__(PathTrie)
+        trie.sha = sha
+        trie.truncated = self.truncated
+        trie.size = self.size
+        trie.blobs = set(self.blobs)
+        trie.root = TreeNode('', '', 'tree', tree_sha)
+        trie.root.children = dict(self.root.children)
+        owned = {id(trie.root)}
+        for path, blob_sha, size in blobs:
+            parts = path.split('/')
+            node = trie.root
+            for i, part in enumerate(parts[:-1]):
+                child = node.children.get(part)
+                if child is None or id(child) not in owned:
+                    copy = TreeNode(part, '/'.join(parts[:i + 1]), 'tree')
+                    if child is None or child.children is None:
+                        trie.size += 1
+                    else:
+                        copy.children = dict(child.children)
+                    node.children[part] = child = copy
+                    owned.add(id(copy))
+                node = child
+            if parts[-1] not in node.children:
+                trie.size += 1
+            node.children[parts[-1]] = TreeNode(parts[-1], path, 'blob', blob_sha, size)
+            trie.blobs.add(blob_sha)
+        return trie
+
+
+def contents_entry(node, owner, repo, ref, api_base):
+    """One entry in GitHub contents-API shape"""
+    kind = {'tree': 'dir', 'blob': 'file', 'commit': 'submodule'}.get(node.type, node.type)
+    git_kind = 'trees' if node.type == 'tree' else 'blobs'
+    self_url = f'{api_base}/repos/{owner}/{repo}/contents/{node.path}?ref={ref}'
+    git_url = f'{api_base}/repos/{owner}/{repo}/git/{git_kind}/{node.sha}' if node.sha else None
+    html_url = f"{GITHUB_WEB}/{owner}/{repo}/{'tree' if kind == 'dir' else 'blob'}/{ref}/{node.path}"
+    return {
+        'name': node.name,
+        'path': node.path,
+        'sha': node.sha,
+        'size': node.size if kind == 'file' else 0,
+        'url': self_url,
+        'html_url': html_url,
+        'git_url': git_url,
+        'download_url': f'{GITHUB_RAW}/{owner}/{repo}/{ref}/{node.path}' if kind == 'file' else None,
+        'type': kind,
+        '_links': {'self': self_url, 'git': git_url, 'html': html_url},
+    }
+
+
+class TreeIndexCache:
+    """
+    Tree indexes keyed by (owner, repo, commit SHA), least recently used
+    dropped first once they hold more than `max_nodes` paths in total.
+
+    `github_get(path, params, extra_headers)` performs an authenticated
+    upstream GET (token rotation and bookkeeping included) and returns a
+    requests.Response.
+    """
+
+    def __init__(self, github_get, api_base, ref_ttl=30, max_nodes=500000):
+        self.github_get = github_get
+        self.api_base = api_base
+        self.ref_ttl = ref_ttl
+        self.max_nodes = max_nodes
+        self._refs = {}                 # (owner, repo, ref) -> [sha, etag, checked_at]
+        self._trees = OrderedDict()     # (owner, repo, sha) -> PathTrie, oldest access first
+        self._nodes = 0                 # Paths across _trees (advanced tries share nodes; counted in full)
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self.counters = {'ref_lookups': 0, 'ref_not_modified': 0, 'ref_stale': 0,
+                         'tree_hits': 0, 'tree_fetches': 0, 'evicted': 0, 'listings': 0, 'advanced': 0}
+
+    def resolve_ref(self, owner, repo, ref):
+        """Branch/tag/ref -> commit SHA ('HEAD' means the default branch)"""
+        key = (owner, repo, ref)
+        with self._lock:
+            known = self._refs.get(key)
+        if known and time.time() - known[2] < self.ref_ttl:
+            return known[0]
+        return self._flight.do(('ref',) + key, lambda: self._lookup_ref(key, known))[0]
+
+    def cached_ref(self, owner, repo, ref):
+        """Commit SHA for a ref looked up within ref_ttl, else None (never calls GitHub)"""
+        with self._lock:
+            known = self._refs.get((owner, repo, ref))
+        if known and time.time() - known[2] < self.ref_ttl:
+            return known[0]
+        return None
+
+    def _lookup_ref(self, key, known):
+        owner, repo, ref = key
+        headers = {'Accept': 'application/vnd.github.sha'}
+        if known and known[1]:
+            headers['If-None-Match'] = known[1]
+        try:
+            response = self.github_get(f'repos/{owner}/{repo}/commits/{ref}', None, headers)
+        except requests.RequestException:
+            if not known:
+                raise
+            return self._keep_ref(key, known)
+        not_modified = response.status_code == 304 and known
+        with self._lock:
+            self.counters['ref_lookups'] += 1
+            if not_modified:
+                self.counters['ref_not_modified'] += 1
+        if not_modified:
+            sha = known[0]
+        elif response.status_code == 200:
+            sha = response.text.strip()
+        elif known:
+            return self._keep_ref(key, known)
+        else:
+            raise TreeLookupError(f'Cannot resolve {owner}/{repo}@{ref}', response.status_code)
+        with self._lock:
+            self._refs[key] = [sha, response.headers.get('ETag'), time.time()]
+        return sha
+
+    def _keep_ref(self, key, known):
+        # Lookup failed (rate limit, outage): stay on the last-known SHA for
+        # another ref_ttl, so entries cached under it keep being served
+        with self._lock:
+            self.counters['ref_stale'] += 1
+            self._refs[key] = [known[0], known[1], time.time()]
+        return known[0]
+
+    def tree(self, owner, repo, sha):
+        """PathTrie for a commit, fetched once per commit SHA"""
+        key = (owner, repo, sha)
+        with self._lock:
+            trie = self._trees.get(key)
+            if trie is not None:
+                self._trees.move_to_end(key)
+                self.counters['tree_hits'] += 1
+                return trie
+        return self._flight.do(('tree',) + key, lambda: self._fetch_tree(key))[0]
+
+    def _fetch_tree(self, key):
+        owner, repo, sha = key
+        response = self.github_get(f'repos/{owner}/{repo}/git/trees/{sha}', {'recursive': '1'}, None)
+        with self._lock:
+            self.counters['tree_fetches'] += 1
+        if response.status_code != 200:
+            raise TreeLookupError(f'Cannot fetch tree {owner}/{repo}@{sha}', response.status_code)
+        data = response.json()
+        trie = PathTrie(sha, data.get('tree', []), data.get('truncated', False))
+        with self._lock:
+            self._store(key, trie)
+        return trie
+
+    def _store(self, key, trie):
+        # Caller holds the lock; the newest trie is kept even if it alone is over max_nodes
+        old = self._trees.pop(key, None)
+        if old is not None:
+            self._nodes -= old.size
+        self._trees[key] = trie
+        self._nodes += trie.size
+        while self._nodes > self.max_nodes and len(self._trees) > 1:
+            _, evicted = self._trees.popitem(last=False)
+            self._nodes -= evicted.size
+            self.counters['evicted'] += 1
+
+    def listing(self, owner, repo, ref, prefix):
+        """
+        Contents-API-shaped listing for `prefix` at `ref`.
+        Returns (sha, trie, payload) - payload is a list for directories,
+        a single entry for files, or None when the path isn't in the tree.
+        """
+        sha = self.resolve_ref(owner, repo, ref)
+        trie = self.tree(owner, repo, sha)
+        node = trie.find(prefix)
+        with self._lock:
+            self.counters['listings'] += 1
+        if node is None:
+            return sha, trie, None
+        display_ref = ref if ref != 'HEAD' else sha
+        if node.children is None:
+            return sha, trie, contents_entry(node, owner, repo, display_ref, self.api_base)
+        return sha, trie, [contents_entry(child, owner, repo, display_ref, self.api_base)
+                           for child in node.children.values()]
+
+    def advance(self, owner, repo, branch, parent, sha, tree_sha, blobs):
+        """
+        A commit made through the proxy moved `branch` from `parent` to `sha`:
+        index `sha` from the parent's trie and the blobs it wrote instead of
+        fetching its tree (the parent's entry stays)
+        Returns False when `parent` isn't indexed
+        """
+        with self._lock:
+            trie = self._trees.get((owner, repo, parent))
+            if trie is None:
+                return False
+            self._store((owner, repo, sha), trie.advanced(sha, tree_sha, blobs))
+            self._refs[(owner, repo, branch)] = [sha, None, time.time()]
+            self._refs.pop((owner, repo, 'HEAD'), None)  # Might be this branch
+            self.counters['advanced'] += 1
+        return True
+
+    def invalidate(self, owner, repo, keep_sha=None):
+        """
+        Forget ref lookups for one repo (unless `keep_sha` is already indexed,
+        i.e. the push was a commit made through the proxy). Tries stay: a
+        commit's tree never changes, and the LRU drops unused ones
+        """
+        with self._lock:
+            if keep_sha and (owner, repo, keep_sha) in self._trees:
+                return
+            for key in [k for k in self._refs if k[:2] == (owner, repo)]:
+                del self._refs[key]
+
+    def stats(self):
+        with self._lock:
+            indexed = {}
+            for (o, r, sha), t in self._trees.items():
+                indexed.setdefault(f'{o}/{r}', []).append(
+                    {'sha': sha, 'paths': t.size, 'truncated': t.truncated})
+            return dict(self.counters, nodes=self._nodes, max_nodes=self.max_nodes, repos=indexed)
+
+
+def tree_cache_from_env(github_get, api_base):
+    return TreeIndexCache(
+        github_get,
+        api_base,
+        ref_ttl=int(os.getenv('TREE_REF_TTL', 30)),
+        max_nodes=int(os.getenv('TREE_MAX_NODES', 500000)),
+    )
@@ -0,0 +1,202 @@
+"""
+Upstream HTTP Client for GitHub API Calls
+=========================================
+One pooled, keep-alive requests.Session shared by every proxied call,
+so api.github.com is not paying a fresh TCP+TLS handshake per request.
+
+Features:
+- Connection pool sized to the worker's thread count
+- Separate connect/read timeouts
+- Retry with exponential backoff on connection resets (GET/HEAD only)
+- Pool hit vs new-connection counters for monitoring
+- Large bodies relayed in chunks instead of buffered (read_or_stream)
+- New connections report connect / TLS time to the active request trace
+
+Environment Variables:
+    GITHUB_API_URL=https://api.github.com
+    GITHUB_RAW_URL=https://raw.githubusercontent.com
+    UPSTREAM_POOL_SIZE=16          # Defaults to GUNICORN_THREADS (the Procfile's --threads) or 16
+    UPSTREAM_CONNECT_TIMEOUT=3.05
+    UPSTREAM_READ_TIMEOUT=10
+    UPSTREAM_RETRIES=2
+    UPSTREAM_BACKOFF=0.3
+    STREAM_THRESHOLD=1048576       # Bodies larger than this are streamed
+"""
+
+import os
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+import tracing
+
+GITHUB_API = os.getenv('GITHUB_API_URL', 'https://api.github.com').rstrip('/')
+GITHUB_RAW = os.getenv('GITHUB_RAW_URL', 'https://raw.githubusercontent.com').rstrip('/')
+STREAM_THRESHOLD = int(os.getenv('STREAM_THRESHOLD', 1024 * 1024))
+STREAM_CHUNK = 64 * 1024
+
+# Upstream headers relayed to the client (and kept with cached bodies)
+PASSTHROUGH_HEADERS = (
+    'Content-Type', 'ETag', 'Last-Modified', 'Link',
+    'X-RateLimit-Limit', 'X-RateLimit-Remaining', 'X-RateLimit-Reset',
+    'X-RateLimit-Used', 'X-RateLimit-Resource',
+)
+
+
+def passthrough_headers(headers):
+    """Subset of upstream headers worth relaying"""
+    return {k: headers[k] for k in PASSTHROUGH_HEADERS if k in headers}
+
+
+class StreamedBody:
+    """
+    Upstream body too large to buffer - relayed chunk by chunk.
+    Iterating it yields the already-read head, then the rest of the
+    body, and returns the connection to the pool when done.
+    """
+
+    def __init__(self, response, head_chunks, rest):
+        self.status = response.status_code
+        self.headers = passthrough_headers(response.headers)
+        # Decoded chunks no longer match a compressed Content-Length
+        if 'Content-Length' in response.headers and 'Content-Encoding' not in response.headers:
+            self.headers['Content-Length'] = response.headers['Content-Length']
+        self._response = response
+        self._head = head_chunks
+        self._rest = rest
+
+    def __iter__(self):
+        try:
+            yield from self._head
+            self._head = []
+            yield from self._rest
+        finally:
+            self._response.close()
+
+    def close(self):
+        """Drop the body without relaying it"""
+        self._response.close()
+
+
+def read_or_stream(response, limit=STREAM_THRESHOLD):
+    """
+    Read a `stream=True` response into bytes if it fits in `limit`,
+    otherwise return a StreamedBody without buffering the rest
+    """
+    length = response.headers.get('Content-Length')
+    if length and 'Content-Encoding' not in response.headers and int(length) > limit:
+        return StreamedBody(response, [], response.iter_content(STREAM_CHUNK))
+
+    chunks = []
+    size = 0
+    rest = response.iter_content(STREAM_CHUNK)
+    for chunk in rest:
+        chunks.append(chunk)
+        size += len(chunk)
+        if size > limit:
+            return StreamedBody(response, chunks, rest)
+    response.close()
+    return b''.join(chunks)
+
+
+class TimedHTTPConnection(HTTPConnection):
+    def _new_conn(self):
+        with tracing.span('connect'):
+            return super()._new_conn()
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    """Splits a new connection into connect (DNS + TCP) and tls phases"""
+
+    def _new_conn(self):
+        started = time.perf_counter()
+        sock = super()._new_conn()
+        self._connect_seconds = time.perf_counter() - started
+        tracing.record('connect', self._connect_seconds)
+        return sock
+
+    def connect(self):
+        self._connect_seconds = 0.0
+        started = time.perf_counter()
+        super().connect()
+        tracing.record('tls', time.perf_counter() - started - self._connect_seconds)
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class UpstreamClient:
+    """Pooled keep-alive session with timeouts and retry"""
+
+    def __init__(self, pool_size=10, connect_timeout=3.05, read_timeout=10,
+                 retries=2, backoff=0.3):
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_size = pool_size
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=0,
+            backoff_factor=backoff,
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            raise_on_status=False,
+        )
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size,
+                                   max_retries=retry)
+        self.adapter.poolmanager.pool_classes_by_scheme = {
+            'http': TimedHTTPConnectionPool, 'https': TimedHTTPSConnectionPool}
+        self.session = requests.Session()
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+
+    def get(self, url, **kwargs):
+        """GET through the shared pool (default timeouts applied)"""
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def stats(self):
+        """Pool hits vs new connections across all upstream hosts"""
+        requests_sent = 0
+        new_connections = 0
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            requests_sent += pool.num_requests
+            new_connections += pool.num_connections
+        reused = max(requests_sent - new_connections, 0)
+        return {
+            'requests': requests_sent,
+            'new_connections': new_connections,
+            'pool_hits': reused,
+            'pool_hit_ratio': round(reused / requests_sent, 3) if requests_sent else 0.0,
+            'pool_size': self.pool_size,
+            'timeout': {'connect': self.timeout[0], 'read': self.timeout[1]},
+        }
+
+
+def client_from_env():
+    """Build the upstream client from environment variables"""
+    # One keep-alive connection per request thread; gunicorn doesn't export
+    # --threads itself, so the Procfile sets GUNICORN_THREADS for both
+    default_pool = os.getenv('GUNICORN_THREADS') or 16
+    return UpstreamClient(
+        pool_size=int(os.getenv('UPSTREAM_POOL_SIZE', default_pool)),
+        connect_timeout=float(os.getenv('UPSTREAM_CONNECT_TIMEOUT', 3.05)),
+        read_timeout=float(os.getenv('UPSTREAM_READ_TIMEOUT', 10)),
+        retries=int(os.getenv('UPSTREAM_RETRIES', 2)),
+        backoff=float(os.getenv('UPSTREAM_BACKOFF', 0.3)),
+    )
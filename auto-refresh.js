@@ -21,12 +21,21 @@ class AutoRefreshSystem {
         // Initial check
         this.checkForChanges();
         
-        // Set up periodic checking
-        this.intervalId = setInterval(() => {
-            this.checkForChanges();
-        }, this.checkInterval);
+        // Check when the proxy reports a push; poll only if push events are unavailable
+        if (typeof window.subscribeGitHubEvents === 'function') {
+            window.subscribeGitHubEvents({
+                onPush: (event) => {
+                    if (event.repo === 'Akhinoor14/SOLIDWORKS-Projects') {
+                        this.checkForChanges();
+                    }
+                },
+                onUnavailable: () => this.startPolling()
+            });
+        } else {
+            this.startPolling();
+        }
         
-        console.log('✅ Auto-refresh system started (1-minute intervals)');
+        console.log('✅ Auto-refresh system started');
         
         // Show notification
         if (typeof showNotification === 'function') {
@@ -34,6 +43,19 @@ class AutoRefreshSystem {
         }
     }
 
+    /**
+     * ⏱️ Fallback: periodic checking
+     */
+    startPolling() {
+        if (this.intervalId) return;
+        
+        this.intervalId = setInterval(() => {
+            this.checkForChanges();
+        }, this.checkInterval);
+        
+        console.log('⏱️ Auto-refresh polling (1-minute intervals)');
+    }
+
     /**
      * 📡 Check for repository changes
      */
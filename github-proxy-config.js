@@ -222,13 +222,96 @@ async function checkProxyHealth() {
     }
 }
 
+let proxyHealthCheck = null;
+
+/**
+ * checkProxyHealth(), fetched once per page and shared by every caller
+ */
+function getProxyHealth() {
+    if (!proxyHealthCheck) proxyHealthCheck = checkProxyHealth();
+    return proxyHealthCheck;
+}
+
+// ============================================
+// PUSH NOTIFICATIONS (Server-Sent Events)
+// ============================================
+
+let githubEventSource = null;
+let githubEventsStarted = false;
+let githubEventsUnavailable = null;
+const githubEventListeners = [];
+
+function markGitHubEventsUnavailable(reason) {
+    if (githubEventsUnavailable) return;
+    githubEventsUnavailable = reason;
+    if (githubEventSource) githubEventSource.close();
+    console.warn('⚠️  Push events unavailable:', reason);
+    githubEventListeners.forEach(listener => listener.onUnavailable(reason));
+}
+
+/**
+ * Listen for repository pushes from the proxy (/api/events).
+ * One EventSource is shared by every caller on the page.
+ * @param {object} callbacks - { onPush(event), onUnavailable(reason) }
+ *   onUnavailable means no push events will arrive - fall back to polling
+ */
+function subscribeGitHubEvents({ onPush, onUnavailable }) {
+    if (!GITHUB_PROXY_CONFIG.USE_PROXY || typeof EventSource === 'undefined') {
+        onUnavailable('EventSource not supported or proxy disabled');
+        return;
+    }
+    if (githubEventsUnavailable) {
+        onUnavailable(githubEventsUnavailable);
+        return;
+    }
+    githubEventListeners.push({ onPush, onUnavailable });
+    if (githubEventsStarted) return;
+    githubEventsStarted = true;
+    
+    // Only open a stream when the proxy has webhooks to push from
+    getProxyHealth().then(health => {
+        if (!health.available) {
+            markGitHubEventsUnavailable(`Proxy not available: ${health.reason}`);
+        } else if (health.events === false) {
+            markGitHubEventsUnavailable('Webhooks not configured on the proxy');
+        } else {
+            openGitHubEventSource();
+        }
+    });
+}
+
+function openGitHubEventSource() {
+    githubEventSource = new EventSource(`${GITHUB_PROXY_CONFIG.PROXY_URL}/api/events`);
+    githubEventSource.addEventListener('ready', (message) => {
+        const info = JSON.parse(message.data);
+        if (!info.webhooks) {
+            markGitHubEventsUnavailable('Webhooks not configured on the proxy');
+        } else {
+            console.log('📬 Listening for GitHub push events');
+        }
+    });
+    githubEventSource.addEventListener('push', (message) => {
+        const event = JSON.parse(message.data);
+        console.log(`📬 Push to ${event.repo}@${event.branch}: ${event.paths.length} file(s) changed`);
+        // Locally cached responses may be stale now
+        clearGitHubCache();
+        githubEventListeners.forEach(listener => listener.onPush(event));
+    });
+    githubEventSource.onerror = () => {
+        // CLOSED means the proxy refused the stream; otherwise the browser reconnects
+        if (githubEventSource.readyState === EventSource.CLOSED) {
+            markGitHubEventsUnavailable('Event stream closed by proxy');
+        }
+    };
+}
+
 // ============================================
 // AUTO-INITIALIZATION
 // ============================================
 
 // Check proxy health on load
 if (GITHUB_PROXY_CONFIG.USE_PROXY) {
-    checkProxyHealth().then(health => {
+    getProxyHealth().then(health => {
         if (health.available) {
             console.log('✅ Backend proxy connected:', health);
             console.log(`⚡ Effective rate limit: ${health.effective_limit} req/hour`);
@@ -251,6 +334,7 @@ if (typeof window !== 'undefined') {
     window.fetchGitHubApi = fetchGitHubApi;
     window.clearGitHubCache = clearGitHubCache;
     window.checkProxyHealth = checkProxyHealth;
+    window.subscribeGitHubEvents = subscribeGitHubEvents;
     
     // Log configuration on load
     console.log('🔧 GitHub Proxy Config:', {
@@ -185,6 +185,18 @@ class GitHubUploader {
         // Validate access first
         await this.validateAccess();
         
+        // One atomic commit through the backend when it is available
+        if (this.getCommitEndpoint()) {
+            try {
+                return await this.commitProject(projectData, folderPath);
+            } catch (error) {
+                if (!error.proxyUnavailable) {
+                    throw new Error(`Upload failed: ${error.message}`);
+                }
+                console.warn('⚠️ Backend commit endpoint unavailable, uploading file by file:', error.message);
+            }
+        }
+        
         const uploadResults = [];
         let uploadedCount = 0;
         
@@ -232,6 +244,97 @@ class GitHubUploader {
         }
     }
 
+    /**
+     * Backend endpoint that commits a whole project at once (null without the proxy)
+     */
+    getCommitEndpoint() {
+        if (typeof GITHUB_PROXY_CONFIG === 'undefined' || !GITHUB_PROXY_CONFIG.USE_PROXY) {
+            return null;
+        }
+        return `${GITHUB_PROXY_CONFIG.PROXY_URL}/api/commit/${this.config.owner}/${this.config.repo}`;
+    }
+
+    /**
+     * Upload all files and the README as a single commit (all or nothing).
+     * Files are sent as raw multipart parts; the backend hashes them as they
+     * stream in and skips the ones the repository already has.
+     */
+    async commitProject(projectData, folderPath) {
+        const { day, type, number, files } = projectData;
+        
+        const plannedResults = files.map(file => ({
+            name: file.name,
+            path: `${folderPath}/${file.name}`,
+            size: file.size,
+            type: this.getFileType(file.name)
+        }));
+        const readme = new Blob([this.generateREADME(day, type, number, files, plannedResults)],
+                                { type: 'text/markdown' });
+        const parts = files.map(file => ({ path: `${folderPath}/${file.name}`, blob: file }));
+        parts.push({ path: `${folderPath}/README.md`, blob: readme });
+        
+        // The manifest (paths and sizes) has to precede the file parts
+        const form = new FormData();
+        form.append('manifest', JSON.stringify({
+            branch: this.config.branch,
+            message: `Add ${type} ${number.toString().padStart(2, '0')} for Day ${day.toString().padStart(2, '0')}`,
+            files: parts.map(part => ({ path: part.path, size: part.blob.size }))
+        }));
+        parts.forEach(part => form.append(part.path, part.blob, part.path.split('/').pop()));
+        
+        if (projectData.onProgress) {
+            projectData.onProgress(10, `Sending ${parts.length} files`);
+        }
+        console.log(`🚀 Committing ${parts.length} files to ${folderPath} in one commit`);
+        let response;
+        try {
+            response = await fetch(this.getCommitEndpoint(), {
+                method: 'POST',
+                headers: { 'Authorization': `token ${this.config.token}` },
+                body: form
+            });
+        } catch (error) {
+            error.proxyUnavailable = true;
+            throw error;
+        }
+        
+        const result = await response.json().catch(() => ({}));
+        if (!response.ok) {
+            const error = new Error(result.error || `HTTP ${response.status}: ${response.statusText}`);
+            // Older backend without the endpoint: nothing was committed, fall back
+            error.proxyUnavailable = response.status === 404 && !result.step;
+            throw error;
+        }
+        
+        if (result.skipped && result.skipped.length) {
+            console.log(`♻️ ${result.skipped.length} unchanged file(s) not re-uploaded`);
+        }
+        if (projectData.onProgress) {
+            projectData.onProgress(100, result.commit
+                ? `Committed ${parts.length} files (${result.skipped.length} unchanged)`
+                : 'Nothing changed - all files already up to date');
+        }
+        
+        const uploadResults = result.files.map((file, index) => ({
+            name: file.path.split('/').pop(),
+            path: file.path,
+            size: file.size,
+            downloadUrl: file.download_url,
+            htmlUrl: file.html_url,
+            type: index < files.length ? this.getFileType(files[index].name) : 'readme'
+        }));
+        
+        return {
+            success: true,
+            folderPath: folderPath,
+            folderUrl: `https://github.com/${this.config.owner}/${this.config.repo}/tree/${this.config.branch}/${folderPath}`,
+            commitUrl: result.html_url,
+            skipped: result.skipped,
+            files: uploadResults,
+            projectData: { day, type, number }
+        };
+    }
+
     /**
      * Upload a single file to GitHub
      */
@@ -23,12 +23,20 @@ class RealTimeGitHubSync {
         // Initial sync
         this.performSync();
         
-        // Set up polling every 30 seconds
-        this.syncInterval = setInterval(() => {
-            if (!this.isActiveSyncing) {
-                this.performSync();
-            }
-        }, 30000); // 30 seconds
+        // Sync when the proxy reports a push; poll only if push events are unavailable
+        if (typeof window.subscribeGitHubEvents === 'function') {
+            window.subscribeGitHubEvents({
+                onPush: (event) => {
+                    if (event.repo === `${this.username}/${this.repository}` && !this.isActiveSyncing) {
+                        console.log('📬 Push received, syncing...');
+                        this.performSync();
+                    }
+                },
+                onUnavailable: () => this.startPolling()
+            });
+        } else {
+            this.startPolling();
+        }
         
         // Also sync on window focus (when user returns to tab)
         window.addEventListener('focus', () => {
@@ -38,7 +46,22 @@ class RealTimeGitHubSync {
             }
         });
         
-        console.log('✅ Real-time sync activated (30-second intervals)');
+        console.log('✅ Real-time sync activated');
+    }
+
+    /**
+     * ⏱️ Fallback: poll every 30 seconds
+     */
+    startPolling() {
+        if (this.syncInterval) return;
+        
+        this.syncInterval = setInterval(() => {
+            if (!this.isActiveSyncing) {
+                this.performSync();
+            }
+        }, 30000); // 30 seconds
+        
+        console.log('⏱️ Polling for updates (30-second intervals)');
     }
 
     /**